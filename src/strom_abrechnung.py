@@ -0,0 +1,418 @@
+import argparse
+import sys
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from itertools import groupby
+
+import strom_betrag
+import strom_kalender
+import strom_messung
+import strom_repository
+
+# Abrechnungslogik ohne GUI: berechnet für einen Zeitraum Verbrauch, Kosten,
+# anteiligen Grundpreis und Saldo eines Zählers. Als Datenquelle dient ein Objekt
+# mit den Methoden verbrauch_zwischen, verbrauch_tage, summe_einzahlungen,
+# einzahlungen_zwischen_daten und berechgrundl_daten (jeweils mit zaehler_id),
+# z. B. das StromRepository. Für die Abrechnung aller Zähler auf einmal kommen
+# berechgrundl_alle_zaehler, verbrauch_abschnitte und
+# summe_einzahlungen_je_zaehler hinzu.
+#
+# Der Verbrauch kommt aus dem materialisierten Tagesverbrauch (tbl_verbrauch_tag):
+# für eine einzelne Abrechnung genügt je Abschnitt eine indizierte Bereichssumme,
+# unabhängig davon, wie dicht die Ablesungen liegen.
+#
+# Der Abrechnungszeitraum wird an jeder Preisgrenze aus tbl_berechgrundl
+# geteilt; jeder Abschnitt wird mit seinem eigenen Tarif berechnet. Gerechnet
+# wird in ganzen Wh und Cent mit der Rundungsregel aus strom_betrag, der
+# Grundpreis anteilig nach Kalendermonaten.
+# Für viele Zeiträume (z. B. alle Monate eines Jahres) werden die Daten nur
+# einmal geladen und in einem linearen Durchlauf ausgewertet.
+
+# Frequenzen für berechnen_perioden: Anzahl Monate pro Periode
+FREQUENZEN = {'monatlich': 1, 'quartalsweise': 3, 'halbjaehrlich': 6, 'jaehrlich': 12}
+
+
+class BerechnungsFehler(Exception):
+    pass
+
+
+class FehlendeBerechnungsgrundlage(BerechnungsFehler):
+    pass
+
+
+# Ein Tarif aus tbl_berechgrundl; grundpreis_cent je Monat, kwh_preis in
+# strom_betrag.PREIS_SKALA-tel Cent je kWh
+@dataclass(frozen=True)
+class Tarif:
+    datum_von: date
+    datum_bis: date
+    grundpreis_cent: int
+    kwh_preis: int
+
+
+# Abschnitt eines Abrechnungszeitraums mit einheitlichem Tarif; Verbrauch in Wh, Beträge in Cent
+@dataclass(frozen=True)
+class Abrechnungssegment:
+    start_datum: date
+    end_datum: date
+    tage: int
+    verbrauch_wh: int
+    tarif: Tarif
+    verbrauchskosten_cent: int
+    grundpreis_cent: int
+
+
+# Ergebnis einer Abrechnung; Verbrauch in Wh, Beträge in Cent. Die Summen über
+# die Abschnitte sind exakt, gerundet wird nur innerhalb der Abschnitte.
+@dataclass(frozen=True)
+class Abrechnung:
+    start_datum: date
+    end_datum: date
+    tage: int
+    verbrauch_wh: int
+    verbrauchskosten_cent: int
+    grundpreis_cent: int
+    gesamtbetrag_cent: int
+    einzahlungen_cent: int
+    saldo_cent: int
+    segmente: tuple = ()
+
+
+# Datum aus date/datetime oder Text (YYYY-MM-DD) lesen; ungültige Eingaben lösen einen ValueError aus.
+# Text im Format der Datenbank geht über das schnelle date.fromisoformat, alles andere über strptime.
+def als_datum(wert):
+    if isinstance(wert, datetime):
+        return wert.date()
+    if isinstance(wert, date):
+        return wert
+    if isinstance(wert, str) and len(wert) == 10 and wert[4] == wert[7] == '-':
+        try:
+            return date.fromisoformat(wert)
+        except ValueError:
+            pass
+    return datetime.strptime(wert, "%Y-%m-%d").date()
+
+
+# Sortierter Intervallindex über die Tarife; Suche per Bisektion.
+# Überschneiden sich Tarife, gilt ab seinem Beginn der später beginnende.
+class TarifIndex:
+    def __init__(self, tarife):
+        tarife = sorted(tarife, key=lambda t: (t.datum_von, t.datum_bis))
+
+        # Elementare Intervalle zwischen allen Tarifgrenzen bilden
+        grenzen = sorted({t.datum_von.toordinal() for t in tarife}
+                         | {t.datum_bis.toordinal() + 1 for t in tarife})
+        self._starts = []
+        self._tarife = []
+        for anfang, ende in zip(grenzen, grenzen[1:]):
+            gueltig = None
+            for tarif in tarife:
+                if tarif.datum_von.toordinal() > anfang:
+                    break
+                if tarif.datum_bis.toordinal() >= anfang:
+                    gueltig = tarif
+            # Benachbarte Intervalle mit demselben Tarif zusammenfassen
+            if self._tarife and self._tarife[-1] is gueltig:
+                continue
+            self._starts.append(anfang)
+            self._tarife.append(gueltig)
+        if grenzen:
+            self._starts.append(grenzen[-1])
+            self._tarife.append(None)
+
+    @classmethod
+    def aus_zeilen(cls, zeilen):
+        return cls(Tarif(als_datum(von), als_datum(bis), grundpreis, kwh_preis)
+                   for von, bis, grundpreis, kwh_preis in zeilen)
+
+    # Tarif am Datum oder None
+    def tarif_am(self, datum):
+        i = bisect_right(self._starts, als_datum(datum).toordinal()) - 1
+        return self._tarife[i] if i >= 0 else None
+
+    # Zeitraum (inklusive Enddatum) an den Tarifgrenzen teilen: [(von, bis, tarif), ...]
+    def segmente(self, start_datum, end_datum):
+        anfang = start_datum.toordinal()
+        ende = end_datum.toordinal()
+        i = bisect_right(self._starts, anfang) - 1
+        ergebnis = []
+        while anfang <= ende:
+            tarif = self._tarife[i] if i >= 0 else None
+            naechste_grenze = self._starts[i + 1] if i + 1 < len(self._starts) else ende + 1
+            bis = min(ende, naechste_grenze - 1)
+            ergebnis.append((date.fromordinal(anfang), date.fromordinal(bis), tarif))
+            anfang = bis + 1
+            i += 1
+        return ergebnis
+
+
+# Zeitraum an den Tarifgrenzen teilen; fehlt für einen Tag ein Tarif, wird abgebrochen
+def _abschnitte(tarif_index, start_datum, end_datum):
+    if start_datum > end_datum:
+        raise ValueError("Das Startdatum liegt nach dem Enddatum.")
+    abschnitte = tarif_index.segmente(start_datum, end_datum)
+    if any(tarif is None for _, _, tarif in abschnitte):
+        raise FehlendeBerechnungsgrundlage("Daten für die Berechnung fehlen.")
+    return abschnitte
+
+
+class Abrechnungsengine:
+    def __init__(self, quelle, zaehler_id=strom_repository.STANDARD_ZAEHLER):
+        self.quelle = quelle
+        self.zaehler_id = zaehler_id
+        self._tarif_index = None
+
+    # Der Tarifindex wird einmal pro Engine aus den Tarifen des Zählers aufgebaut
+    @property
+    def tarif_index(self):
+        if self._tarif_index is None:
+            self._tarif_index = TarifIndex.aus_zeilen(self.quelle.berechgrundl_daten(zaehler_id=self.zaehler_id))
+        return self._tarif_index
+
+    def _abschnitte(self, start_datum, end_datum):
+        return _abschnitte(self.tarif_index, start_datum, end_datum)
+
+    # Abrechnung aus den Abschnitten zusammensetzen; verbrauch_zwischen(von, bis)
+    # liefert den Verbrauch der Tage von (inklusive) bis (exklusive). Verbrauch,
+    # Tage und Grundpreis beziehen sich auf dieselben Kalendertage von bis bis
+    # (inklusive); der Grundpreis wird je Kalendermonat nach dessen tatsächlicher
+    # Länge anteilig berechnet (strom_kalender).
+    @staticmethod
+    def _abrechnung(start_datum, end_datum, abschnitte, verbrauch_zwischen, einzahlungen_cent):
+        segmente = []
+        for von, bis, tarif in abschnitte:
+            verbrauch_wh = strom_betrag.wh(verbrauch_zwischen(von, bis + timedelta(days=1)))
+            tage = (bis - von).days + 1
+            segmente.append(Abrechnungssegment(
+                start_datum=von,
+                end_datum=bis,
+                tage=tage,
+                verbrauch_wh=verbrauch_wh,
+                tarif=tarif,
+                verbrauchskosten_cent=strom_betrag.arbeitskosten(verbrauch_wh, tarif.kwh_preis),
+                grundpreis_cent=strom_betrag.grundpreis_anteil(tarif.grundpreis_cent,
+                                                               strom_kalender.monatsanteil(von, bis)),
+            ))
+
+        verbrauchskosten_cent = sum(s.verbrauchskosten_cent for s in segmente)
+        grundpreis_cent = sum(s.grundpreis_cent for s in segmente)
+        gesamtbetrag_cent = verbrauchskosten_cent + grundpreis_cent
+
+        return Abrechnung(
+            start_datum=start_datum,
+            end_datum=end_datum,
+            tage=(end_datum - start_datum).days + 1,
+            verbrauch_wh=sum(s.verbrauch_wh for s in segmente),
+            verbrauchskosten_cent=verbrauchskosten_cent,
+            grundpreis_cent=grundpreis_cent,
+            gesamtbetrag_cent=gesamtbetrag_cent,
+            einzahlungen_cent=einzahlungen_cent,
+            saldo_cent=einzahlungen_cent - gesamtbetrag_cent,
+            segmente=tuple(segmente),
+        )
+
+    def berechnen(self, start_datum, end_datum) -> Abrechnung:
+        start_datum = als_datum(start_datum)
+        end_datum = als_datum(end_datum)
+
+        # Schritt 1: Zeitraum an den Tarifgrenzen teilen
+        abschnitte = self._abschnitte(start_datum, end_datum)
+
+        # Schritt 2: Einzahlungen im Zeitraum
+        einzahlungen = self.quelle.summe_einzahlungen(start_datum, end_datum, zaehler_id=self.zaehler_id)
+
+        # Schritt 3: Verbrauch je Abschnitt als Bereichssumme über tbl_verbrauch_tag
+        def verbrauch_zwischen(von, bis):
+            return self.quelle.verbrauch_zwischen(von, bis, zaehler_id=self.zaehler_id)
+
+        return self._abrechnung(start_datum, end_datum, abschnitte, verbrauch_zwischen, einzahlungen)
+
+    # Abrechnungen für viele Zeiträume [(start, ende), ...] in einem Durchlauf:
+    # Tagesverbrauch und Einzahlungen des Gesamtzeitraums werden einmal sortiert
+    # geladen und an allen Stichtagen über Präfixsummen ausgewertet.
+    # Die Ergebnisse haben die Reihenfolge der Eingabe.
+    def berechnen_perioden(self, perioden) -> list:
+        perioden = [(als_datum(start), als_datum(ende)) for start, ende in perioden]
+        if not perioden:
+            return []
+        abschnitte = [self._abschnitte(start, ende) for start, ende in perioden]
+        erstes_datum = min(start for start, _ in perioden)
+        letztes_datum = max(ende for _, ende in perioden)
+
+        # Verbrauch vor jedem Stichtag (Abschnittsgrenzen) per Präfixsumme
+        stichtage = set()
+        for (start, ende), teile in zip(perioden, abschnitte):
+            for von, bis, _ in teile:
+                stichtage.add(von)
+                stichtage.add(bis + timedelta(days=1))
+        verbrauch_vor = _praefixsummen(
+            self.quelle.verbrauch_tage(erstes_datum, letztes_datum + timedelta(days=1), zaehler_id=self.zaehler_id),
+            stichtage, inklusive=False)
+
+        def verbrauch_zwischen(von, bis):
+            return verbrauch_vor[bis] - verbrauch_vor[von]
+
+        # Einzahlungen im Zeitraum: Summe bis zum Ende minus Summe vor dem Start
+        stichtage = {ende for _, ende in perioden} | {start - timedelta(days=1) for start, _ in perioden}
+        zahlungen = ((datum, betrag) for _, datum, betrag
+                     in self.quelle.einzahlungen_zwischen_daten(erstes_datum, letztes_datum,
+                                                                zaehler_id=self.zaehler_id))
+        einzahlungen_bis = _praefixsummen(zahlungen, stichtage, inklusive=True)
+
+        return [self._abrechnung(start, ende, teile, verbrauch_zwischen,
+                                 einzahlungen_bis[ende] - einzahlungen_bis[start - timedelta(days=1)])
+                for (start, ende), teile in zip(perioden, abschnitte)]
+
+
+# Summen sortierter (datum, wert)-Zeilen bis zu jedem Stichtag in einem Durchlauf;
+# inklusive=False zählt nur Zeilen vor dem Stichtag. Die Datumswerte liegen in
+# der Datenbank als YYYY-MM-DD vor und lassen sich als Text vergleichen.
+def _praefixsummen(zeilen, stichtage, inklusive=True):
+    zeilen = iter(zeilen)
+    summen = {}
+    summe = 0
+    zeile = next(zeilen, None)
+    for stichtag in sorted(stichtage):
+        stichtag_text = stichtag.isoformat()
+        while zeile is not None and (zeile[0] <= stichtag_text if inklusive else zeile[0] < stichtag_text):
+            summe += zeile[1]
+            zeile = next(zeilen, None)
+        summen[stichtag] = summe
+    return summen
+
+
+# Kalenderperioden (z. B. Monate) zwischen Start und Ende; die erste und
+# letzte Periode werden auf den Zeitraum gekürzt
+def perioden_nach_frequenz(start_datum, end_datum, frequenz='monatlich'):
+    if frequenz not in FREQUENZEN:
+        raise ValueError(f"Unbekannte Frequenz: {frequenz}")
+    start_datum = als_datum(start_datum)
+    end_datum = als_datum(end_datum)
+    monate = FREQUENZEN[frequenz]
+
+    perioden = []
+    # Periodenbeginn auf den Anfang des Kalenderabschnitts legen (z. B. Quartalsanfang)
+    monat_index = start_datum.year * 12 + (start_datum.month - 1) // monate * monate
+    anfang = start_datum
+    while anfang <= end_datum:
+        monat_index += monate
+        naechster = date(monat_index // 12, monat_index % 12 + 1, 1)
+        ende = min(end_datum, naechster - timedelta(days=1))
+        perioden.append((anfang, ende))
+        anfang = naechster
+    return perioden
+
+
+# Einzelne Abrechnung mit einer beliebigen Datenquelle berechnen
+@strom_messung.gemessen('abrechnung.berechnen')
+def berechnen(start_datum, end_datum, quelle, zaehler_id=strom_repository.STANDARD_ZAEHLER) -> Abrechnung:
+    return Abrechnungsengine(quelle, zaehler_id).berechnen(start_datum, end_datum)
+
+
+# Viele Abrechnungen mit einer beliebigen Datenquelle in einem Durchlauf berechnen
+@strom_messung.gemessen('abrechnung.berechnen_perioden')
+def berechnen_perioden(perioden, quelle, zaehler_id=strom_repository.STANDARD_ZAEHLER) -> list:
+    return Abrechnungsengine(quelle, zaehler_id).berechnen_perioden(perioden)
+
+
+# Abrechnungen aller Zähler für denselben Zeitraum in drei Abfragen statt einer
+# Abrechnung je Zähler: Tarife aller Zähler, Einzahlungen je Zähler und der
+# Verbrauch aller Tarifabschnitte aller Zähler. Liefert {zaehler_id: Abrechnung};
+# Zähler ohne durchgehenden Tarif werden an fehler(zaehler_id, exception)
+# gemeldet und ausgelassen.
+@strom_messung.gemessen('abrechnung.berechnen_alle_zaehler')
+def berechnen_alle_zaehler(start_datum, end_datum, quelle, fehler=None) -> dict:
+    start_datum = als_datum(start_datum)
+    end_datum = als_datum(end_datum)
+    if start_datum > end_datum:
+        raise ValueError("Das Startdatum liegt nach dem Enddatum.")
+
+    einzahlungen = quelle.summe_einzahlungen_je_zaehler(start_datum, end_datum)
+    tarif_indizes = {zaehler_id: TarifIndex.aus_zeilen(zeile[1:] for zeile in zeilen)
+                     for zaehler_id, zeilen in groupby(quelle.berechgrundl_alle_zaehler(), key=lambda z: z[0])}
+
+    abschnitte_je_zaehler = {}
+    for zaehler_id in einzahlungen:
+        try:
+            abschnitte_je_zaehler[zaehler_id] = _abschnitte(
+                tarif_indizes.get(zaehler_id) or TarifIndex([]), start_datum, end_datum)
+        except FehlendeBerechnungsgrundlage as e:
+            if fehler:
+                fehler(zaehler_id, e)
+
+    bereiche = [(zaehler_id, von, bis + timedelta(days=1))
+                for zaehler_id, abschnitte in abschnitte_je_zaehler.items()
+                for von, bis, _ in abschnitte]
+    verbrauch = dict(zip(bereiche, quelle.verbrauch_abschnitte(bereiche)))
+
+    return {
+        zaehler_id: Abrechnungsengine._abrechnung(
+            start_datum, end_datum, abschnitte,
+            lambda von, bis, zaehler_id=zaehler_id: verbrauch[(zaehler_id, von, bis)],
+            einzahlungen[zaehler_id])
+        for zaehler_id, abschnitte in abschnitte_je_zaehler.items()
+    }
+
+
+# Abrechnungen Zähler für Zähler als Generator (zaehler_id, Abrechnung); es wird
+# immer nur ein Zähler im Speicher gehalten, auch bei sehr vielen Zählern.
+# Zähler ohne Tarif werden wie bei berechnen_alle_zaehler an fehler gemeldet.
+def abrechnungen_erzeugen(perioden, quelle, zaehler_ids, fehler=None):
+    perioden = [(als_datum(start), als_datum(ende)) for start, ende in perioden]
+    for zaehler_id in zaehler_ids:
+        try:
+            abrechnungen = berechnen_perioden(perioden, quelle, zaehler_id)
+        except FehlendeBerechnungsgrundlage as e:
+            if fehler:
+                fehler(zaehler_id, e)
+            continue
+        for abrechnung in abrechnungen:
+            yield zaehler_id, abrechnung
+
+
+# Aufruf: python3 strom_abrechnung.py 2024-01-01 2024-12-31 [--frequenz monatlich] [--zaehler 2 | --alle-zaehler]
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stromabrechnung für einen oder mehrere Zeiträume")
+    parser.add_argument('start', help="Startdatum (YYYY-MM-DD)")
+    parser.add_argument('ende', help="Enddatum (YYYY-MM-DD)")
+    parser.add_argument('--frequenz', choices=sorted(FREQUENZEN),
+                        help="Zeitraum in Perioden dieser Länge aufteilen")
+    zaehler = parser.add_mutually_exclusive_group()
+    zaehler.add_argument('--zaehler', type=int, default=strom_repository.STANDARD_ZAEHLER)
+    zaehler.add_argument('--alle-zaehler', action='store_true', help="Alle Zähler in einem Durchlauf abrechnen")
+    parser.add_argument('--db', default=strom_repository.DB_PATH)
+    args = parser.parse_args(argv)
+
+    def fehler(zaehler_id, e):
+        print(f"Zähler {zaehler_id}: {e}", file=sys.stderr)
+
+    try:
+        repo = strom_repository.get_repository(args.db)
+        if args.frequenz:
+            perioden = perioden_nach_frequenz(args.start, args.ende, args.frequenz)
+        else:
+            perioden = [(als_datum(args.start), als_datum(args.ende))]
+        if args.alle_zaehler:
+            abrechnungen = []
+            for start, ende in perioden:
+                for zaehler_id, a in berechnen_alle_zaehler(start, ende, repo, fehler).items():
+                    abrechnungen.append((zaehler_id, a))
+            abrechnungen.sort(key=lambda z: z[0])
+        else:
+            abrechnungen = [(args.zaehler, a) for a in berechnen_perioden(perioden, repo, args.zaehler)]
+    except (ValueError, BerechnungsFehler, strom_repository.DatenbankFehler) as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    print("zaehler;start;ende;tage;verbrauch_kwh;verbrauchskosten;grundpreis;gesamtbetrag;einzahlungen;saldo")
+    for zaehler_id, a in abrechnungen:
+        print(";".join((str(zaehler_id), str(a.start_datum), str(a.end_datum), str(a.tage),
+                        strom_betrag.kwh_text(a.verbrauch_wh), strom_betrag.euro_text(a.verbrauchskosten_cent),
+                        strom_betrag.euro_text(a.grundpreis_cent), strom_betrag.euro_text(a.gesamtbetrag_cent),
+                        strom_betrag.euro_text(a.einzahlungen_cent), strom_betrag.euro_text(a.saldo_cent))))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+import argparse
+import sys
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+import strom_archiv
+import strom_repository
+import strom_verlauf
+
+# Verbrauchsanalysen über den gesamten Zählerstandsverlauf mit NumPy.
+# Die Zählerstände werden in einem Abruf in Arrays geladen (Datum als
+# datetime64[D], Stand als float64); alle Auswertungen sind vektorisiert.
+
+ERSTES_DATUM = '0001-01-01'
+LETZTES_DATUM = '9999-12-31'
+
+
+# Zählerstände je Tag; bei mehreren Ablesungen an einem Tag zählt der höchste Stand
+@dataclass
+class Zeitreihe:
+    tage: np.ndarray
+    staende: np.ndarray
+
+    def __len__(self):
+        return len(self.tage)
+
+
+# Auffällige Ablesungen: Datum der Ablesung, an der der Zähler zurückgeht bzw. springt
+@dataclass
+class Ausreisser:
+    rueckgaenge: np.ndarray
+    spruenge: np.ndarray
+    grenze: float
+
+
+# Zeitreihe aus Tagen (int64 seit 1970-01-01 oder datetime64) und Ständen bilden
+def zeitreihe(tage, staende):
+    tage = np.asarray(tage).astype('datetime64[D]').astype(np.int64)
+    staende = np.asarray(staende, dtype=np.float64)
+    if len(tage) == 0:
+        return Zeitreihe(tage.astype('datetime64[D]'), staende)
+    if np.any(tage[1:] < tage[:-1]):
+        reihenfolge = np.argsort(tage, kind='stable')
+        tage, staende = tage[reihenfolge], staende[reihenfolge]
+    neu = np.empty(len(tage), dtype=bool)
+    neu[0] = True
+    np.not_equal(tage[1:], tage[:-1], out=neu[1:])
+    anfaenge = np.flatnonzero(neu)
+    return Zeitreihe(tage[anfaenge].astype('datetime64[D]'), np.maximum.reduceat(staende, anfaenge))
+
+
+# Alle Zählerstände (optional in einem Zeitraum) in einem Abruf laden, vor dem
+# Archivstichtag ergänzt um die archivierten Ablesungen
+def lade_zaehlerstaende(repo, von_datum=ERSTES_DATUM, bis_datum=LETZTES_DATUM,
+                        zaehler_id=strom_repository.STANDARD_ZAEHLER):
+    parameter = (zaehler_id, strom_repository.datum_text(von_datum), strom_repository.datum_text(bis_datum))
+    with repo.lesetransaktion() as conn:
+        stichtag = strom_archiv.stichtag_lesen(conn, zaehler_id)
+        cursor = conn.execute(strom_repository.SQL_ZAEHLERSTAENDE_TAGE, parameter)
+        daten = np.fromiter(cursor, dtype=[('tag', np.int64), ('stand', np.float64)])
+    tage, staende = daten['tag'], daten['stand']
+    if stichtag is not None and parameter[1] < stichtag:
+        _, archiv_tage, archiv_staende = repo.archiv.zaehlerstaende(zaehler_id, stichtag, *parameter[1:])
+        tage = np.concatenate((archiv_tage.astype(np.int64), tage))
+        staende = np.concatenate((archiv_staende, staende))
+    return zeitreihe(tage, staende)
+
+
+# Materialisierten Tagesverbrauch aus tbl_verbrauch_tag für [von_datum, bis_datum) laden;
+# entspricht tagesverbrauch(lade_zaehlerstaende(...)) ohne Rohdaten zu lesen
+def lade_tagesverbrauch(repo, von_datum=ERSTES_DATUM, bis_datum=LETZTES_DATUM,
+                        zaehler_id=strom_repository.STANDARD_ZAEHLER):
+    parameter = (zaehler_id, strom_repository.datum_text(von_datum), strom_repository.datum_text(bis_datum))
+    with repo.pool.verbindung() as conn:
+        cursor = conn.execute(strom_repository.SQL_VERBRAUCH_TAGE_NUMPY, parameter)
+        daten = np.fromiter(cursor, dtype=[('tag', np.int64), ('verbrauch', np.float64)])
+    return daten['tag'].astype('datetime64[D]'), daten['verbrauch']
+
+
+# Linear interpolierter Verbrauch je Kalendertag zwischen erster und letzter Ablesung;
+# der Tag d erhält den Verbrauch des Ablesezeitraums [t_i, t_i+1), in dem er liegt
+def tagesverbrauch(reihe):
+    tage = reihe.tage.astype(np.int64)
+    if len(tage) < 2:
+        return np.array([], dtype='datetime64[D]'), np.array([], dtype=np.float64)
+    abstaende = np.diff(tage)
+    pro_tag = np.diff(reihe.staende) / abstaende
+    achse = np.arange(tage[0], tage[-1]).astype('datetime64[D]')
+    return achse, np.repeat(pro_tag, abstaende)
+
+
+# Gleitender Durchschnitt über fenster Werte; die ersten fenster-1 Werte sind NaN
+def gleitender_durchschnitt(werte, fenster=7):
+    werte = np.asarray(werte, dtype=np.float64)
+    ergebnis = np.full(len(werte), np.nan)
+    if fenster < 1 or len(werte) < fenster:
+        return ergebnis
+    summen = np.cumsum(np.concatenate(([0.0], werte)))
+    ergebnis[fenster - 1:] = (summen[fenster:] - summen[:-fenster]) / fenster
+    return ergebnis
+
+
+def _summen_nach(tage, werte, einheit):
+    if len(tage) == 0:
+        return np.array([], dtype=f'datetime64[{einheit}]'), np.array([], dtype=np.float64)
+    perioden = tage.astype(f'datetime64[{einheit}]')
+    index = (perioden - perioden[0]).astype(np.int64)
+    summen = np.bincount(index, weights=werte)
+    return perioden[0] + np.arange(len(summen)), summen
+
+
+# Verbrauchssummen je Kalendermonat bzw. -jahr
+def monatssummen(tage, werte):
+    return _summen_nach(tage, werte, 'M')
+
+
+def jahressummen(tage, werte):
+    return _summen_nach(tage, werte, 'Y')
+
+
+# Vergleich mit der Vorjahresperiode (12 Monate bzw. 1 Jahr zurück):
+# liefert die Vorjahreswerte und die relative Veränderung (NaN ohne Vorjahr)
+def vorjahresvergleich(summen, perioden_pro_jahr=12):
+    summen = np.asarray(summen, dtype=np.float64)
+    vorjahr = np.full(len(summen), np.nan)
+    if len(summen) > perioden_pro_jahr:
+        vorjahr[perioden_pro_jahr:] = summen[:-perioden_pro_jahr]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        veraenderung = np.where(vorjahr != 0, (summen - vorjahr) / vorjahr, np.nan)
+    return vorjahr, veraenderung
+
+
+# Zählerrückgänge und unmögliche Sprünge finden. Ein Sprung ist ein
+# Tagesverbrauch über der Grenze; ohne feste Grenze gilt Median + faktor * MAD
+# der Tagesverbräuche zwischen den Ablesungen.
+def ausreisser(reihe, max_tagesverbrauch=None, faktor=10.0):
+    tage = reihe.tage.astype(np.int64)
+    if len(tage) < 2:
+        leer = np.array([], dtype='datetime64[D]')
+        return Ausreisser(leer, leer, float('nan'))
+    differenzen = np.diff(reihe.staende)
+    pro_tag = differenzen / np.diff(tage)
+
+    if max_tagesverbrauch is None:
+        gueltig = pro_tag[pro_tag >= 0]
+        median = float(np.median(gueltig)) if len(gueltig) else 0.0
+        mad = float(np.median(np.abs(gueltig - median))) if len(gueltig) else 0.0
+        grenze = median + faktor * (mad if mad > 0 else max(median, 1.0))
+    else:
+        grenze = float(max_tagesverbrauch)
+
+    return Ausreisser(
+        rueckgaenge=reihe.tage[1:][differenzen < 0],
+        spruenge=reihe.tage[1:][pro_tag > grenze],
+        grenze=grenze,
+    )
+
+
+# Synthetische Zählerstände: 15-Minuten-Ablesungen mit einzelnen Rückgängen und Sprüngen
+def synthetische_reihe(anzahl, seed=0):
+    zufall = np.random.default_rng(seed)
+    tage = np.arange(anzahl, dtype=np.int64) // 96
+    verbrauch = zufall.gamma(2.0, 0.05, anzahl)
+    staende = np.cumsum(verbrauch)
+    fehler = zufall.integers(1, anzahl, max(1, anzahl // 1_000_000))
+    staende[fehler] -= 50.0
+    return tage, staende
+
+
+# Laufzeit aller Auswertungen für anzahl Ablesungen messen
+def benchmark(anzahl=10_000_000, wiederholungen=3):
+    tage, staende = synthetische_reihe(anzahl)
+    zeiten = []
+    for _ in range(wiederholungen):
+        start = time.perf_counter()
+        reihe = zeitreihe(tage, staende)
+        achse, verbrauch = tagesverbrauch(reihe)
+        gleitender_durchschnitt(verbrauch, 30)
+        monate, summen = monatssummen(achse, verbrauch)
+        vorjahresvergleich(summen)
+        jahressummen(achse, verbrauch)
+        ausreisser(reihe)
+        zeiten.append(time.perf_counter() - start)
+    return min(zeiten)
+
+
+# Aufruf: python3 strom_analyse.py [--von 2024-01-01] [--bis 2024-12-31] [--zaehler 1] [--benchmark 10000000]
+#         [--abbild verlauf.strom]   (Auswertung aus einem Abbild von strom_verlauf statt aus der Datenbank)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verbrauchsanalyse über die Zählerstände")
+    parser.add_argument('--von', default=ERSTES_DATUM)
+    parser.add_argument('--bis', default=LETZTES_DATUM)
+    parser.add_argument('--zaehler', type=int, default=strom_repository.STANDARD_ZAEHLER)
+    parser.add_argument('--db', default=strom_repository.DB_PATH)
+    parser.add_argument('--benchmark', type=int, metavar='ANZAHL',
+                        help="Auswertungen mit ANZAHL synthetischen Ablesungen messen")
+    parser.add_argument('--abbild', help="Abbild des Verlaufsspeichers statt der Datenbank verwenden")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        dauer = benchmark(args.benchmark)
+        print(f"{args.benchmark} Ablesungen ausgewertet in {dauer:.3f} s")
+        return 0
+
+    try:
+        if args.abbild:
+            speicher = strom_verlauf.Verlaufsspeicher.oeffnen(args.abbild)
+            reihe = zeitreihe(*speicher.zaehlerstaende(args.von, args.bis, args.zaehler))
+            achse, verbrauch = tagesverbrauch(reihe)
+        else:
+            repo = strom_repository.get_repository(args.db)
+            reihe = lade_zaehlerstaende(repo, args.von, args.bis, args.zaehler)
+            achse, verbrauch = lade_tagesverbrauch(repo, args.von, args.bis, args.zaehler)
+    except (ValueError, OSError, strom_repository.DatenbankFehler, strom_verlauf.VerlaufFehler) as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    monate, summen = monatssummen(achse, verbrauch)
+    _, veraenderung = vorjahresvergleich(summen)
+    print("monat;verbrauch_kwh;veraenderung_vorjahr")
+    for monat, summe, delta in zip(monate, summen, veraenderung):
+        print(f"{monat};{summe:.3f};{'' if np.isnan(delta) else f'{delta:+.1%}'}")
+
+    auffaellig = ausreisser(reihe)
+    for datum in auffaellig.rueckgaenge:
+        print(f"Zählerrückgang am {datum}", file=sys.stderr)
+    for datum in auffaellig.spruenge:
+        print(f"Unplausibler Sprung am {datum} (Grenze {auffaellig.grenze:.2f} kWh/Tag)", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,376 @@
+import argparse
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+
+# Archiv für abgeschlossene Zeiträume: Ablesungen und Einzahlungen vor einem
+# Stichtag (Monatserster, je Zähler in tbl_archiv) wandern aus den Tabellen in
+# komprimierte, spaltenweise Dateien je Zähler und Jahr. tbl_zaehlerstand und
+# tbl_einzahlungen bleiben klein; Tagesverbrauch, Monats- und Jahressummen
+# bleiben in der Datenbank, sodass alte Abrechnungszeiträume weiter schnell sind.
+#
+# Ein Archivlauf schreibt eigene Dateien <jahr>_<stichtag>.strarch und setzt
+# den Stichtag erst danach in derselben Transaktion, in der er die Zeilen
+# löscht. Leser berücksichtigen nur Dateien bis zu dem Stichtag, den sie in
+# ihrer Lesetransaktion sehen; halb geschriebene oder zurückgerollte Läufe
+# bleiben damit unsichtbar und werden beim nächsten Lauf entfernt.
+#
+# Die Ablesungen des letzten Ablesetags vor dem Stichtag bleiben in der Tabelle,
+# damit strom_verbrauch den Tagesverbrauch bis zur nächsten Ablesung weiter
+# interpolieren kann. Trigger (Migration 8) verhindern Änderungen vor dem Stichtag.
+#
+# Dateiformat: Kennung, Länge des JSON-Kopfs (uint64), Kopf, danach je Spalte
+# ein zlib-Block. Ganzzahlige Spalten mit Datum oder id werden als Differenzen
+# gespeichert und alle Spalten vor dem Komprimieren byteweise umsortiert
+# (erst alle ersten Bytes, dann alle zweiten ...), was zlib deutlich hilft.
+# Gelesen wird über Memory-Mapping; entpackte Spalten hält ein kleiner LRU-Cache.
+
+KENNUNG = b'STROMAR1'
+ENDUNG = '.strarch'
+KOMPRESSION = 6
+
+# (Spalte, Typ, als Differenzen gespeichert) je Art
+SPALTEN = {
+    'zaehlerstaende': (('ids', '<i8', True), ('tage', '<i4', True), ('werte', '<f8', False)),
+    'einzahlungen': (('ids', '<i8', True), ('tage', '<i4', True), ('werte', '<i8', False)),
+}
+
+# So viele entpackte (Datei, Art) bleiben im Speicher
+MAX_TEILE = 32
+
+SQL_STICHTAG = 'SELECT stichtag FROM tbl_archiv WHERE zaehler_id = ?'
+SQL_STICHTAGE = 'SELECT zaehler_id, stichtag FROM tbl_archiv ORDER BY zaehler_id'
+SQL_STICHTAG_LOESCHEN = 'DELETE FROM tbl_archiv WHERE zaehler_id = ?'
+SQL_STICHTAG_SETZEN = 'INSERT INTO tbl_archiv (zaehler_id, stichtag) VALUES (?, ?)'
+SQL_ZAEHLER_ALLE = 'SELECT id FROM tbl_zaehler ORDER BY id'
+SQL_LETZTER_ABLESETAG = 'SELECT MAX(datum) FROM tbl_zaehlerstand WHERE zaehler_id = ? AND datum < ?'
+SQL_ZAEHLERSTAENDE_VOR = '''
+    SELECT id, CAST(julianday(datum) - 2440587.5 AS INTEGER), zaehlerstand FROM tbl_zaehlerstand
+    WHERE zaehler_id = ? AND datum < ? ORDER BY datum, id
+'''
+SQL_EINZAHLUNGEN_VOR = '''
+    SELECT id, CAST(julianday(datum) - 2440587.5 AS INTEGER), einzahlungen FROM tbl_einzahlungen
+    WHERE zaehler_id = ? AND datum < ? ORDER BY datum, id
+'''
+SQL_ZAEHLERSTAENDE_LOESCHEN = 'DELETE FROM tbl_zaehlerstand WHERE zaehler_id = ? AND datum < ?'
+SQL_EINZAHLUNGEN_LOESCHEN = 'DELETE FROM tbl_einzahlungen WHERE zaehler_id = ? AND datum < ?'
+
+_DATEINAME = re.compile(r'^(\d{4})_(\d{4}-\d{2}-\d{2})' + re.escape(ENDUNG) + '$')
+_EPOCHE = date(1970, 1, 1).toordinal()
+
+
+class ArchivFehler(Exception):
+    pass
+
+
+# Archivverzeichnis neben der Datenbank: meine_datenbank.db -> meine_datenbank_archiv
+def verzeichnis_fuer(db_path):
+    return os.path.splitext(os.path.abspath(db_path))[0] + '_archiv'
+
+
+# Stichtag ('YYYY-MM-01') eines Zählers bzw. aller Zähler ({zaehler_id: stichtag});
+# auf der Verbindung der laufenden Transaktion abfragen
+def stichtag_lesen(conn, zaehler_id):
+    zeile = conn.execute(SQL_STICHTAG, (zaehler_id,)).fetchone()
+    return zeile[0] if zeile else None
+
+
+def stichtage_lesen(conn) -> dict:
+    return dict(conn.execute(SQL_STICHTAGE).fetchall())
+
+
+def _tag(datum_text):
+    return date.fromisoformat(datum_text).toordinal() - _EPOCHE
+
+
+def _kodieren(werte, differenzen):
+    if differenzen:
+        werte = np.diff(werte, prepend=werte.dtype.type(0)).astype(werte.dtype)
+    umsortiert = werte.view(np.uint8).reshape(-1, werte.dtype.itemsize).T
+    return zlib.compress(np.ascontiguousarray(umsortiert).tobytes(), KOMPRESSION)
+
+
+def _dekodieren(block, dtype, anzahl, differenzen):
+    dtype = np.dtype(dtype)
+    roh = np.frombuffer(zlib.decompress(block), dtype=np.uint8)
+    werte = np.ascontiguousarray(roh.reshape(dtype.itemsize, anzahl).T).view(dtype).reshape(anzahl)
+    if differenzen:
+        werte = np.cumsum(werte).astype(dtype)
+    return werte
+
+
+# Eine Partition (Zähler, Jahr, Lauf) schreiben: erst in eine temporäre Datei,
+# auf die Platte gebracht und dann umbenannt
+def _partition_schreiben(pfad, kopf, teile):
+    bloecke = []
+    spalten = {}
+    position = 0
+    for art, werte in teile.items():
+        for (name, dtype, differenzen), spalte in zip(SPALTEN[art], werte):
+            block = _kodieren(np.ascontiguousarray(spalte, dtype=dtype), differenzen)
+            spalten[f"{art}.{name}"] = [position, len(block), len(spalte)]
+            bloecke.append(block)
+            position += len(block)
+    kopf_bytes = json.dumps(dict(kopf, spalten=spalten)).encode('utf-8')
+    temp = f"{pfad}.tmp"
+    with open(temp, 'wb') as datei:
+        datei.write(KENNUNG + struct.pack('<Q', len(kopf_bytes)) + kopf_bytes)
+        for block in bloecke:
+            datei.write(block)
+        datei.flush()
+        os.fsync(datei.fileno())
+    os.replace(temp, pfad)
+
+
+# Archivierte Zeilen eines Verzeichnisses lesen. Thread-sicher; ein Objekt je
+# Repository genügt.
+class Archiv:
+    def __init__(self, verzeichnis):
+        self.verzeichnis = verzeichnis
+        self._teile = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _zaehler_verzeichnis(self, zaehler_id):
+        return os.path.join(self.verzeichnis, f"zaehler_{zaehler_id}")
+
+    # [(jahr, lauf, pfad)] aller Dateien eines Zählers, nach Jahr und Lauf sortiert
+    def _dateien(self, zaehler_id):
+        try:
+            namen = os.listdir(self._zaehler_verzeichnis(zaehler_id))
+        except FileNotFoundError:
+            return []
+        dateien = []
+        for name in namen:
+            treffer = _DATEINAME.match(name)
+            if treffer:
+                dateien.append((int(treffer.group(1)), treffer.group(2),
+                                os.path.join(self._zaehler_verzeichnis(zaehler_id), name)))
+        return sorted(dateien)
+
+    # Spalten (ids, tage, werte) einer Art aus einer Datei, entpackt und zwischengespeichert
+    def _teil(self, pfad, art):
+        schluessel = (pfad, art)
+        with self._lock:
+            teil = self._teile.get(schluessel)
+            if teil is not None:
+                self._teile.move_to_end(schluessel)
+                return teil
+        with open(pfad, 'rb') as datei, mmap.mmap(datei.fileno(), 0, access=mmap.ACCESS_READ) as abbild:
+            if abbild[:len(KENNUNG)] != KENNUNG:
+                raise ArchivFehler(f"'{pfad}' ist keine Archivdatei.")
+            laenge, = struct.unpack_from('<Q', abbild, len(KENNUNG))
+            start = len(KENNUNG) + 8
+            kopf = json.loads(abbild[start:start + laenge].decode('utf-8'))
+            daten_start = start + laenge
+            teil = []
+            with memoryview(abbild) as ansicht:
+                for name, dtype, differenzen in SPALTEN[art]:
+                    position, groesse, anzahl = kopf['spalten'][f"{art}.{name}"]
+                    anfang = daten_start + position
+                    teil.append(_dekodieren(ansicht[anfang:anfang + groesse], dtype, anzahl, differenzen))
+        teil = tuple(teil)
+        with self._lock:
+            self._teile[schluessel] = teil
+            while len(self._teile) > MAX_TEILE:
+                self._teile.popitem(last=False)
+        return teil
+
+    # (ids, tage, werte) einer Art im Zeitraum von_datum..bis_datum (inklusive,
+    # ISO-Text oder None für offen) aus allen Läufen bis zum Stichtag, nach Datum sortiert
+    def _lesen(self, art, zaehler_id, stichtag, von_datum=None, bis_datum=None):
+        von_tag = None if von_datum is None else _tag(von_datum)
+        bis_tag = None if bis_datum is None else _tag(bis_datum)
+        von_jahr = int(von_datum[:4]) if von_datum else 0
+        bis_jahr = int(bis_datum[:4]) if bis_datum else 9999
+        stuecke = []
+        for jahr, lauf, pfad in self._dateien(zaehler_id):
+            if lauf > stichtag or not von_jahr <= jahr <= bis_jahr:
+                continue
+            ids, tage, werte = self._teil(pfad, art)
+            anfang = 0 if von_tag is None else np.searchsorted(tage, von_tag, 'left')
+            ende = len(tage) if bis_tag is None else np.searchsorted(tage, bis_tag, 'right')
+            if ende > anfang:
+                stuecke.append((ids[anfang:ende], tage[anfang:ende], werte[anfang:ende]))
+        dtypes = [dtype for _, dtype, _ in SPALTEN[art]]
+        if not stuecke:
+            return tuple(np.empty(0, dtype) for dtype in dtypes)
+        if len(stuecke) == 1:
+            return stuecke[0]
+        # Innerhalb eines Jahres liegen spätere Läufe hinter früheren
+        return tuple(np.concatenate([stueck[i] for stueck in stuecke]) for i in range(3))
+
+    def zaehlerstaende(self, zaehler_id, stichtag, von_datum=None, bis_datum=None):
+        return self._lesen('zaehlerstaende', zaehler_id, stichtag, von_datum, bis_datum)
+
+    def einzahlungen(self, zaehler_id, stichtag, von_datum=None, bis_datum=None):
+        return self._lesen('einzahlungen', zaehler_id, stichtag, von_datum, bis_datum)
+
+    def summe_einzahlungen(self, zaehler_id, stichtag, von_datum, bis_datum) -> int:
+        return int(self.einzahlungen(zaehler_id, stichtag, von_datum, bis_datum)[2].sum())
+
+    # Höchstens anzahl Zeilen (id, datum, wert) nach bzw. (rueckwaerts) vor dem
+    # Schlüssel (datum, id) im Zeitraum, aufsteigend sortiert; wie die blätternden
+    # Abfragen des Repositorys
+    def seite(self, art, zaehler_id, stichtag, von_datum, bis_datum, schluessel, anzahl, rueckwaerts) -> list:
+        if anzahl <= 0:
+            return []
+        datum, rowid = schluessel
+        if rueckwaerts:
+            ids, tage, werte = self._lesen(art, zaehler_id, stichtag, von_datum, min(datum, bis_datum))
+            tag = _tag(datum)
+            auswahl = np.flatnonzero((tage < tag) | ((tage == tag) & (ids < rowid)))[-anzahl:]
+        else:
+            ids, tage, werte = self._lesen(art, zaehler_id, stichtag, max(datum, von_datum), bis_datum)
+            tag = _tag(datum)
+            auswahl = np.flatnonzero((tage > tag) | ((tage == tag) & (ids > rowid)))[:anzahl]
+        return zeilen(ids[auswahl], tage[auswahl], werte[auswahl])
+
+    # Dateien von Läufen nach dem gültigen Stichtag (abgebrochen oder zurückgerollt) entfernen
+    def _verwaiste_entfernen(self, zaehler_id, stichtag):
+        for _, lauf, pfad in self._dateien(zaehler_id):
+            if stichtag is None or lauf > stichtag:
+                logging.warning(f"Verwaiste Archivdatei '{pfad}' wird entfernt.")
+                os.remove(pfad)
+        with self._lock:
+            self._teile.clear()
+
+    # Zeilen eines Zählers vor dem Stichtag je Jahr in Dateien dieses Laufs schreiben
+    def _lauf_schreiben(self, zaehler_id, stichtag, teile) -> list:
+        verzeichnis = self._zaehler_verzeichnis(zaehler_id)
+        os.makedirs(verzeichnis, exist_ok=True)
+        jahre = set()
+        for ids, tage, werte in teile.values():
+            jahre.update(tage.astype('datetime64[D]').astype('datetime64[Y]').astype(int) + 1970)
+        pfade = []
+        for jahr in sorted(jahre):
+            von_tag = _tag(f"{jahr:04d}-01-01")
+            bis_tag = _tag(f"{jahr + 1:04d}-01-01") if jahr < 9999 else None
+            jahresteile = {}
+            for art, (ids, tage, werte) in teile.items():
+                anfang = np.searchsorted(tage, von_tag, 'left')
+                ende = len(tage) if bis_tag is None else np.searchsorted(tage, bis_tag, 'left')
+                jahresteile[art] = (ids[anfang:ende], tage[anfang:ende], werte[anfang:ende])
+            pfad = os.path.join(verzeichnis, f"{jahr:04d}_{stichtag}{ENDUNG}")
+            _partition_schreiben(pfad, {'version': 1, 'zaehler_id': zaehler_id, 'jahr': int(jahr),
+                                        'stichtag': stichtag}, jahresteile)
+            pfade.append(pfad)
+        return pfade
+
+
+# Zeilen als (id, 'YYYY-MM-DD', wert) wie aus der Datenbank
+def zeilen(ids, tage, werte) -> list:
+    texte = tage.astype('datetime64[D]').astype(str).tolist()
+    return list(zip(ids.tolist(), texte, werte.tolist()))
+
+
+# Ablesungen und Einzahlungen vor dem Stichtag (Monatserster) ins Archiv
+# verschieben, für alle oder die angegebenen Zähler. Läuft als ein Auftrag des
+# Schreibers; liefert {zaehler_id: (ablesungen, einzahlungen)} der verschobenen Zeilen.
+def archivieren(repo, stichtag, zaehler_ids=None) -> dict:
+    stichtag = date.fromisoformat(str(stichtag)).isoformat()
+    if not stichtag.endswith('-01'):
+        raise ValueError(f"Der Stichtag {stichtag} ist kein Monatserster.")
+    archiv = repo.archiv
+    geschrieben = []
+
+    def verschieben(conn):
+        # Erst hier importiert: strom_rollup importiert dieses Modul. Vorgemerkte
+        # Monate der Gruppe zuerst nachführen, denn nach dem Verschieben stehen
+        # ihre Einzahlungen nur noch in tbl_monat.
+        import strom_rollup
+        strom_rollup.nachfuehren(conn)
+
+        ergebnis = {}
+        ids = zaehler_ids or [zaehler_id for zaehler_id, in conn.execute(SQL_ZAEHLER_ALLE)]
+        for zaehler_id in ids:
+            bisher = stichtag_lesen(conn, zaehler_id)
+            if bisher is not None and stichtag <= bisher:
+                ergebnis[zaehler_id] = (0, 0)
+                continue
+            archiv._verwaiste_entfernen(zaehler_id, bisher)
+
+            ablesetag = conn.execute(SQL_LETZTER_ABLESETAG, (zaehler_id, stichtag)).fetchone()[0] or ''
+            staende = np.fromiter(conn.execute(SQL_ZAEHLERSTAENDE_VOR, (zaehler_id, ablesetag)),
+                                  dtype=[('id', '<i8'), ('tag', '<i4'), ('wert', '<f8')])
+            zahlungen = np.fromiter(conn.execute(SQL_EINZAHLUNGEN_VOR, (zaehler_id, stichtag)),
+                                    dtype=[('id', '<i8'), ('tag', '<i4'), ('wert', '<i8')])
+            teile = {art: (daten['id'], daten['tag'], daten['wert'])
+                     for art, daten in (('zaehlerstaende', staende), ('einzahlungen', zahlungen))}
+            geschrieben.extend(archiv._lauf_schreiben(zaehler_id, stichtag, teile))
+
+            # Ohne Eintrag in tbl_archiv greifen die Trigger nicht; der neue
+            # Stichtag gilt erst nach dem Löschen
+            conn.execute(SQL_STICHTAG_LOESCHEN, (zaehler_id,))
+            geloescht = (conn.execute(SQL_ZAEHLERSTAENDE_LOESCHEN, (zaehler_id, ablesetag)).rowcount,
+                         conn.execute(SQL_EINZAHLUNGEN_LOESCHEN, (zaehler_id, stichtag)).rowcount)
+            if geloescht != (len(staende), len(zahlungen)):
+                raise ArchivFehler(f"Zähler {zaehler_id}: {geloescht} Zeilen gelöscht, "
+                                   f"aber {len(staende)}/{len(zahlungen)} archiviert.")
+            conn.execute(SQL_STICHTAG_SETZEN, (zaehler_id, stichtag))
+            ergebnis[zaehler_id] = geloescht
+        return ergebnis
+
+    try:
+        return repo.schreiben(verschieben)
+    except BaseException:
+        # Zurückgerollt: die Dateien dieses Laufs wären ohnehin unsichtbar
+        for pfad in geschrieben:
+            try:
+                os.remove(pfad)
+            except OSError as e:
+                logging.warning(f"Archivdatei '{pfad}' konnte nicht entfernt werden: {e}")
+        raise
+
+
+# Aufruf: python3 strom_archiv.py 2023-01-01 [--zaehler 1 2] [--db pfad] [--vacuum]
+def main(argv=None):
+    import strom_repository
+
+    parser = argparse.ArgumentParser(description="Ablesungen und Einzahlungen vor einem Stichtag archivieren")
+    parser.add_argument('stichtag', help="Monatserster (YYYY-MM-01); ältere Zeilen werden archiviert")
+    parser.add_argument('--zaehler', type=int, nargs='*', help="nur diese Zähler (Standard: alle)")
+    parser.add_argument('--db', default=strom_repository.DB_PATH)
+    parser.add_argument('--vacuum', action='store_true', help="Datenbankdatei danach verkleinern")
+    args = parser.parse_args(argv)
+
+    try:
+        repo = strom_repository.get_repository(args.db)
+    except strom_repository.DatenbankFehler as e:
+        print(e, file=sys.stderr)
+        return 1
+    try:
+        start = time.perf_counter()
+        ergebnis = archivieren(repo, args.stichtag, args.zaehler)
+        dauer = time.perf_counter() - start
+    except (ValueError, OSError, ArchivFehler, strom_repository.DatenbankFehler) as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        repo.schliessen()
+
+    for zaehler_id, (ablesungen, einzahlungen) in ergebnis.items():
+        print(f"Zähler {zaehler_id}: {ablesungen} Ablesungen, {einzahlungen} Einzahlungen archiviert")
+    print(f"Fertig in {dauer:.2f} s, Archiv in '{verzeichnis_fuer(args.db)}'")
+
+    if args.vacuum:
+        conn = strom_repository.verbinden(args.db)
+        try:
+            conn.execute('VACUUM')
+        finally:
+            conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import strom_messung
+import strom_repository
+
+# Datenbankzugriffe und Berechnungen der Oberflächen im Hintergrund ausführen,
+# damit die Tk-Ereignisschleife nicht blockiert. Die Aufgaben laufen in einem
+# gemeinsamen ThreadPoolExecutor; der Tk-Hauptthread fragt ihre Ergebnisse per
+# after() ab und ruft die Rückrufe fertig bzw. fehler dort auf, denn Tk-Widgets
+# dürfen nur aus dem Hauptthread verändert werden.
+
+# Nicht mehr Threads als Verbindungen im Pool
+MAX_WORKER = strom_repository.POOL_GROESSE
+
+# Abstand der Abfrage fertiger Aufgaben in Millisekunden
+ABFRAGE_INTERVALL = 30
+
+
+# Name einer Aufgabe für die Laufzeitmessung, z. B. 'strom_cache.AbrechnungsCache.berechnen'
+def _aufgaben_name(funktion):
+    name = getattr(funktion, '__qualname__', type(funktion).__name__)
+    return f"{getattr(funktion, '__module__', None) or '?'}.{name}"
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# Gemeinsamer Executor für alle Fenster im Prozess
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKER, thread_name_prefix='strom_aufgabe')
+        return _executor
+
+
+class Aufgabe:
+    def __init__(self, future, fertig, fehler, schluessel):
+        self.future = future
+        self.fertig = fertig
+        self.fehler = fehler
+        self.schluessel = schluessel
+        self.abgebrochen = False
+
+
+# Aufgaben eines Fensters. Eine neue Aufgabe mit demselben Schlüssel ersetzt die
+# vorherige: Wartet diese noch, wird sie gar nicht erst ausgeführt, läuft sie
+# schon, wird ihr Ergebnis verworfen. Solange Aufgaben laufen, bewegt sich der
+# optionale Fortschrittsbalken (ttk.Progressbar im Modus 'indeterminate').
+class Aufgaben:
+    def __init__(self, widget, fortschritt=None, intervall=ABFRAGE_INTERVALL):
+        self.widget = widget
+        self.fortschritt = fortschritt
+        self.intervall = intervall
+        self._laufend = []
+        self._nach_schluessel = {}
+        self._abfrage = None
+        self._fortschritt_laeuft = False
+        widget.bind('<Destroy>', self._zerstoert, add='+')
+
+    # funktion(*args) im Hintergrund ausführen; fertig(ergebnis) bzw. fehler(exception)
+    # werden im Tk-Hauptthread aufgerufen
+    def starten(self, funktion, *args, fertig=None, fehler=None, schluessel=None) -> Aufgabe:
+        if strom_messung.aktiv():
+            funktion = strom_messung.gemessen(_aufgaben_name(funktion), art='aufgabe')(funktion)
+        aufgabe = Aufgabe(get_executor().submit(funktion, *args), fertig, fehler, schluessel)
+        self._laufend.append(aufgabe)
+        if schluessel is not None:
+            vorherige = self._nach_schluessel.get(schluessel)
+            if vorherige is not None:
+                self.abbrechen(vorherige)
+            self._nach_schluessel[schluessel] = aufgabe
+        if self._abfrage is None:
+            self._abfrage = self.widget.after(self.intervall, self._pruefen)
+        if self.fortschritt is not None and not self._fortschritt_laeuft:
+            self.fortschritt.start(self.intervall)
+            self._fortschritt_laeuft = True
+        return aufgabe
+
+    def abbrechen(self, aufgabe) -> None:
+        aufgabe.abgebrochen = True
+        aufgabe.future.cancel()
+        self._entfernen(aufgabe)
+        if not self._laufend:
+            self._anhalten()
+
+    def alle_abbrechen(self) -> None:
+        for aufgabe in list(self._laufend):
+            self.abbrechen(aufgabe)
+
+    # Ob noch (nicht abgebrochene) Aufgaben laufen
+    def beschaeftigt(self) -> bool:
+        return bool(self._laufend)
+
+    def _entfernen(self, aufgabe):
+        if aufgabe in self._laufend:
+            self._laufend.remove(aufgabe)
+        if self._nach_schluessel.get(aufgabe.schluessel) is aufgabe:
+            del self._nach_schluessel[aufgabe.schluessel]
+
+    def _anhalten(self):
+        if self._abfrage is not None:
+            self.widget.after_cancel(self._abfrage)
+            self._abfrage = None
+        if self._fortschritt_laeuft:
+            self.fortschritt.stop()
+            self._fortschritt_laeuft = False
+
+    def _pruefen(self):
+        self._abfrage = None
+        for aufgabe in [a for a in self._laufend if a.future.done()]:
+            self._entfernen(aufgabe)
+            try:
+                self._melden(aufgabe)
+            except Exception:
+                # Ein fehlerhafter Rückruf darf die Abfrage der übrigen Aufgaben nicht beenden
+                logging.exception("Fehler im Rückruf einer Hintergrundaufgabe")
+        if self._laufend:
+            if self._abfrage is None:
+                self._abfrage = self.widget.after(self.intervall, self._pruefen)
+        else:
+            self._anhalten()
+
+    # Ergebnis bzw. Fehler im Hauptthread an die Rückrufe weitergeben
+    def _melden(self, aufgabe):
+        if aufgabe.abgebrochen:
+            return
+        fehler = aufgabe.future.exception()
+        if fehler is not None:
+            if aufgabe.fehler:
+                aufgabe.fehler(fehler)
+            else:
+                logging.error("Fehler in Hintergrundaufgabe", exc_info=fehler)
+        elif aufgabe.fertig:
+            aufgabe.fertig(aufgabe.future.result())
+
+    def _zerstoert(self, event):
+        if event.widget is self.widget:
+            self.alle_abbrechen()
@@ -0,0 +1,166 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import strom_abrechnung
+import strom_export
+import strom_repository
+import strom_testdaten
+
+# Abrechnungslauf über viele Zähler (z. B. zum Jahresende) mit mehreren Prozessen.
+# Die Zähler werden in Blöcke (Shards) aufgeteilt und an einen ProcessPoolExecutor
+# verteilt. Jeder Arbeitsprozess öffnet die Datenbank einmal nur lesend (mode=ro)
+# und rechnet seine Zähler mit derselben Abrechnungsengine wie die GUI. Die
+# Ergebnisse fließen in der Reihenfolge ihrer Fertigstellung zurück an den
+# Hauptprozess, der als einziger schreibt.
+
+# Zähler je Shard: klein genug für gleichmäßige Auslastung, groß genug, damit
+# sich der Versand zwischen den Prozessen nicht bemerkbar macht
+SHARD_GROESSE = 50
+
+# Repository des Arbeitsprozesses, angelegt von _worker_starten
+_repo = None
+
+
+# Initialisierung jedes Arbeitsprozesses: eigene, nur lesende Verbindung
+def _worker_starten(db_path):
+    global _repo
+    _repo = strom_repository.StromRepository(db_path, pool_groesse=1, nur_lesen=True)
+
+
+# Alle Perioden für die Zähler eines Shards abrechnen. Liefert
+# [(zaehler_id, [Abrechnung, ...] oder None, Fehlertext oder None), ...]
+def _shard_abrechnen(zaehler_ids, perioden):
+    ergebnisse = []
+    for zaehler_id in zaehler_ids:
+        try:
+            abrechnungen = strom_abrechnung.berechnen_perioden(perioden, _repo, zaehler_id)
+            ergebnisse.append((zaehler_id, abrechnungen, None))
+        except strom_abrechnung.BerechnungsFehler as e:
+            ergebnisse.append((zaehler_id, None, str(e)))
+    return ergebnisse
+
+
+# Liste in Blöcke zu je groesse Elementen teilen
+def shards(zaehler_ids, groesse=SHARD_GROESSE):
+    return [zaehler_ids[i:i + groesse] for i in range(0, len(zaehler_ids), groesse)]
+
+
+# Abrechnungslauf für alle (oder die angegebenen) Zähler als Generator von
+# (zaehler_id, Abrechnung) in der Reihenfolge der Fertigstellung; der Aufrufer
+# ist der einzige Schreiber. Zähler ohne Abrechnung gehen an fehler(zaehler_id, text).
+def batch_ergebnisse(db_path, perioden, worker=None, shard_groesse=SHARD_GROESSE, zaehler_ids=None, fehler=None):
+    perioden = [(strom_abrechnung.als_datum(start), strom_abrechnung.als_datum(ende)) for start, ende in perioden]
+    if zaehler_ids is None:
+        repo = strom_repository.StromRepository(db_path, pool_groesse=1, nur_lesen=True)
+        try:
+            zaehler_ids = [zeile[0] for zeile in repo.zaehler_daten()]
+        finally:
+            repo.schliessen()
+
+    with ProcessPoolExecutor(max_workers=worker or os.cpu_count(),
+                             initializer=_worker_starten, initargs=(db_path,)) as executor:
+        futures = [executor.submit(_shard_abrechnen, shard, perioden)
+                   for shard in shards(zaehler_ids, shard_groesse)]
+        for future in as_completed(futures):
+            for zaehler_id, abrechnungen, fehlertext in future.result():
+                if abrechnungen is None:
+                    if fehler:
+                        fehler(zaehler_id, fehlertext)
+                    continue
+                for abrechnung in abrechnungen:
+                    yield zaehler_id, abrechnung
+
+
+# Abrechnungslauf mit Export in eine offene Datei (CSV, JSON Lines oder PDF);
+# liefert die Anzahl geschriebener Abrechnungen
+def batch_abrechnen(db_path, perioden, ausgabe, worker=None, shard_groesse=SHARD_GROESSE,
+                    zaehler_ids=None, fehler=None, format='csv') -> int:
+    ergebnisse = batch_ergebnisse(db_path, perioden, worker, shard_groesse, zaehler_ids, fehler)
+    return strom_export.exportieren_in(ergebnisse, ausgabe, format)
+
+
+# Testdatenbank mit anzahl_zaehler Zählern: tägliche Ablesungen über ein Jahr,
+# Tarife und monatliche Abschläge je Zähler (siehe strom_testdaten)
+def testdatenbank_erstellen(db_path, anzahl_zaehler, jahr=2024, seed=1):
+    strom_testdaten.erzeugen(db_path, anzahl_zaehler, jahre=1, ablesungen_je_tag=1, erstes_jahr=jahr, seed=seed)
+    return db_path
+
+
+# Laufzeit des Abrechnungslaufs für 1 bis max_worker Prozesse messen; liefert
+# [(worker, sekunden), ...]. Die Ausgabe wird verworfen, gemessen wird nur die
+# Berechnung samt Rückgabe an den schreibenden Prozess.
+def benchmark(db_path, perioden, max_worker=None, shard_groesse=SHARD_GROESSE):
+    messungen = []
+    with open(os.devnull, 'w') as ausgabe:
+        for worker in range(1, (max_worker or os.cpu_count()) + 1):
+            start = time.perf_counter()
+            batch_abrechnen(db_path, perioden, ausgabe, worker, shard_groesse)
+            messungen.append((worker, time.perf_counter() - start))
+    return messungen
+
+
+# Aufruf: python3 strom_batch.py 2024-01-01 2024-12-31 [--frequenz monatlich] [--worker 8] [--ausgabe jahr.pdf]
+#         python3 strom_batch.py 2024-01-01 2024-12-31 --benchmark [--testdaten 2000]
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Abrechnungslauf über alle Zähler mit mehreren Prozessen")
+    parser.add_argument('start', help="Startdatum (YYYY-MM-DD)")
+    parser.add_argument('ende', help="Enddatum (YYYY-MM-DD)")
+    parser.add_argument('--frequenz', choices=sorted(strom_abrechnung.FREQUENZEN),
+                        help="Zeitraum in Perioden dieser Länge aufteilen")
+    parser.add_argument('--worker', type=int, default=os.cpu_count(),
+                        help="Anzahl Prozesse (beim Benchmark die höchste gemessene Anzahl)")
+    parser.add_argument('--shard', type=int, default=SHARD_GROESSE, help="Zähler je Auftrag an einen Prozess")
+    parser.add_argument('--ausgabe', help="Zieldatei statt Standardausgabe")
+    parser.add_argument('--format', choices=sorted(strom_export.EXPORTE),
+                        help="Standard: aus der Dateiendung von --ausgabe, sonst csv")
+    parser.add_argument('--db', default=strom_repository.DB_PATH)
+    parser.add_argument('--benchmark', action='store_true', help="Skalierung von 1 bis --worker Prozessen messen")
+    parser.add_argument('--testdaten', type=int, metavar='ZAEHLER',
+                        help="Benchmark auf einer temporären Datenbank mit ZAEHLER synthetischen Zählern")
+    args = parser.parse_args(argv)
+
+    fehlgeschlagen = []
+
+    def fehler(zaehler_id, text):
+        fehlgeschlagen.append(zaehler_id)
+        print(f"Zähler {zaehler_id}: {text}", file=sys.stderr)
+
+    try:
+        if args.frequenz:
+            perioden = strom_abrechnung.perioden_nach_frequenz(args.start, args.ende, args.frequenz)
+        else:
+            perioden = [(args.start, args.ende)]
+
+        if args.benchmark:
+            with tempfile.TemporaryDirectory() as verzeichnis:
+                db_path = args.db
+                if args.testdaten:
+                    db_path = testdatenbank_erstellen(os.path.join(verzeichnis, 'benchmark.db'), args.testdaten)
+                messungen = benchmark(db_path, perioden, args.worker, args.shard)
+            basis = messungen[0][1]
+            print("worker;sekunden;beschleunigung;effizienz")
+            for worker, sekunden in messungen:
+                print(f"{worker};{sekunden:.3f};{basis / sekunden:.2f};{basis / sekunden / worker:.0%}")
+            return 0
+
+        ergebnisse = batch_ergebnisse(args.db, perioden, args.worker, args.shard, fehler=fehler)
+        if args.ausgabe:
+            anzahl = strom_export.exportieren(ergebnisse, args.ausgabe, args.format)
+        else:
+            format = args.format or 'csv'
+            ausgabe = sys.stdout.buffer if strom_export.EXPORTE[format].binaer else sys.stdout
+            anzahl = strom_export.exportieren_in(ergebnisse, ausgabe, format)
+    except (OSError, ValueError, strom_repository.DatenbankFehler) as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    print(f"{anzahl} Abrechnungen geschrieben, {len(fehlgeschlagen)} Zähler ohne Abrechnung", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
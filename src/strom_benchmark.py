@@ -0,0 +1,318 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import strom_abrechnung
+import strom_cache
+import strom_repository
+import strom_rollup
+import strom_testdaten
+import strom_verlauf
+
+# Benchmarks der Datenpfade (Einfügen, Bereichsabfragen, Löschen, Abrechnung)
+# auf einer synthetischen Datenbank aus strom_testdaten. Jeder Fall wird mit
+# vorab reproduzierbar gewählten Parametern wiederholt; berichtet werden
+# Perzentile der Einzelzeiten. Die Ergebnisse lassen sich als Baseline (JSON)
+# speichern und spätere Läufe dagegen vergleichen: ist der Median eines Falls
+# um mehr als die Toleranz langsamer, endet der Lauf mit Exit-Code 1.
+# Eingefügte Daten werden in den Lösch-Fällen wieder entfernt, eine vorhandene
+# Testdatenbank bleibt also für weitere Läufe gleich.
+
+BASELINE = os.path.join(strom_repository.script_dir, 'benchmark_baseline.json')
+
+WIEDERHOLUNGEN = 200
+ZAEHLER = 2
+
+# Langsamer als Baseline * (1 + TOLERANZ) gilt als Verschlechterung, sofern der
+# Unterschied mindestens MINDESTABSTAND_MS beträgt (Rauschen bei sehr kurzen Fällen)
+TOLERANZ = 0.25
+MINDESTABSTAND_MS = 0.1
+
+SQL_MAX_ID = {
+    'tbl_zaehlerstand': 'SELECT COALESCE(MAX(id), 0) FROM tbl_zaehlerstand',
+    'tbl_einzahlungen': 'SELECT COALESCE(MAX(id), 0) FROM tbl_einzahlungen',
+}
+SQL_IDS_NACH = {
+    'tbl_zaehlerstand': 'SELECT id FROM tbl_zaehlerstand WHERE id > ? ORDER BY id',
+    'tbl_einzahlungen': 'SELECT id FROM tbl_einzahlungen WHERE id > ? ORDER BY id',
+}
+
+
+# Einzelzeiten eines Falls in Sekunden
+@dataclass
+class Messung:
+    name: str
+    zeiten: list
+
+    def kennzahlen(self) -> dict:
+        zeiten = sorted(self.zeiten)
+        return {
+            'n': len(zeiten),
+            'mittel_ms': sum(zeiten) / len(zeiten) * 1000 if zeiten else 0.0,
+            'p50_ms': perzentil(zeiten, 0.50) * 1000,
+            'p90_ms': perzentil(zeiten, 0.90) * 1000,
+            'p99_ms': perzentil(zeiten, 0.99) * 1000,
+            'max_ms': zeiten[-1] * 1000 if zeiten else 0.0,
+        }
+
+
+# Wert des Anteils p (0..1) aus einer sortierten Liste (nächster Rang)
+def perzentil(werte, p):
+    if not werte:
+        return 0.0
+    return werte[min(len(werte) - 1, int(p * len(werte)))]
+
+
+# funktion(*parameter) für jeden Eintrag der Parameterliste einzeln messen
+def messen(name, funktion, parameterliste) -> Messung:
+    zeiten = []
+    for parameter in parameterliste:
+        start = time.perf_counter()
+        funktion(*parameter)
+        zeiten.append(time.perf_counter() - start)
+    return Messung(name, zeiten)
+
+
+def _max_id(repo, tabelle):
+    with repo.pool.verbindung() as conn:
+        return conn.execute(SQL_MAX_ID[tabelle]).fetchone()[0]
+
+
+def _ids_nach(repo, tabelle, rowid):
+    with repo.pool.verbindung() as conn:
+        return [zeile[0] for zeile in conn.execute(SQL_IDS_NACH[tabelle], (rowid,))]
+
+
+# Alle Fälle auf einer Testdatenbank mit Daten von erstes_jahr über jahre Jahre
+# messen; faelle schränkt auf Fälle ein, deren Name einen der Texte enthält
+def benchmark(repo, erstes_jahr, jahre, wiederholungen=WIEDERHOLUNGEN, seed=1, faelle=None) -> list:
+    zufall = random.Random(seed)
+    zaehler_ids = [zaehler_id for zaehler_id, _, bezeichnung in repo.zaehler_daten()
+                   if bezeichnung.startswith("Testzähler")]
+    if not zaehler_ids:
+        raise ValueError("Die Datenbank enthält keine Testzähler aus strom_testdaten.")
+    anfang = date(erstes_jahr, 1, 1)
+    tage = (date(erstes_jahr + jahre, 1, 1) - anfang).days
+    ende = anfang + timedelta(days=tage - 1)
+    n = wiederholungen
+
+    def zaehler():
+        return zufall.choice(zaehler_ids)
+
+    def tag(rand=0):
+        return anfang + timedelta(days=zufall.randrange(tage - rand))
+
+    def monat():
+        von = tag(31)
+        return von, von + timedelta(days=30)
+
+    def jahr():
+        von = tag(365) if tage > 365 else anfang
+        return von, min(ende, von + timedelta(days=364))
+
+    # anzahl ganze Monate ('YYYY-MM', 'YYYY-MM') innerhalb der Daten
+    def ganze_monate(anzahl):
+        erster = erstes_jahr * 12 + zufall.randrange(max(1, jahre * 12 - anzahl + 1))
+        letzter = erster + anzahl - 1
+        return f"{erster // 12:04d}-{erster % 12 + 1:02d}", f"{letzter // 12:04d}-{letzter % 12 + 1:02d}"
+
+    messungen = []
+
+    def fall(name, funktion, parameterliste):
+        if faelle and not any(text in name for text in faelle):
+            return
+        messungen.append(messen(name, funktion, parameterliste))
+
+    # --- Lesen ---
+    fall("zaehlerstaende_zwischen_daten 1 Monat", repo.zaehlerstaende_zwischen_daten,
+         [(*monat(), zaehler()) for _ in range(n)])
+    fall("zaehlerstaende_seite 200", lambda von, zaehler_id: repo.zaehlerstaende_seite(
+        von, ende, (von.isoformat(), 0), 200, zaehler_id=zaehler_id),
+         [(tag(31), zaehler()) for _ in range(n)])
+    fall("einzahlungen_zwischen_daten 1 Jahr", repo.einzahlungen_zwischen_daten,
+         [(*jahr(), zaehler()) for _ in range(n)])
+    fall("berechgrundl_daten", repo.berechgrundl_daten, [(zaehler(),) for _ in range(n)])
+    fall("verbrauch_zwischen 1 Jahr", repo.verbrauch_zwischen, [(*jahr(), zaehler()) for _ in range(n)])
+
+    # --- Abrechnung (ohne Zwischenspeicher) ---
+    fall("berechnen 1 Monat", lambda von, bis, zaehler_id: strom_abrechnung.berechnen(von, bis, repo, zaehler_id),
+         [(*monat(), zaehler()) for _ in range(n)])
+    fall("berechnen 1 Jahr", lambda von, bis, zaehler_id: strom_abrechnung.berechnen(von, bis, repo, zaehler_id),
+         [(*jahr(), zaehler()) for _ in range(n)])
+    perioden = strom_abrechnung.perioden_nach_frequenz(anfang, ende, 'monatlich')
+    fall(f"berechnen_perioden {len(perioden)} Monate", strom_abrechnung.berechnen_perioden,
+         [(perioden, repo, zaehler()) for _ in range(max(1, n // 10))])
+    fall("berechnen_alle_zaehler 1 Jahr", strom_abrechnung.berechnen_alle_zaehler,
+         [(*jahr(), repo) for _ in range(max(1, n // 10))])
+    cache = strom_cache.AbrechnungsCache(repo)
+    von, bis = jahr()
+    cache.berechnen(von, bis, zaehler_ids[0])
+    fall("berechnen Cache-Treffer", cache.berechnen, [(von, bis, zaehler_ids[0]) for _ in range(n)])
+
+    # --- Monats- und Jahressummen (tbl_monat, tbl_jahr) ---
+    fall("rollup summe 12 Monate", lambda von, bis, zaehler_id: strom_rollup.summe(repo, von, bis, zaehler_id),
+         [(*ganze_monate(12), zaehler()) for _ in range(n)])
+    fall(f"rollup summe {jahre * 12} Monate", lambda von, bis, zaehler_id: strom_rollup.summe(
+        repo, von, bis, zaehler_id), [(*ganze_monate(jahre * 12), zaehler()) for _ in range(n)])
+    fall("rollup monatswerte 12 Monate", lambda von, bis, zaehler_id: strom_rollup.monatswerte(
+        repo, von, bis, zaehler_id), [(*ganze_monate(12), zaehler()) for _ in range(n)])
+
+    # --- Abrechnung aus dem Verlaufsspeicher (Spalten im Arbeitsspeicher) ---
+    if not faelle or any(text in "verlauf berechnen_perioden" for text in faelle):
+        speicher = strom_verlauf.Verlaufsspeicher.laden(repo, zaehler_ids)
+        fall("verlauf berechnen 1 Jahr", lambda von, bis, zaehler_id: strom_abrechnung.berechnen(
+            von, bis, speicher, zaehler_id), [(*jahr(), zaehler()) for _ in range(n)])
+        fall(f"verlauf berechnen_perioden {len(perioden)} Monate", strom_abrechnung.berechnen_perioden,
+             [(perioden, speicher, zaehler()) for _ in range(max(1, n // 10))])
+
+    # --- Einfügen: einzelne Korrekturen mitten in den Daten, Tagesblöcke am Ende ---
+    erste_ablesung = _max_id(repo, 'tbl_zaehlerstand')
+    erste_einzahlung = _max_id(repo, 'tbl_einzahlungen')
+    fall("insert_zaehlerstand", lambda datum, zaehler_id: repo.insert_zaehlerstand(
+        datum, 0.0, zaehler_id=zaehler_id), [(tag(), zaehler()) for _ in range(n)])
+    bloecke = []
+    for nummer in range(max(1, n // 10)):
+        datum = (ende + timedelta(days=nummer + 1)).isoformat()
+        bloecke.append(([(datum, 10_000_000.0 + i) for i in range(96)], zaehler()))
+    fall("insert_zaehlerstaende 96", lambda zeilen, zaehler_id: repo.insert_zaehlerstaende(
+        zeilen, zaehler_id=zaehler_id), bloecke)
+    fall("insert_einzahlung", lambda datum, zaehler_id: repo.insert_einzahlung(
+        datum, 100, zaehler_id=zaehler_id), [(tag(), zaehler()) for _ in range(n)])
+    tarif_von = ende + timedelta(days=1000)
+    tarife = [(tarif_von + timedelta(days=i), zaehler()) for i in range(n)]
+    fall("insert_berechgrundl", lambda datum, zaehler_id: repo.insert_berechgrundl(
+        datum, datum, 1000, 300_000, zaehler_id=zaehler_id), tarife)
+
+    # --- Löschen: genau die eben eingefügten Zeilen; gemessen werden höchstens n ---
+    ablesungen = _ids_nach(repo, 'tbl_zaehlerstand', erste_ablesung)
+    zufall.shuffle(ablesungen)
+    fall("delete_zaehlerstand", repo.delete_zaehlerstand, [(rowid,) for rowid in ablesungen[:n]])
+    fall("delete_einzahlung", repo.delete_einzahlung,
+         [(rowid,) for rowid in _ids_nach(repo, 'tbl_einzahlungen', erste_einzahlung)])
+    fall("delete_berechgrundl", lambda datum, zaehler_id: repo.delete_berechgrundl(
+        datum, datum, zaehler_id=zaehler_id), tarife)
+
+    # Aufräumen, auch wenn Fälle ausgelassen wurden
+    for rowid in _ids_nach(repo, 'tbl_zaehlerstand', erste_ablesung):
+        repo.delete_zaehlerstand(rowid)
+    for rowid in _ids_nach(repo, 'tbl_einzahlungen', erste_einzahlung):
+        repo.delete_einzahlung(rowid)
+    for datum, zaehler_id in tarife:
+        repo.delete_berechgrundl(datum, datum, zaehler_id=zaehler_id)
+    return messungen
+
+
+# Vergleich mit der Baseline: [(name, kennzahlen, baseline_kennzahlen oder None, faktor, verschlechtert)]
+def vergleichen(ergebnisse, baseline, toleranz=TOLERANZ):
+    vergleich = []
+    for name, kennzahlen in ergebnisse.items():
+        alt = baseline.get('ergebnisse', {}).get(name)
+        if alt is None:
+            vergleich.append((name, kennzahlen, None, None, False))
+            continue
+        faktor = kennzahlen['p50_ms'] / alt['p50_ms'] if alt['p50_ms'] else float('inf')
+        verschlechtert = (kennzahlen['p50_ms'] > alt['p50_ms'] * (1 + toleranz)
+                          and kennzahlen['p50_ms'] - alt['p50_ms'] >= MINDESTABSTAND_MS)
+        vergleich.append((name, kennzahlen, alt, faktor, verschlechtert))
+    return vergleich
+
+
+def _umgebung():
+    return {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+            'system': platform.platform(), 'cpus': os.cpu_count()}
+
+
+# Aufruf: python3 strom_benchmark.py [--zaehler 2] [--jahre 10] [--ablesungen-je-tag 96] [--db bench.db]
+#         python3 strom_benchmark.py --baseline-speichern      (Ergebnisse als Baseline ablegen)
+#         python3 strom_benchmark.py [--baseline datei.json]   (mit Baseline vergleichen, falls vorhanden)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks für Einfügen, Abfragen, Löschen und Abrechnung")
+    parser.add_argument('--zaehler', type=int, default=ZAEHLER)
+    parser.add_argument('--jahre', type=int, default=strom_testdaten.JAHRE)
+    parser.add_argument('--ablesungen-je-tag', type=int, default=strom_testdaten.ABLESUNGEN_JE_TAG)
+    parser.add_argument('--erstes-jahr', type=int, default=strom_testdaten.ERSTES_JAHR)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--wiederholungen', type=int, default=WIEDERHOLUNGEN)
+    parser.add_argument('--db', help="Testdatenbank; wird erzeugt, falls nicht vorhanden, und behalten "
+                                     "(Standard: temporär)")
+    parser.add_argument('--fall', action='append', help="Nur Fälle, deren Name den Text enthält (mehrfach möglich)")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--baseline-speichern', action='store_true', help="Ergebnisse als neue Baseline speichern")
+    parser.add_argument('--toleranz', type=float, default=TOLERANZ,
+                        help="Erlaubte Verlangsamung des Medians gegenüber der Baseline (0.25 = 25 %%)")
+    args = parser.parse_args(argv)
+    if args.wiederholungen < 1:
+        parser.error("--wiederholungen muss positiv sein")
+
+    konfiguration = {'zaehler': args.zaehler, 'jahre': args.jahre, 'ablesungen_je_tag': args.ablesungen_je_tag,
+                     'erstes_jahr': args.erstes_jahr, 'seed': args.seed, 'wiederholungen': args.wiederholungen}
+
+    def fortschritt(nummer, zaehler):
+        print(f"\rTestdaten: Zähler {nummer} von {zaehler}", end='' if nummer < zaehler else '\n',
+              file=sys.stderr, flush=True)
+
+    try:
+        with tempfile.TemporaryDirectory() as verzeichnis:
+            db_path = args.db or os.path.join(verzeichnis, 'benchmark.db')
+            if not os.path.exists(db_path):
+                strom_testdaten.erzeugen(db_path, args.zaehler, args.jahre, args.ablesungen_je_tag,
+                                         args.erstes_jahr, args.seed, fortschritt)
+            repo = strom_repository.StromRepository(db_path)
+            try:
+                messungen = benchmark(repo, args.erstes_jahr, args.jahre, args.wiederholungen, args.seed, args.fall)
+            finally:
+                repo.schliessen()
+    except (OSError, ValueError, strom_repository.DatenbankFehler) as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    ergebnisse = {messung.name: messung.kennzahlen() for messung in messungen}
+    baseline = None
+    if not args.baseline_speichern and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as datei:
+            baseline = json.load(datei)
+        if baseline.get('konfiguration') != konfiguration:
+            print(f"Hinweis: Die Baseline wurde mit {baseline.get('konfiguration')} gemessen.", file=sys.stderr)
+
+    verschlechtert = []
+    if baseline is None:
+        print("fall;n;p50_ms;p90_ms;p99_ms;max_ms")
+        for name, k in ergebnisse.items():
+            print(f"{name};{k['n']};{k['p50_ms']:.3f};{k['p90_ms']:.3f};{k['p99_ms']:.3f};{k['max_ms']:.3f}")
+    else:
+        print("fall;n;p50_ms;p90_ms;p99_ms;max_ms;baseline_p50_ms;faktor")
+        for name, k, alt, faktor, langsamer in vergleichen(ergebnisse, baseline, args.toleranz):
+            zeile = f"{name};{k['n']};{k['p50_ms']:.3f};{k['p90_ms']:.3f};{k['p99_ms']:.3f};{k['max_ms']:.3f}"
+            if alt is None:
+                zeile += ";;"
+            else:
+                zeile += f";{alt['p50_ms']:.3f};{faktor:.2f}"
+            if langsamer:
+                zeile += ";LANGSAMER"
+                verschlechtert.append(name)
+            print(zeile)
+
+    if args.baseline_speichern:
+        with open(args.baseline, 'w', encoding='utf-8') as datei:
+            json.dump({'konfiguration': konfiguration, 'umgebung': _umgebung(), 'ergebnisse': ergebnisse},
+                      datei, indent=2, ensure_ascii=False)
+            datei.write("\n")
+        print(f"Baseline gespeichert in {args.baseline}", file=sys.stderr)
+
+    if verschlechtert:
+        print(f"Langsamer als die Baseline (Toleranz {args.toleranz:.0%}): {', '.join(verschlechtert)}",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
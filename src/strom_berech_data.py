@@ -1,4 +1,3 @@
-import sqlite3
 import tkinter as tk
 from tkinter import messagebox
 from tkinter import ttk
@@ -6,60 +5,41 @@ from datetime import datetime
 import os
 import logging
 
+import strom_aufgaben
+import strom_betrag
+import strom_log
+import strom_repository
+
 # Arbeitsverzeichnis setzen
 script_dir = os.path.dirname(os.path.abspath(__file__))
 os.chdir(script_dir)
 
 # Logging einrichten
-logging.basicConfig(filename='/tmp/zaehlerstand_app.log', level=logging.DEBUG)
-
-# Funktion, um die Verbindung zur SQLite-Datenbank herzustellen
-def get_db_connection():
-    db_path = 'meine_datenbank.db'
-
-    # Überprüfen, ob die Datenbankdatei existiert
-    if not os.path.exists(db_path):
-        logging.error(f"Die Datenbank '{db_path}' existiert nicht.")
-        messagebox.showerror("Datenbankfehler", f"Die Datenbank '{db_path}' wurde nicht gefunden.")
-        return None
+strom_log.einrichten()
 
+# Funktion, um das gemeinsame Repository der Datenbank zu holen
+def get_repository():
     try:
-        conn = sqlite3.connect(db_path)
-        return conn
-    except sqlite3.Error as e:
+        return strom_repository.get_repository()
+    except strom_repository.DatenbankNichtGefunden:
+        # Die Datenbankdatei existiert nicht
+        logging.error(f"Die Datenbank '{strom_repository.DB_PATH}' existiert nicht.")
+        messagebox.showerror("Datenbankfehler", f"Die Datenbank '{strom_repository.DB_NAME}' wurde nicht gefunden.")
+        return None
+    except strom_repository.DatenbankFehler as e:
         logging.error(f"Fehler beim Verbinden mit der Datenbank: {e}")
         messagebox.showerror("Datenbankfehler", "Fehler beim Verbinden mit der Datenbank.")
         return None
 
-# Funktion, um alle Datensätze aus tbl_berechgrundl zu holen
-def get_berechgrundl_daten():
-    conn = get_db_connection()
-    if conn is None:
-        return []
-
-    cursor = conn.cursor()
-    cursor.execute('SELECT datum_von, datum_bis, grundpreis, kwh_preis FROM tbl_berechgrundl ORDER BY datum_von')
-    result = cursor.fetchall()
-    conn.close()
-    return result
+# Funktion, um Fehler einer Datenbankabfrage im Hintergrund zu melden
+def db_fehler(fehler):
+    logging.error(f"Fehler bei der Datenbankabfrage: {fehler}")
+    messagebox.showerror("Datenbankfehler", "Es gab einen Fehler bei der Datenbankabfrage.")
 
-# Funktion, um einen Datensatz aus tbl_berechgrundl zu löschen
-def delete_berechgrundl_from_db(datum_von, datum_bis):
-    conn = get_db_connection()
-    if conn is None:
-        return False
-
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM tbl_berechgrundl WHERE datum_von = ? AND datum_bis = ?', (datum_von, datum_bis))
-    conn.commit()
-    conn.close()
-
-    return True
-
-# Tkinter GUI-Klasse
-class BerechGrundlApp(tk.Tk):
-    def __init__(self):
-        super().__init__()
+# Tkinter GUI-Klasse als Toplevel; strom_index öffnet sie ohne eigenen Prozess
+class BerechGrundlApp(tk.Toplevel):
+    def __init__(self, master=None):
+        super().__init__(master)
 
         # Initialisierung der GUI-Komponenten
         self.title("Grundpreis und kWh-Preis Eingabe")
@@ -120,6 +100,11 @@ class BerechGrundlApp(tk.Tk):
         self.table.heading("kWh-Preis", text="kWh-Preis (Cent/kWh)")
         self.table.pack(pady=10)
 
+        # Fortschrittsanzeige, solange Datenbankzugriffe im Hintergrund laufen
+        self.fortschritt = ttk.Progressbar(self, mode="indeterminate")
+        self.fortschritt.pack(fill=tk.X, padx=20)
+        self.aufgaben = strom_aufgaben.Aufgaben(self, self.fortschritt)
+
     def save_berechgrundl(self):
         datum_von = self.datum_von_input.get()
         datum_bis = self.datum_bis_input.get()
@@ -128,58 +113,60 @@ class BerechGrundlApp(tk.Tk):
 
         try:
             # Datum validieren (Format: YYYY-MM-DD)
-            datetime.strptime(datum_von, "%Y-%m-%d")
-            datetime.strptime(datum_bis, "%Y-%m-%d")
-
-            # Komma durch Punkt ersetzen, falls vorhanden
-            grundpreis_input = grundpreis_input.replace(",", ".")
-            kwh_preis_input = kwh_preis_input.replace(",", ".")
+            datum_von = datetime.strptime(datum_von, "%Y-%m-%d").date().isoformat()
+            datum_bis = datetime.strptime(datum_bis, "%Y-%m-%d").date().isoformat()
+
+            # Preiswerte validieren und exakt umrechnen (Komma oder Punkt als
+            # Dezimaltrennzeichen): Grundpreis in Cent, Arbeitspreis skaliert
+            grundpreis = strom_betrag.cent(grundpreis_input)
+            kwh_preis = strom_betrag.preis(kwh_preis_input)
+            if grundpreis < 0 or kwh_preis < 0:
+                raise ValueError("Preise dürfen nicht negativ sein.")
+            if datum_von > datum_bis:
+                raise ValueError("Datum von muss vor Datum bis liegen.")
 
-            # Preiswerte validieren (sollten Zahlen sein)
-            grundpreis = float(grundpreis_input)
-            kwh_preis = float(kwh_preis_input)
-
-            # Daten in die Datenbank einfügen
-            self.insert_berechgrundl(datum_von, datum_bis, grundpreis, kwh_preis)
+        except ValueError:
+            messagebox.showerror("Ungültige Eingabe", "Bitte geben Sie gültige Daten ein!")
+            return
 
-            # Felder nach dem Speichern leeren
+        # Nach dem Speichern Felder leeren und Datensätze aktualisieren
+        def gespeichert(_):
             self.datum_von_input.delete(0, tk.END)
             self.datum_bis_input.delete(0, tk.END)
             self.grundpreis_input.delete(0, tk.END)
             self.kwh_preis_input.delete(0, tk.END)
 
             messagebox.showinfo("Erfolg", "Die Daten wurden erfolgreich gespeichert!")
-
-            # Datensätze nach dem Speichern aktualisieren
             self.update_datensaetze()
 
-        except ValueError:
-            messagebox.showerror("Ungültige Eingabe", "Bitte geben Sie gültige Daten ein!")
+        # Daten im Hintergrund in die Datenbank einfügen
+        self.insert_berechgrundl(datum_von, datum_bis, grundpreis, kwh_preis, gespeichert)
 
-    def insert_berechgrundl(self, datum_von, datum_bis, grundpreis, kwh_preis):
-        conn = get_db_connection()
-        if conn is None:
+    def insert_berechgrundl(self, datum_von, datum_bis, grundpreis, kwh_preis, fertig=None):
+        repo = get_repository()
+        if repo is None:
             return
 
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO tbl_berechgrundl (datum_von, datum_bis, grundpreis, kwh_preis)
-            VALUES (?, ?, ?, ?)
-        ''', (datum_von, datum_bis, grundpreis, kwh_preis))
-        conn.commit()
-        conn.close()
+        self.aufgaben.starten(repo.insert_berechgrundl, datum_von, datum_bis, grundpreis, kwh_preis,
+                              fertig=fertig, fehler=db_fehler)
 
     def update_datensaetze(self):
-        # Alle Datensätze aus der Datenbank holen
-        datensaetze = get_berechgrundl_daten()
+        repo = get_repository()
+        if repo is None:
+            return
 
-        # Leere die Tabelle
-        for row in self.table.get_children():
-            self.table.delete(row)
+        # Füge die Datensätze nach dem Laden in die leere Tabelle ein
+        def geladen(datensaetze):
+            for row in self.table.get_children():
+                self.table.delete(row)
+            for datum_von, datum_bis, grundpreis, kwh_preis in datensaetze:
+                self.table.insert("", "end", values=(datum_von, datum_bis, strom_betrag.euro_text(grundpreis),
+                                                     strom_betrag.preis_text(kwh_preis)))
 
-        # Füge die Datensätze in die Tabelle ein
-        for datum_von, datum_bis, grundpreis, kwh_preis in datensaetze:
-            self.table.insert("", "end", values=(datum_von, datum_bis, grundpreis, kwh_preis))
+        # Alle Datensätze im Hintergrund aus der Datenbank holen; eine noch
+        # laufende ältere Abfrage wird dabei verworfen
+        self.aufgaben.starten(repo.berechgrundl_daten, fertig=geladen, fehler=db_fehler,
+                              schluessel="datensaetze")
 
     def delete_berechgrundl(self):
         selected_item = self.table.selection()
@@ -187,20 +174,31 @@ class BerechGrundlApp(tk.Tk):
             datum_von = self.table.item(selected_item[0])["values"][0]
             datum_bis = self.table.item(selected_item[0])["values"][1]
 
-            # Löschen des Datensatzes aus der Datenbank
-            if delete_berechgrundl_from_db(datum_von, datum_bis):
-                # Tabelle nach dem Löschen aktualisieren
-                self.update_datensaetze()
-                messagebox.showinfo("Erfolg", "Der Datensatz wurde erfolgreich gelöscht!")
-            else:
-                messagebox.showerror("Fehler", "Fehler beim Löschen des Datensatzes.")
+            repo = get_repository()
+            if repo is None:
+                return
+
+            def geloescht(erfolg):
+                if erfolg:
+                    # Tabelle nach dem Löschen aktualisieren
+                    self.update_datensaetze()
+                    messagebox.showinfo("Erfolg", "Der Datensatz wurde erfolgreich gelöscht!")
+                else:
+                    messagebox.showerror("Fehler", "Fehler beim Löschen des Datensatzes.")
+
+            # Löschen des Datensatzes aus der Datenbank im Hintergrund
+            self.aufgaben.starten(repo.delete_berechgrundl, datum_von, datum_bis, fertig=geloescht, fehler=db_fehler)
         else:
             messagebox.showwarning("Keine Auswahl", "Bitte wählen Sie einen Datensatz zum Löschen aus.")
 
 # Main-Funktion zum Starten der App
 def main():
-    app = BerechGrundlApp()
-    app.mainloop()
+    # Alleinstehend ersetzt das Fenster das (verborgene) Hauptfenster
+    root = tk.Tk()
+    root.withdraw()
+    app = BerechGrundlApp(root)
+    app.protocol("WM_DELETE_WINDOW", root.destroy)
+    root.mainloop()
 
 if __name__ == '__main__':
     main()
@@ -1,38 +1,50 @@
 import sqlite3
 import tkinter as tk
+from tkinter import filedialog
 from tkinter import messagebox
+from tkinter import ttk
 from datetime import datetime
 import os
 import logging
 
+import strom_abrechnung
+import strom_aufgaben
+import strom_cache
+import strom_export
+import strom_log
+import strom_repository
+
 # Setze das Arbeitsverzeichnis auf das Verzeichnis des Skripts
 script_dir = os.path.dirname(os.path.abspath(__file__))
 os.chdir(script_dir)
 
-# Logging einrichten (mit lokalem Logfile im aktuellen Verzeichnis)
-logging.basicConfig(filename='stromabrechnung_app.log', level=logging.DEBUG)
+# Logging einrichten
+strom_log.einrichten()
 
 # Datenbankname als Konstante
-DB_NAME = 'meine_datenbank.db'
+DB_NAME = strom_repository.DB_NAME
 
-# Funktion, um die Verbindung zur SQLite-Datenbank herzustellen
-def get_db_connection():
+# Funktion, um das gemeinsame Repository der Datenbank zu holen
+def get_repository():
     try:
-        # Überprüfen, ob die Datenbankdatei existiert
-        if not os.path.exists(DB_NAME):
-            logging.error(f"Datenbank '{DB_NAME}' existiert nicht!")
-            messagebox.showerror("Datenbank nicht gefunden", f"Die Datenbank '{DB_NAME}' existiert nicht.")
-            return None
-        conn = sqlite3.connect(DB_NAME)
-        return conn
-    except sqlite3.Error as e:
+        return strom_repository.get_repository()
+    except strom_repository.DatenbankNichtGefunden:
+        logging.error(f"Datenbank '{DB_NAME}' existiert nicht!")
+        messagebox.showerror("Datenbank nicht gefunden", f"Die Datenbank '{DB_NAME}' existiert nicht.")
+        return None
+    except strom_repository.DatenbankFehler as e:
         logging.error(f"Fehler beim Verbinden mit der Datenbank: {e}")
         messagebox.showerror("Datenbankfehler", "Fehler beim Verbinden mit der Datenbank.")
         return None
 
-class StromabrechnungApp(tk.Tk):
-    def __init__(self):
-        super().__init__()
+# Schrittweise Ergebnisse einer Abrechnung als Text
+def abrechnung_text(abrechnung):
+    return "".join(zeile + "\n" for zeile in strom_export.zusammenfassung(abrechnung))
+
+# Toplevel statt Tk, damit die Abrechnung auch im Startfenster (strom_index) läuft
+class StromabrechnungApp(tk.Toplevel):
+    def __init__(self, master=None):
+        super().__init__(master)
 
         self.title("Stromabrechnung")
         self.geometry("500x500")
@@ -57,13 +69,32 @@ class StromabrechnungApp(tk.Tk):
         self.end_date_input.insert(0, datetime.today().strftime('%Y-%m-%d'))
         self.end_date_input.grid(row=1, column=1)
 
+        # Eingabefeld für den abzurechnenden Zähler
+        self.zaehler_label = tk.Label(layout, text="Zähler-Nr.:")
+        self.zaehler_label.grid(row=2, column=0, sticky="w")
+        self.zaehler_input = tk.Entry(layout)
+        self.zaehler_input.insert(0, str(strom_repository.STANDARD_ZAEHLER))
+        self.zaehler_input.grid(row=2, column=1)
+
         # Berechnungsbutton
         self.calc_button = tk.Button(layout, text="Berechnen", command=self.berechnen)
-        self.calc_button.grid(row=2, columnspan=2, pady=10)
+        self.calc_button.grid(row=3, column=0, pady=10)
+
+        # Export der Abrechnungen als CSV, JSON Lines oder PDF
+        self.export_button = tk.Button(layout, text="Exportieren...", command=self.exportieren)
+        self.export_button.grid(row=3, column=1, pady=10)
+        self.alle_zaehler = tk.BooleanVar(value=True)
+        self.alle_zaehler_check = tk.Checkbutton(layout, text="Export für alle Zähler", variable=self.alle_zaehler)
+        self.alle_zaehler_check.grid(row=4, columnspan=2)
 
         # Ergebnisanzeige
         self.result_label = tk.Label(layout, text="Ergebnis:")
-        self.result_label.grid(row=3, columnspan=2, pady=10)
+        self.result_label.grid(row=5, columnspan=2, pady=10)
+
+        # Fortschrittsanzeige, solange die Berechnung im Hintergrund läuft
+        self.fortschritt = ttk.Progressbar(layout, mode="indeterminate")
+        self.fortschritt.grid(row=6, columnspan=2, sticky="we")
+        self.aufgaben = strom_aufgaben.Aufgaben(self, self.fortschritt)
 
     def berechnen(self):
         start_datum_str = self.start_date_input.get()
@@ -73,100 +104,102 @@ class StromabrechnungApp(tk.Tk):
             # Datum validieren
             start_datum = datetime.strptime(start_datum_str, "%Y-%m-%d")
             end_datum = datetime.strptime(end_datum_str, "%Y-%m-%d")
+            zaehler_id = int(self.zaehler_input.get())
+        except ValueError:
+            self.eingabefehler(start_datum_str, end_datum_str)
+            return
+
+        repo = get_repository()
+        if repo is None:
+            return  # Wenn keine Verbindung zur DB möglich ist, breche ab
+
+        # Berechnung in der Abrechnungs-Engine im Hintergrund durchführen; eine noch
+        # laufende Berechnung für einen vorher eingegebenen Zeitraum wird verworfen.
+        # Unveränderte Zeiträume kommen aus dem Zwischenspeicher.
+        self.result_label.config(text="Berechnung läuft...")
+        self.aufgaben.starten(strom_cache.get_cache(repo).berechnen, start_datum, end_datum, zaehler_id,
+                              fertig=self.ergebnis_anzeigen,
+                              fehler=lambda e: self.berechnungsfehler(e, start_datum_str, end_datum_str),
+                              schluessel="berechnung")
+
+    # Abrechnungen des Zeitraums in eine Datei exportieren; das Format ergibt sich
+    # aus der Dateiendung. Der Export läuft im Hintergrund und schreibt laufend.
+    def exportieren(self):
+        start_datum_str = self.start_date_input.get()
+        end_datum_str = self.end_date_input.get()
 
-            # Berechnungen durchführen
-            eingabedatum = end_datum.date()
-
-            conn = get_db_connection()
-            if conn is None:
-                return  # Wenn keine Verbindung zur DB möglich ist, breche ab
-
-            cursor = conn.cursor()
-
-            # Schritt 1: Start- und Endzählerstand aus tbl_zaehlerstand holen
-            cursor.execute("""
-                SELECT datum, zaehlerstand 
-                FROM tbl_zaehlerstand
-                WHERE datum <= ?
-                ORDER BY datum
-            """, (eingabedatum,))
-            zaehlerstaende = cursor.fetchall()
-
-            verbrauch = 0
-            if zaehlerstaende:
-                start_zaehlerstand = zaehlerstaende[0][1]
-                end_zaehlerstand = zaehlerstaende[-1][1]
-                verbrauch = end_zaehlerstand - start_zaehlerstand
-
-            # Schritt 2: Einzahlungen bis zum angegebenen Datum
-            cursor.execute("""
-                SELECT SUM(einzahlungen)
-                FROM tbl_einzahlungen
-                WHERE datum <= ?
-            """, (eingabedatum,))
-            einzahlungen = cursor.fetchone()[0] or 0
-
-            # Schritt 3: Preis pro kWh und monatlicher Grundpreis
-            cursor.execute("""
-                SELECT kwh_preis, grundpreis
-                FROM tbl_berechgrundl
-                WHERE datum_von <= ? AND datum_bis >= ?
-                LIMIT 1
-            """, (eingabedatum, eingabedatum))
-            result = cursor.fetchone()
-
-            if result:
-                kwh_preis, grundpreis = result
-            else:
-                self.result_label.config(text="Daten für die Berechnung fehlen.")
-                conn.close()
-                return
-
-            # Berechnungen durchführen
-            verbrauchskosten = verbrauch * kwh_preis / 100
-            grundpreis_pro_tag = grundpreis / 30
-            tage_im_zeitraum = (end_datum - start_datum).days + 1  # Berechnung der Tage im Zeitraum
-            grundpreis_berechnet = grundpreis_pro_tag * tage_im_zeitraum
-            gesamtbetrag = verbrauchskosten + grundpreis_berechnet
-            saldo = einzahlungen - gesamtbetrag
-
-            # Schrittweise Ergebnisse ausgeben
-            result_text = (
-                f"1. Berechnete Tage im Zeitraum: {tage_im_zeitraum} Tage\n"  # Anzeigen der Tage
-                f"2. Gesamter Verbrauch: {verbrauch} kWh\n"
-                f"3. Gesamtkosten des Verbrauchs: {verbrauchskosten:.2f} EUR\n"
-                f"4. Gesamtsumme Grundpreis: {grundpreis_berechnet:.2f} EUR\n"
-                f"5. Gesamtsumme (Verbrauchskosten + Grundpreis): {gesamtbetrag:.2f} EUR\n"
-                f"6. Gesamte Einzahlungen: {einzahlungen:.2f} EUR\n"
-                f"7. Saldo (Einzahlungen - Gesamtbetrag): {saldo:.2f} EUR\n"
-
-            )
-
-            # Ergebnis anzeigen
-            self.result_label.config(text=result_text)
-
-            conn.close()
-
+        try:
+            start_datum = datetime.strptime(start_datum_str, "%Y-%m-%d")
+            end_datum = datetime.strptime(end_datum_str, "%Y-%m-%d")
+            zaehler_ids = None if self.alle_zaehler.get() else [int(self.zaehler_input.get())]
         except ValueError:
-            messagebox.showerror("Ungültige Eingabe", "Bitte geben Sie ein gültiges Datum im Format (YYYY-MM-DD) ein.")
-            logging.error(f"Fehler bei der Eingabe: Startdatum: {start_datum_str}, Enddatum: {end_datum_str}")
-        except sqlite3.Error as e:
+            self.eingabefehler(start_datum_str, end_datum_str)
+            return
+
+        pfad = filedialog.asksaveasfilename(
+            parent=self, title="Abrechnungen exportieren", defaultextension=".pdf",
+            filetypes=[("PDF", "*.pdf"), ("CSV", "*.csv"), ("JSON Lines", "*.jsonl")])
+        if not pfad:
+            return
+
+        repo = get_repository()
+        if repo is None:
+            return
+
+        # Zähler ohne Tarif werden im Hintergrund gesammelt und erst danach angezeigt
+        ohne_tarif = []
+        self.result_label.config(text="Export läuft...")
+        self.aufgaben.starten(strom_export.zaehler_exportieren, repo, [(start_datum, end_datum)], pfad, None,
+                              zaehler_ids, lambda zaehler_id, e: ohne_tarif.append(zaehler_id),
+                              fertig=lambda anzahl: self.export_fertig(anzahl, pfad, ohne_tarif),
+                              fehler=lambda e: self.berechnungsfehler(e, start_datum_str, end_datum_str),
+                              schluessel="export")
+
+    def export_fertig(self, anzahl, pfad, ohne_tarif):
+        text = f"{anzahl} Abrechnungen nach {os.path.basename(pfad)} exportiert."
+        if ohne_tarif:
+            text += f"\nOhne Berechnungsgrundlage: Zähler {', '.join(map(str, ohne_tarif))}"
+            logging.warning(f"Export ohne Berechnungsgrundlage für Zähler {ohne_tarif}")
+        self.result_label.config(text=text)
+
+    def ergebnis_anzeigen(self, abrechnung):
+        self.result_label.config(text=abrechnung_text(abrechnung))
+
+    def eingabefehler(self, start_datum_str, end_datum_str):
+        messagebox.showerror("Ungültige Eingabe", "Bitte geben Sie ein gültiges Datum im Format (YYYY-MM-DD) und eine Zähler-Nr. ein.")
+        logging.error(f"Fehler bei der Eingabe: Startdatum: {start_datum_str}, Enddatum: {end_datum_str}")
+
+    # Fehler aus der Berechnung im Hintergrund anzeigen
+    def berechnungsfehler(self, fehler, start_datum_str, end_datum_str):
+        self.result_label.config(text="Ergebnis:")
+        if isinstance(fehler, strom_abrechnung.FehlendeBerechnungsgrundlage):
+            self.result_label.config(text=str(fehler))
+        elif isinstance(fehler, ValueError):
+            self.eingabefehler(start_datum_str, end_datum_str)
+        elif isinstance(fehler, (sqlite3.Error, strom_repository.DatenbankFehler)):
             messagebox.showerror("Datenbankfehler", "Es gab einen Fehler bei der Datenbankabfrage.")
-            logging.error(f"SQLite-Fehler: {e}")
-        except Exception as e:
+            logging.error(f"SQLite-Fehler: {fehler}")
+        elif isinstance(fehler, OSError):
+            messagebox.showerror("Exportfehler", f"Die Datei konnte nicht geschrieben werden: {fehler}")
+            logging.error(f"Fehler beim Export: {fehler}")
+        else:
             messagebox.showerror("Unbekannter Fehler", "Es gab einen unerwarteten Fehler.")
-            logging.error(f"Unbekannter Fehler: {e}")
+            logging.error(f"Unbekannter Fehler: {fehler}")
 
 # Main-Funktion zum Starten der App
 def main():
     # Überprüfen, ob die Datenbank existiert
-    if not os.path.exists(DB_NAME):
+    if not os.path.exists(strom_repository.DB_PATH):
         messagebox.showerror("Datenbank nicht gefunden", f"Die Datenbank {DB_NAME} existiert nicht.")
         logging.error(f"Datenbank '{DB_NAME}' existiert nicht!")
         return
 
-    app = StromabrechnungApp()
-    app.mainloop()
+    # Alleinstehend ersetzt das Fenster das (verborgene) Hauptfenster
+    root = tk.Tk()
+    root.withdraw()
+    app = StromabrechnungApp(root)
+    app.protocol("WM_DELETE_WINDOW", root.destroy)
+    root.mainloop()
 
 if __name__ == '__main__':
     main()
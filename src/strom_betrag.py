@@ -0,0 +1,110 @@
+import math
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+import strom_kalender
+
+# Festkomma-Darstellung aller Beträge. In der Datenbank und in der Abrechnung
+# stehen nur ganze Zahlen:
+#   Geldbeträge (Einzahlungen, Grundpreis je Monat, Kosten) in Cent,
+#   Arbeitspreise in PREIS_SKALA-tel Cent je kWh (32,5 ct/kWh -> 325000),
+#   abgerechneter Verbrauch in Wh.
+# Es gibt genau eine Rundungsregel: kaufmännisch, d. h. halbe Einheiten werden
+# vom Nullpunkt weg gerundet. Gerundet wird nur beim Einlesen von Eingaben,
+# beim Verbrauch je Tarifabschnitt und bei den Kosten je Tarifabschnitt; alle
+# Summen danach sind exakt.
+
+PREIS_SKALA = 10_000
+CENT_JE_EURO = 100
+WH_JE_KWH = 1000
+# Größte ganze Zahl, die SQLite speichern kann
+MAX_GANZZAHL = 2 ** 63 - 1
+
+
+# Ganzzahlige Division zaehler / nenner (nenner > 0) mit kaufmännischer Rundung
+def runden(zaehler: int, nenner: int) -> int:
+    if zaehler >= 0:
+        return (2 * zaehler + nenner) // (2 * nenner)
+    return -((2 * -zaehler + nenner) // (2 * nenner))
+
+
+# Eingabe (Text mit Punkt oder Komma, int, float oder Decimal) exakt als Decimal;
+# float über seine kürzeste Darstellung, damit 0.285 nicht zu 0.28499... wird
+def _dezimal(wert):
+    if isinstance(wert, Decimal):
+        zahl = wert
+    elif isinstance(wert, bool):
+        raise ValueError(f"Ungültiger Betrag: {wert!r}")
+    elif isinstance(wert, (int, float)):
+        zahl = Decimal(repr(wert))
+    else:
+        try:
+            zahl = Decimal(str(wert).strip().replace(",", "."))
+        except InvalidOperation:
+            raise ValueError(f"Ungültiger Betrag: {wert!r}") from None
+    if not zahl.is_finite():
+        raise ValueError(f"Ungültiger Betrag: {wert!r}")
+    return zahl
+
+
+# Eingabe mal skala als ganze Zahl; was nicht in eine SQLite-INTEGER-Spalte
+# (64 Bit) passt, ist wie jede andere ungültige Eingabe ein ValueError
+def skaliert(wert, skala: int) -> int:
+    try:
+        ergebnis = int((_dezimal(wert) * skala).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except InvalidOperation:
+        raise ValueError(f"Betrag zu groß: {wert!r}") from None
+    if not -MAX_GANZZAHL <= ergebnis <= MAX_GANZZAHL:
+        raise ValueError(f"Betrag zu groß: {wert!r}")
+    return ergebnis
+
+
+# Euro -> Cent
+def cent(wert) -> int:
+    return skaliert(wert, CENT_JE_EURO)
+
+
+# Cent je kWh -> PREIS_SKALA-tel Cent je kWh
+def preis(wert) -> int:
+    return skaliert(wert, PREIS_SKALA)
+
+
+# Verbrauch in kWh (float aus tbl_verbrauch_tag) -> ganze Wh
+def wh(kwh: float) -> int:
+    wert = kwh * WH_JE_KWH
+    if wert >= 0:
+        return math.floor(wert + 0.5)
+    return -math.floor(-wert + 0.5)
+
+
+# Kosten in Cent für verbrauch_wh zum Arbeitspreis kwh_preis (skaliert)
+def arbeitskosten(verbrauch_wh: int, kwh_preis: int) -> int:
+    return runden(verbrauch_wh * kwh_preis, WH_JE_KWH * PREIS_SKALA)
+
+
+# Anteiliger Grundpreis in Cent bei grundpreis_cent je Monat für einen Zeitraum
+# von monatsanteil/strom_kalender.MONATSTEILER Kalendermonaten
+def grundpreis_anteil(grundpreis_cent: int, monatsanteil: int) -> int:
+    return runden(grundpreis_cent * monatsanteil, strom_kalender.MONATSTEILER)
+
+
+# Ganze Zahl mit stellen Nachkommastellen als Text, ohne Umweg über float
+def festkomma_text(wert: int, stellen: int) -> str:
+    vorzeichen = "-" if wert < 0 else ""
+    ganz, rest = divmod(abs(wert), 10 ** stellen)
+    return f"{vorzeichen}{ganz}.{rest:0{stellen}d}"
+
+
+def euro_text(cent_wert: int) -> str:
+    return festkomma_text(cent_wert, 2)
+
+
+def kwh_text(wh_wert: int) -> str:
+    return festkomma_text(wh_wert, 3)
+
+
+# Arbeitspreis in ct/kWh mit mindestens zwei Nachkommastellen
+def preis_text(preis_wert: int) -> str:
+    text = festkomma_text(preis_wert, 4)
+    while text.endswith("0") and len(text) - text.index(".") > 3:
+        text = text[:-1]
+    return text
@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import strom_abrechnung
+import strom_messung
+import strom_repository
+
+# Zwischenspeicher für Abrechnungen: dieselben Zeiträume werden immer wieder
+# berechnet (Eingabemaske, abfragende Übersichten über die HTTP-Schnittstelle).
+# Schlüssel ist (start, ende, zaehler_id); zu jedem Eintrag wird der Stand der
+# Änderungszähler des Zählers aus tbl_datenversion gemerkt. Ein Treffer gilt
+# nur, solange dieser Stand unverändert ist – die Zähler werden von Triggern
+# erhöht, also auch bei Änderungen durch andere Prozesse. Der Stand wird vor
+# der Berechnung gelesen: ändern sich die Daten währenddessen, passt der
+# Eintrag beim nächsten Abruf nicht mehr und wird neu berechnet. Die
+# Abrechnungen sind unveränderlich und können daher geteilt werden.
+
+# Höchstzahl gespeicherter Abrechnungen; die am längsten nicht abgefragte fällt heraus
+MAX_EINTRAEGE = 1024
+
+
+# Datum für den Schlüssel; date-Objekte (aus GUI und HTTP-Schnittstelle) ohne Umweg über strptime
+def _datum(wert):
+    if type(wert) is date:
+        return wert
+    return strom_abrechnung.als_datum(wert)
+
+
+class AbrechnungsCache:
+    def __init__(self, quelle, max_eintraege=MAX_EINTRAEGE):
+        self.quelle = quelle
+        self.max_eintraege = max_eintraege
+        self._eintraege = OrderedDict()
+        self._lock = threading.Lock()
+        self.treffer = 0
+        self.fehlschlaege = 0
+
+    def __len__(self):
+        return len(self._eintraege)
+
+    # Wie strom_abrechnung.berechnen, aber aus dem Zwischenspeicher, solange sich
+    # die Daten des Zählers nicht geändert haben
+    @strom_messung.gemessen('cache.berechnen')
+    def berechnen(self, start_datum, end_datum, zaehler_id=strom_repository.STANDARD_ZAEHLER):
+        schluessel = (_datum(start_datum), _datum(end_datum), zaehler_id)
+        versionen = self.quelle.datenversionen(zaehler_id)
+        with self._lock:
+            eintrag = self._eintraege.get(schluessel)
+            if eintrag is not None and eintrag[0] == versionen:
+                self._eintraege.move_to_end(schluessel)
+                self.treffer += 1
+                return eintrag[1]
+            self.fehlschlaege += 1
+
+        abrechnung = strom_abrechnung.berechnen(schluessel[0], schluessel[1], self.quelle, zaehler_id)
+        with self._lock:
+            self._eintraege[schluessel] = (versionen, abrechnung)
+            self._eintraege.move_to_end(schluessel)
+            while len(self._eintraege) > self.max_eintraege:
+                self._eintraege.popitem(last=False)
+        return abrechnung
+
+    def leeren(self):
+        with self._lock:
+            self._eintraege.clear()
+
+
+# Ein Cache je Repository (Datenbankdatei) für alle Aufrufer im Prozess
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(repo) -> AbrechnungsCache:
+    with _caches_lock:
+        cache = _caches.get(repo.db_path)
+        if cache is None or cache.quelle is not repo:
+            cache = AbrechnungsCache(repo)
+            _caches[repo.db_path] = cache
+        return cache
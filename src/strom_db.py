@@ -1,10 +1,36 @@
-import sqlite3
 import tkinter as tk
 from tkinter import messagebox
-
-class StromabrechnungApp(tk.Tk):
-    def __init__(self):
-        super().__init__()
+from tkinter import ttk
+
+import strom_aufgaben
+import strom_betrag
+import strom_repository
+
+# Beispiel-Daten in alle Tabellen schreiben
+def beispieldaten_einfuegen(db_path=strom_repository.DB_PATH):
+    # Gemeinsames Repository der Datenbank holen
+    repo = strom_repository.get_repository(db_path)
+
+    # Beispiel-Daten für tbl_berechnungsgrundl (Beträge als Festkommazahlen, siehe strom_betrag)
+    repo.insert_berechgrundl_zeilen([('2024-01-01', '2024-12-31', strom_betrag.cent('10.00'), strom_betrag.preis(10))])
+
+    # Beispiel-Daten für tbl_zaehlerstand
+    repo.insert_zaehlerstaende([
+        ('2024-01-01', 100),
+        ('2024-02-02', 200),
+        ('2024-02-15', 300),
+        ('2024-02-26', 400),
+    ])
+
+    # Beispiel-Daten für tbl_einzahlungen
+    repo.insert_einzahlungen([
+        ('2024-01-01', strom_betrag.cent(30)),
+        ('2024-01-03', strom_betrag.cent(30)),
+    ])
+
+class StromabrechnungApp(tk.Toplevel):
+    def __init__(self, master=None):
+        super().__init__(master)
 
         self.title("Datenbank erstellen und befüllen")
         self.geometry("400x300")
@@ -28,92 +54,33 @@ class StromabrechnungApp(tk.Tk):
         self.status_label = tk.Label(layout, text="Warten auf Eingaben...", justify="left")
         self.status_label.grid(row=2, columnspan=2, pady=10)
 
+        # Fortschrittsanzeige, solange die Datenbank im Hintergrund bearbeitet wird
+        self.fortschritt = ttk.Progressbar(layout, mode="indeterminate")
+        self.fortschritt.grid(row=3, columnspan=2, sticky="we")
+        self.aufgaben = strom_aufgaben.Aufgaben(self, self.fortschritt)
+
     def create_db(self):
-        try:
-            # Verbindung zur SQLite-Datenbank herstellen
-            conn = sqlite3.connect('meine_datenbank.db')
-
-            # Ein Cursor-Objekt erstellen
-            cursor = conn.cursor()
-
-            # Tabellen erstellen, falls sie noch nicht existieren
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS tbl_zaehlerstand (
-                    datum DATE,
-                    zaehlerstand INTEGER
-                )
-            ''')
-
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS tbl_einzahlungen (
-                    datum DATE,
-                    einzahlungen INTEGER
-                )
-            ''')
-
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS tbl_berechgrundl (
-                    datum_von DATE,
-                    datum_bis DATE,
-                    grundpreis REAL,
-                    kwh_preis REAL
-                )
-            ''')
-
-            # Änderungen speichern
-            conn.commit()
-
-            # Verbindung zur Datenbank schließen
-            conn.close()
-
-            # Erfolgsmeldung anzeigen
-            self.status_label.config(text="Datenbank und Tabellen wurden erfolgreich erstellt.")
-        except Exception as e:
-            messagebox.showerror("Fehler", f"Fehler beim Erstellen der Datenbank: {str(e)}")
+        # Datenbank im Hintergrund anlegen und Tabellen erstellen, falls sie noch nicht existieren
+        self.aufgaben.starten(
+            strom_repository.datenbank_erstellen,
+            fertig=lambda _: self.status_label.config(text="Datenbank und Tabellen wurden erfolgreich erstellt."),
+            fehler=lambda e: messagebox.showerror("Fehler", f"Fehler beim Erstellen der Datenbank: {str(e)}"))
 
     def insert_sample_data(self):
-        try:
-            # Verbindung zur SQLite-Datenbank herstellen
-            conn = sqlite3.connect('meine_datenbank.db')
-            cursor = conn.cursor()
-
-            # Beispiel-Daten für tbl_berechnungsgrundl
-            cursor.execute('''
-                INSERT INTO tbl_berechgrundl (datum_von, datum_bis, grundpreis, kwh_preis)
-                VALUES ('2024-01-01', '2024-12-31', 10.00, 10)
-            ''')
-
-            # Beispiel-Daten für tbl_zaehlerstand
-            cursor.execute('''
-                INSERT INTO tbl_zaehlerstand (datum, zaehlerstand)
-                VALUES ('2024-01-01', 100),
-                       ('2024-02-02', 200),
-                       ('2024-02-15', 300),
-                       ('2024-02-26', 400)
-            ''')
-
-            # Beispiel-Daten für tbl_einzahlungen
-            cursor.execute('''
-                INSERT INTO tbl_einzahlungen (datum, einzahlungen)
-                VALUES ('2024-01-01', 30),
-                       ('2024-01-03', 30)
-            ''')
-
-            # Änderungen speichern
-            conn.commit()
-
-            # Verbindung zur Datenbank schließen
-            conn.close()
-
-            # Erfolgsmeldung anzeigen
-            self.status_label.config(text="Beispiel-Daten wurden erfolgreich eingefügt.")
-        except Exception as e:
-            messagebox.showerror("Fehler", f"Fehler beim Einfügen der Daten: {str(e)}")
+        # Beispiel-Daten im Hintergrund einfügen
+        self.aufgaben.starten(
+            beispieldaten_einfuegen,
+            fertig=lambda _: self.status_label.config(text="Beispiel-Daten wurden erfolgreich eingefügt."),
+            fehler=lambda e: messagebox.showerror("Fehler", f"Fehler beim Einfügen der Daten: {str(e)}"))
 
 # Main-Funktion zum Starten der App
 def main():
-    app = StromabrechnungApp()
-    app.mainloop()
+    # Alleinstehend ersetzt das Fenster das (verborgene) Hauptfenster
+    root = tk.Tk()
+    root.withdraw()
+    app = StromabrechnungApp(root)
+    app.protocol("WM_DELETE_WINDOW", root.destroy)
+    root.mainloop()
 
 if __name__ == '__main__':
     main()
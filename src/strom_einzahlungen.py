@@ -1,4 +1,3 @@
-import sqlite3
 import tkinter as tk
 from tkinter import messagebox
 from tkinter import ttk
@@ -6,82 +5,45 @@ from datetime import datetime
 import os
 import logging
 
+import strom_aufgaben
+import strom_betrag
+import strom_log
+import strom_repository
+import strom_tabelle
+
 # Setze das Arbeitsverzeichnis auf das Verzeichnis des Skripts
 script_dir = os.path.dirname(os.path.abspath(__file__))
 os.chdir(script_dir)
 
 # Logging einrichten
-logging.basicConfig(filename='/tmp/einzahlungen_app.log', level=logging.DEBUG)
-
+strom_log.einrichten()
 
-# Funktion, um die Verbindung zur SQLite-Datenbank herzustellen
-def get_db_connection():
-    db_path = 'meine_datenbank.db'
-
-    # Überprüfen, ob die Datenbankdatei existiert
-    if not os.path.exists(db_path):
-        logging.error(f"Die Datenbank '{db_path}' existiert nicht.")
-        messagebox.showerror("Datenbankfehler", f"Die Datenbank '{db_path}' wurde nicht gefunden.")
-        return None
 
+# Funktion, um das gemeinsame Repository der Datenbank zu holen
+def get_repository():
     try:
-        conn = sqlite3.connect(db_path)
-        return conn
-    except sqlite3.Error as e:
+        return strom_repository.get_repository()
+    except strom_repository.DatenbankNichtGefunden:
+        # Die Datenbankdatei existiert nicht
+        logging.error(f"Die Datenbank '{strom_repository.DB_PATH}' existiert nicht.")
+        messagebox.showerror("Datenbankfehler", f"Die Datenbank '{strom_repository.DB_NAME}' wurde nicht gefunden.")
+        return None
+    except strom_repository.DatenbankFehler as e:
         logging.error(f"Fehler beim Verbinden mit der Datenbank: {e}")
         messagebox.showerror("Datenbankfehler", "Fehler beim Verbinden mit der Datenbank.")
         return None
 
 
-# Funktion, um alle Einzahlungen zwischen zwei Daten zu holen
-def get_einzahlungen_zwischen_daten(von_datum, bis_datum):
-    conn = get_db_connection()
-    if conn is None:
-        return []
-
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT rowid, datum, einzahlungen
-        FROM tbl_einzahlungen
-        WHERE datum BETWEEN ? AND ?
-        ORDER BY datum
-    ''', (von_datum, bis_datum))
-
-    result = cursor.fetchall()
-    conn.close()
-    return result
-
+# Funktion, um Fehler einer Datenbankabfrage im Hintergrund zu melden
+def db_fehler(fehler):
+    logging.error(f"Fehler bei der Datenbankabfrage: {fehler}")
+    messagebox.showerror("Datenbankfehler", "Es gab einen Fehler bei der Datenbankabfrage.")
 
-# Funktion, um eine neue Einzahlung zu speichern
-def insert_einzahlung(datum, einzahlungen):
-    conn = get_db_connection()
-    if conn is None:
-        return
 
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO tbl_einzahlungen (datum, einzahlungen) VALUES (?, ?)', (datum, einzahlungen))
-    conn.commit()
-    conn.close()
-
-
-# Funktion, um einen Datensatz zu löschen
-def delete_einzahlung_from_db(rowid):
-    conn = get_db_connection()
-    if conn is None:
-        return False
-
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM tbl_einzahlungen WHERE rowid = ?', (rowid,))
-    conn.commit()
-    conn.close()
-
-    return True
-
-
-# Tkinter GUI-Klasse
-class EinzahlungenApp(tk.Tk):
-    def __init__(self):
-        super().__init__()
+# Tkinter GUI-Klasse (Toplevel, auch aus strom_index heraus zu öffnen)
+class EinzahlungenApp(tk.Toplevel):
+    def __init__(self, master=None):
+        super().__init__(master)
 
         # Fenster konfigurieren
         self.title("Einzahlungen Eingabe")
@@ -125,6 +87,11 @@ class EinzahlungenApp(tk.Tk):
         self.update_button = tk.Button(self.layout, text="Einzahlungen im Zeitraum anzeigen", command=self.open_einzahlungen_fenster)
         self.update_button.pack(pady=5)
 
+        # Fortschrittsanzeige, solange Datenbankzugriffe im Hintergrund laufen
+        self.fortschritt = ttk.Progressbar(self.layout, mode="indeterminate")
+        self.fortschritt.pack(fill=tk.X, pady=5)
+        self.aufgaben = strom_aufgaben.Aufgaben(self, self.fortschritt)
+
     def save_einzahlung(self):
         datum = self.datum_input.get()  # Hole das Datum der Einzahlung
         einzahlung_input = self.einzahlung_input.get()
@@ -133,26 +100,34 @@ class EinzahlungenApp(tk.Tk):
             # Datum validieren
             date_obj = datetime.strptime(datum, "%Y-%m-%d")  # Stelle sicher, dass das Datum im richtigen Format ist
 
-            # Betrag validieren
-            einzahlung = float(einzahlung_input)
+            # Betrag validieren und exakt in Cent umrechnen
+            einzahlung = strom_betrag.cent(einzahlung_input)
             if einzahlung <= 0:
                 raise ValueError("Der Betrag muss positiv sein.")
 
-            # Einzahlung speichern
-            insert_einzahlung(datum, einzahlung)
+        except ValueError as e:
+            messagebox.showerror("Ungültige Eingabe",
+                                 f"Bitte geben Sie ein korrektes Datum und einen Betrag ein. Fehler: {e}")
+            return
+
+        repo = get_repository()
+        if repo is None:
+            return
 
-            # Felder leeren
+        # Nach dem Speichern Felder leeren und Einzahlungen neu laden
+        def gespeichert(_):
             self.datum_input.delete(0, tk.END)
             self.einzahlung_input.delete(0, tk.END)
-
-            # Einzahlungen neu laden
             self.open_einzahlungen_fenster()
 
-        except ValueError as e:
-            messagebox.showerror("Ungültige Eingabe",
-                                 f"Bitte geben Sie ein korrektes Datum und einen Betrag ein. Fehler: {e}")
+        # Einzahlung im Hintergrund speichern
+        self.aufgaben.starten(repo.insert_einzahlung, datum, einzahlung, fertig=gespeichert, fehler=db_fehler)
 
     def open_einzahlungen_fenster(self):
+        repo = get_repository()
+        if repo is None:
+            return
+
         einzahlungen_fenster = tk.Toplevel(self)
         einzahlungen_fenster.title("Einzahlungen im Zeitraum")
         einzahlungen_fenster.geometry("600x400")
@@ -175,32 +150,48 @@ class EinzahlungenApp(tk.Tk):
             # Label für Löschbestätigung
             self.delete_message_label = tk.Label(frame, text="", fg="green")
             self.delete_message_label.pack()
-
-            # Treeview für die Einzahlungen
-            table = ttk.Treeview(frame, columns=("ID", "Datum", "Betrag"), show="headings")
+            delete_message_label = self.delete_message_label
+
+            # Fortschrittsanzeige für die Datenbankzugriffe dieses Fensters
+            fortschritt = ttk.Progressbar(frame, mode="indeterminate")
+            fortschritt.pack(fill=tk.X)
+            aufgaben = strom_aufgaben.Aufgaben(einzahlungen_fenster, fortschritt)
+
+            # Treeview für die Einzahlungen; die Zeilen im angegebenen Zeitraum
+            # werden beim Scrollen seitenweise im Hintergrund nachgeladen
+            tabelle_frame = tk.Frame(frame)
+            tabelle_frame.pack(pady=10, fill=tk.BOTH, expand=True)
+            table = strom_tabelle.BlaetterTabelle(
+                tabelle_frame,
+                lambda schluessel, anzahl, rueckwaerts: [
+                    (rowid, datum, strom_betrag.euro_text(betrag)) for rowid, datum, betrag
+                    in repo.einzahlungen_seite(von_datum, bis_datum, schluessel, anzahl, rueckwaerts)],
+                aufgaben=aufgaben, fehler=db_fehler,
+                columns=("ID", "Datum", "Betrag"), show="headings")
             table.heading("ID", text="ID")
             table.heading("Datum", text="Datum")
             table.heading("Betrag", text="Betrag (€)")
-            table.pack(pady=10, fill=tk.BOTH, expand=True)
-
-            # Hole die Einzahlungen im angegebenen Zeitraum aus der Datenbank
-            einzahlungen = get_einzahlungen_zwischen_daten(von_datum, bis_datum)
-
-            for rowid, datum, einzahlung in einzahlungen:
-                table.insert("", "end", values=(rowid, datum, einzahlung))
+            table.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            table.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
             # Funktion, um einen Datensatz zu löschen
             def delete_einzahlung():
                 selected_item = table.selection()
                 if selected_item:
                     rowid = table.item(selected_item[0])["values"][0]  # Hole den rowid der selektierten Zeile
-                    if delete_einzahlung_from_db(rowid):  # Lösche den Datensatz in der DB
-                        table.delete(selected_item)  # Entferne die Zeile aus der Anzeige
-                        self.delete_message_label.config(text="Löschvorgang erfolgreich", fg="green")
-                    else:
-                        self.delete_message_label.config(text="Fehler beim Löschen des Datensatzes", fg="red")
+
+                    def geloescht(erfolg):
+                        if erfolg:
+                            if table.exists(selected_item[0]):
+                                table.delete(selected_item)  # Entferne die Zeile aus der Anzeige
+                            delete_message_label.config(text="Löschvorgang erfolgreich", fg="green")
+                        else:
+                            delete_message_label.config(text="Fehler beim Löschen des Datensatzes", fg="red")
+
+                    # Lösche den Datensatz im Hintergrund in der DB
+                    aufgaben.starten(repo.delete_einzahlung, rowid, fertig=geloescht, fehler=db_fehler)
                 else:
-                    self.delete_message_label.config(text="Bitte wählen Sie einen Datensatz zum Löschen aus", fg="red")
+                    delete_message_label.config(text="Bitte wählen Sie einen Datensatz zum Löschen aus", fg="red")
 
             # Button zum Löschen der ausgewählten Einzahlung
             delete_button = tk.Button(frame, text="Löschen", command=delete_einzahlung)
@@ -216,25 +207,18 @@ class EinzahlungenApp(tk.Tk):
 
 # Main-Funktion zum Starten der App
 def main():
-    # Versuchen, eine Verbindung zur Datenbank herzustellen
-    conn = get_db_connection()
-    if conn is None:
+    # Versuchen, das Repository der Datenbank zu holen; dabei wird das Schema
+    # bei Bedarf migriert und 'tbl_einzahlungen' sichergestellt
+    repo = get_repository()
+    if repo is None:
         return  # Wenn keine Verbindung möglich ist, das Programm beenden
 
-    # Sicherstellen, dass die Tabelle 'tbl_einzahlungen' existiert
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tbl_einzahlungen (
-            datum DATE,
-            einzahlungen INTEGER
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-    # GUI starten
-    app = EinzahlungenApp()
-    app.mainloop()
+    # GUI starten; alleinstehend ersetzt das Fenster das (verborgene) Hauptfenster
+    root = tk.Tk()
+    root.withdraw()
+    app = EinzahlungenApp(root)
+    app.protocol("WM_DELETE_WINDOW", root.destroy)
+    root.mainloop()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,300 @@
+import argparse
+import csv
+import json
+import sys
+import zlib
+from array import array
+
+import strom_abrechnung
+import strom_betrag
+import strom_messung
+import strom_repository
+
+# Streaming-Export von Abrechnungen als CSV, JSON Lines oder PDF (eine Rechnung
+# je Seite, lange Rechnungen über mehrere Seiten). Die Abrechnungen kommen aus
+# einem Generator von (zaehler_id, Abrechnung) und werden einzeln geschrieben;
+# in regelmäßigen Abständen wird die Datei geleert. Im Speicher bleibt nur die
+# gerade geschriebene Abrechnung (beim PDF zusätzlich die Byte-Offsets der
+# Objekte für die Querverweistabelle, 8 Byte je Objekt).
+
+# Nach so vielen Abrechnungen wird die Ausgabedatei geleert
+FLUSH_INTERVALL = 500
+
+CSV_SPALTEN = ('zaehler', 'start', 'ende', 'tage', 'verbrauch_kwh', 'verbrauchskosten', 'grundpreis',
+               'gesamtbetrag', 'einzahlungen', 'saldo')
+
+
+# Schrittweise Ergebnisse einer Abrechnung als Textzeilen (Anzeige und PDF)
+def zusammenfassung(abrechnung):
+    euro = strom_betrag.euro_text
+    return [
+        f"1. Berechnete Tage im Zeitraum: {abrechnung.tage} Tage",
+        f"2. Gesamter Verbrauch: {strom_betrag.kwh_text(abrechnung.verbrauch_wh)} kWh",
+        f"3. Gesamtkosten des Verbrauchs: {euro(abrechnung.verbrauchskosten_cent)} EUR",
+        f"4. Gesamtsumme Grundpreis: {euro(abrechnung.grundpreis_cent)} EUR",
+        f"5. Gesamtsumme (Verbrauchskosten + Grundpreis): {euro(abrechnung.gesamtbetrag_cent)} EUR",
+        f"6. Gesamte Einzahlungen: {euro(abrechnung.einzahlungen_cent)} EUR",
+        f"7. Saldo (Einzahlungen - Gesamtbetrag): {euro(abrechnung.saldo_cent)} EUR",
+    ]
+
+
+class CsvExport:
+    binaer = False
+
+    def __init__(self, datei):
+        self.schreiber = csv.writer(datei, delimiter=';', lineterminator='\n')
+        self.schreiber.writerow(CSV_SPALTEN)
+
+    def schreiben(self, zaehler_id, a):
+        euro = strom_betrag.euro_text
+        self.schreiber.writerow((zaehler_id, a.start_datum, a.end_datum, a.tage, strom_betrag.kwh_text(a.verbrauch_wh),
+                                 euro(a.verbrauchskosten_cent), euro(a.grundpreis_cent), euro(a.gesamtbetrag_cent),
+                                 euro(a.einzahlungen_cent), euro(a.saldo_cent)))
+
+    def abschliessen(self):
+        pass
+
+
+# Abrechnung als JSON-Objekt mit den Abschnitten je Tarif. Die Werte bleiben ganze
+# Zahlen (Wh, Cent, skalierter Arbeitspreis), damit kein Leser sie als float rundet.
+def abrechnung_daten(zaehler_id, a) -> dict:
+    return {
+        'zaehler': zaehler_id,
+        'start': a.start_datum.isoformat(),
+        'ende': a.end_datum.isoformat(),
+        'tage': a.tage,
+        'verbrauch_wh': a.verbrauch_wh,
+        'verbrauchskosten_cent': a.verbrauchskosten_cent,
+        'grundpreis_cent': a.grundpreis_cent,
+        'gesamtbetrag_cent': a.gesamtbetrag_cent,
+        'einzahlungen_cent': a.einzahlungen_cent,
+        'saldo_cent': a.saldo_cent,
+        'abschnitte': [{
+            'start': s.start_datum.isoformat(),
+            'ende': s.end_datum.isoformat(),
+            'tage': s.tage,
+            'verbrauch_wh': s.verbrauch_wh,
+            'kwh_preis': s.tarif.kwh_preis,
+            'preis_skala': strom_betrag.PREIS_SKALA,
+            'grundpreis_monat_cent': s.tarif.grundpreis_cent,
+            'verbrauchskosten_cent': s.verbrauchskosten_cent,
+            'grundpreis_cent': s.grundpreis_cent,
+        } for s in a.segmente],
+    }
+
+
+# Ein JSON-Objekt je Zeile (siehe abrechnung_daten)
+class JsonlExport:
+    binaer = False
+
+    def __init__(self, datei):
+        self.datei = datei
+
+    def schreiben(self, zaehler_id, a):
+        self.datei.write(json.dumps(abrechnung_daten(zaehler_id, a), ensure_ascii=False) + "\n")
+
+    def abschliessen(self):
+        pass
+
+
+# Minimaler PDF-Schreiber ohne Fremdbibliothek: A4-Seiten mit Helvetica in
+# WinAnsi-Kodierung, Seiteninhalte mit zlib komprimiert. Jede Seite wird sofort
+# geschrieben; das Pages-Objekt (Objekt 2) und die Querverweistabelle folgen am
+# Ende. Seiteninhalt und Seite liegen immer als Objektpaar hintereinander, die
+# Kinder des Pages-Objekts ergeben sich daher aus der Seitenzahl.
+class PdfExport:
+    binaer = True
+
+    BREITE, HOEHE = 595, 842
+    RAND = 50
+    ZEILENABSTAND = 14
+    ZEILEN_JE_SEITE = (HOEHE - 2 * RAND) // ZEILENABSTAND - 4  # ohne Kopf- und Fußzeile
+    TABELLE = (('Von', 0), ('Bis', 70), ('Tage', 140), ('kWh', 180), ('ct/kWh', 250),
+               ('Verbrauch EUR', 310), ('Grundpreis EUR', 400))
+    ERSTES_SEITENOBJEKT = 5
+
+    def __init__(self, datei):
+        self.datei = datei
+        self.position = 0
+        self.offsets = array('Q', [0, 0, 0, 0, 0])  # Objekt 0 ist frei, Objekt 2 wird zuletzt geschrieben
+        self.seiten = 0
+        self._schreiben_roh(b"%PDF-1.4\n%\xe4\xf6\xfc\xdf\n")
+        self._objekt(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._objekt(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        self._objekt(4, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+
+    def _schreiben_roh(self, daten):
+        self.datei.write(daten)
+        self.position += len(daten)
+
+    # Objekt schreiben; der Inhalt darf auch aus mehreren Teilen bestehen
+    def _objekt(self, nummer, *teile):
+        if nummer == len(self.offsets):
+            self.offsets.append(self.position)
+        else:
+            self.offsets[nummer] = self.position
+        self._schreiben_roh(b"%d 0 obj\n" % nummer)
+        for teil in teile:
+            self._schreiben_roh(teil)
+        self._schreiben_roh(b"\nendobj\n")
+
+    @staticmethod
+    def _text(x, y, text, fett=False, groesse=10):
+        text = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        return (b"BT /%s %d Tf 1 0 0 1 %d %d Tm (" % (b"F2" if fett else b"F1", groesse, x, y)
+                + text.encode('cp1252', errors='replace') + b") Tj ET\n")
+
+    def _seite(self, inhalt):
+        daten = zlib.compress(inhalt)
+        inhalt_nummer = len(self.offsets)
+        self._objekt(inhalt_nummer, b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(daten)
+                     + daten + b"\nendstream")
+        self._objekt(inhalt_nummer + 1, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+                     b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>"
+                     % (self.BREITE, self.HOEHE, inhalt_nummer))
+        self.seiten += 1
+
+    # Zeilen einer Rechnung: (fett, [(x, text), ...])
+    def _rechnungszeilen(self, a):
+        zeilen = [(True, [(0, "Abschnitte nach Tarif")]),
+                  (True, [(x, titel) for titel, x in self.TABELLE])]
+        for s in a.segmente:
+            werte = (s.start_datum.isoformat(), s.end_datum.isoformat(), str(s.tage),
+                     strom_betrag.kwh_text(s.verbrauch_wh), strom_betrag.preis_text(s.tarif.kwh_preis),
+                     strom_betrag.euro_text(s.verbrauchskosten_cent), strom_betrag.euro_text(s.grundpreis_cent))
+            zeilen.append((False, [(x, wert) for (_, x), wert in zip(self.TABELLE, werte)]))
+        zeilen.append((False, []))
+        zeilen.extend((False, [(0, text)]) for text in zusammenfassung(a))
+        return zeilen
+
+    def schreiben(self, zaehler_id, a):
+        zeilen = self._rechnungszeilen(a)
+        anzahl_seiten = max(1, -(-len(zeilen) // self.ZEILEN_JE_SEITE))
+        for seite in range(anzahl_seiten):
+            oben = self.HOEHE - self.RAND
+            inhalt = [self._text(self.RAND, oben, f"Stromabrechnung Zähler {zaehler_id}", fett=True, groesse=14),
+                      self._text(self.RAND, oben - 2 * self.ZEILENABSTAND,
+                                 f"Zeitraum: {a.start_datum} bis {a.end_datum}")]
+            y = oben - 4 * self.ZEILENABSTAND
+            for fett, zellen in zeilen[seite * self.ZEILEN_JE_SEITE:(seite + 1) * self.ZEILEN_JE_SEITE]:
+                for x, text in zellen:
+                    inhalt.append(self._text(self.RAND + x, y, text, fett))
+                y -= self.ZEILENABSTAND
+            inhalt.append(self._text(self.RAND, self.RAND - 20, f"Seite {seite + 1} von {anzahl_seiten}", groesse=8))
+            self._seite(b"".join(inhalt))
+
+    # Verweise auf alle Seiten in Blöcken, damit auch bei sehr vielen Seiten keine lange Liste entsteht
+    def _kinder(self, block=1000):
+        for anfang in range(0, self.seiten, block):
+            yield b"".join(b"%d 0 R " % (self.ERSTES_SEITENOBJEKT + 2 * i + 1)
+                           for i in range(anfang, min(anfang + block, self.seiten)))
+
+    def abschliessen(self):
+        self._objekt(2, b"<< /Type /Pages /Kids [", *self._kinder(), b"] /Count %d >>" % self.seiten)
+        xref = self.position
+        self._schreiben_roh(b"xref\n0 %d\n0000000000 65535 f \n" % len(self.offsets))
+        for offset in self.offsets[1:]:
+            self._schreiben_roh(b"%010d 00000 n \n" % offset)
+        self._schreiben_roh(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                            % (len(self.offsets), xref))
+
+
+EXPORTE = {'csv': CsvExport, 'jsonl': JsonlExport, 'pdf': PdfExport}
+
+
+def format_erkennen(pfad):
+    name = pfad.lower()
+    if name.endswith('.pdf'):
+        return 'pdf'
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return 'csv'
+
+
+# Abrechnungen aus einem Generator von (zaehler_id, Abrechnung) in eine offene
+# Datei schreiben; fortschritt(anzahl) wird bei jedem Leeren der Datei gerufen.
+# Liefert die Anzahl geschriebener Abrechnungen.
+@strom_messung.gemessen('export.exportieren_in')
+def exportieren_in(ergebnisse, datei, format='csv', flush_intervall=FLUSH_INTERVALL, fortschritt=None) -> int:
+    if format not in EXPORTE:
+        raise ValueError(f"Unbekanntes Exportformat: {format}")
+    export = EXPORTE[format](datei)
+    anzahl = 0
+    for zaehler_id, abrechnung in ergebnisse:
+        export.schreiben(zaehler_id, abrechnung)
+        anzahl += 1
+        if anzahl % flush_intervall == 0:
+            datei.flush()
+            if fortschritt:
+                fortschritt(anzahl)
+    export.abschliessen()
+    datei.flush()
+    return anzahl
+
+
+# Wie exportieren_in, aber in eine Datei unter pfad; das Format folgt ohne
+# Angabe aus der Dateiendung
+def exportieren(ergebnisse, pfad, format=None, flush_intervall=FLUSH_INTERVALL, fortschritt=None) -> int:
+    format = format or format_erkennen(pfad)
+    if format not in EXPORTE:
+        raise ValueError(f"Unbekanntes Exportformat: {format}")
+    if EXPORTE[format].binaer:
+        datei = open(pfad, 'wb')
+    else:
+        datei = open(pfad, 'w', encoding='utf-8', newline='')
+    with datei:
+        return exportieren_in(ergebnisse, datei, format, flush_intervall, fortschritt)
+
+
+# Alle (oder die angegebenen) Zähler einer Datenbank für die Perioden abrechnen
+# und exportieren; Aufruf z. B. aus dem Hintergrund-Thread der GUI
+@strom_messung.gemessen('export.zaehler_exportieren')
+def zaehler_exportieren(repo, perioden, pfad, format=None, zaehler_ids=None, fehler=None,
+                        fortschritt=None) -> int:
+    if zaehler_ids is None:
+        zaehler_ids = [zeile[0] for zeile in repo.zaehler_daten()]
+    ergebnisse = strom_abrechnung.abrechnungen_erzeugen(perioden, repo, zaehler_ids, fehler)
+    return exportieren(ergebnisse, pfad, format, fortschritt=fortschritt)
+
+
+# Aufruf: python3 strom_export.py 2024-01-01 2024-12-31 rechnungen.pdf [--zaehler 2] [--frequenz monatlich]
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Abrechnungen als CSV, JSON Lines oder PDF exportieren")
+    parser.add_argument('start', help="Startdatum (YYYY-MM-DD)")
+    parser.add_argument('ende', help="Enddatum (YYYY-MM-DD)")
+    parser.add_argument('ausgabe', help="Zieldatei; '-' schreibt CSV bzw. JSON Lines auf die Standardausgabe")
+    parser.add_argument('--format', choices=sorted(EXPORTE), help="Standard: aus der Dateiendung")
+    parser.add_argument('--frequenz', choices=sorted(strom_abrechnung.FREQUENZEN),
+                        help="Zeitraum in Perioden dieser Länge aufteilen")
+    parser.add_argument('--zaehler', type=int, action='append',
+                        help="Nur diesen Zähler exportieren (mehrfach möglich); Standard: alle Zähler")
+    parser.add_argument('--db', default=strom_repository.DB_PATH)
+    args = parser.parse_args(argv)
+
+    def fehler(zaehler_id, e):
+        print(f"Zähler {zaehler_id}: {e}", file=sys.stderr)
+
+    try:
+        repo = strom_repository.get_repository(args.db)
+        if args.frequenz:
+            perioden = strom_abrechnung.perioden_nach_frequenz(args.start, args.ende, args.frequenz)
+        else:
+            perioden = [(args.start, args.ende)]
+        if args.ausgabe == '-':
+            zaehler_ids = args.zaehler or [zeile[0] for zeile in repo.zaehler_daten()]
+            ergebnisse = strom_abrechnung.abrechnungen_erzeugen(perioden, repo, zaehler_ids, fehler)
+            format = args.format or 'csv'
+            datei = sys.stdout.buffer if EXPORTE[format].binaer else sys.stdout
+            anzahl = exportieren_in(ergebnisse, datei, format)
+        else:
+            anzahl = zaehler_exportieren(repo, perioden, args.ausgabe, args.format, args.zaehler, fehler)
+    except (OSError, ValueError, strom_repository.DatenbankFehler) as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    print(f"{anzahl} Abrechnungen exportiert", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
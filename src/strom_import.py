@@ -0,0 +1,264 @@
+import argparse
+import csv
+import gzip
+import io
+import json
+import math
+import sqlite3
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
+
+import strom_betrag
+import strom_messung
+import strom_repository
+
+# Streaming-Import für Zählerstände, Einzahlungen und Berechnungsgrundlagen
+# aus CSV- oder JSON-Lines-Dateien (auch gzip-komprimiert). Die Zeilen werden
+# geprüft wie in den Eingabemasken und in Blöcken mit executemany geschrieben,
+# sodass der Speicherbedarf unabhängig von der Dateigröße bleibt.
+
+BLOCK_GROESSE = 5000
+
+
+# Als ValueError gilt ein ImportFehler aus einer Prüffunktion als abgelehnte Zeile
+class ImportFehler(ValueError):
+    pass
+
+
+@dataclass
+class ImportErgebnis:
+    importiert: int = 0
+    abgelehnt: int = 0
+
+
+# Datum wie in den Eingabemasken prüfen und als YYYY-MM-DD zurückgeben
+def _datum(wert):
+    return datetime.strptime(str(wert).strip(), "%Y-%m-%d").date().isoformat()
+
+
+# Zahl prüfen; ein Komma als Dezimaltrennzeichen ist wie in strom_berech_data erlaubt
+def _zahl(wert):
+    if isinstance(wert, (int, float)):
+        zahl = float(wert)
+    else:
+        zahl = float(str(wert).strip().replace(",", "."))
+    # inf und nan würden erst beim Schreiben bzw. in der Rollup-Berechnung scheitern
+    if not math.isfinite(zahl):
+        raise ImportFehler(f"Ungültige Zahl: {wert!r}")
+    return zahl
+
+
+# Prüfung wie in save_zaehlerstand
+def pruefe_zaehlerstand(zeile):
+    zaehlerstand = _zahl(zeile['zaehlerstand'])
+    if zaehlerstand < 0:
+        raise ValueError("Der Zählerstand darf nicht negativ sein.")
+    return _datum(zeile['datum']), zaehlerstand
+
+
+# Prüfung wie in save_einzahlung; der Betrag in Euro wird exakt in Cent umgerechnet
+def pruefe_einzahlung(zeile):
+    einzahlung = strom_betrag.cent(zeile['einzahlungen'])
+    if einzahlung <= 0:
+        raise ValueError("Der Betrag muss positiv sein.")
+    return _datum(zeile['datum']), einzahlung
+
+
+# Prüfung wie in save_berechgrundl
+def pruefe_berechgrundl(zeile):
+    datum_von = _datum(zeile['datum_von'])
+    datum_bis = _datum(zeile['datum_bis'])
+    grundpreis = strom_betrag.cent(zeile['grundpreis'])
+    kwh_preis = strom_betrag.preis(zeile['kwh_preis'])
+    if grundpreis < 0 or kwh_preis < 0:
+        raise ValueError("Preise dürfen nicht negativ sein.")
+    if datum_von > datum_bis:
+        raise ValueError("Datum von muss vor Datum bis liegen.")
+    return datum_von, datum_bis, grundpreis, kwh_preis
+
+
+# Tabelle -> (Prüffunktion, Name der Repository-Methode zum Einfügen)
+TABELLEN = {
+    'zaehlerstand': (pruefe_zaehlerstand, 'insert_zaehlerstaende'),
+    'einzahlungen': (pruefe_einzahlung, 'insert_einzahlungen'),
+    'berechgrundl': (pruefe_berechgrundl, 'insert_berechgrundl_zeilen'),
+}
+
+
+# Datei als Text öffnen; gzip wird an den ersten beiden Bytes erkannt
+def _oeffnen(pfad):
+    if pfad == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+    with open(pfad, 'rb') as f:
+        komprimiert = f.read(2) == b'\x1f\x8b'
+    if komprimiert:
+        return gzip.open(pfad, 'rt', encoding='utf-8-sig', newline='')
+    return open(pfad, 'r', encoding='utf-8-sig', newline='')
+
+
+def _format_erkennen(pfad):
+    name = pfad.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return 'csv'
+
+
+def _csv_zeilen(datei):
+    # Trennzeichen (Komma, Semikolon oder Tabulator) aus dem Dateianfang erkennen
+    anfang = datei.readline()
+    try:
+        dialekt = csv.Sniffer().sniff(anfang, delimiters=',;\t')
+    except csv.Error:
+        dialekt = csv.excel
+    leser = csv.DictReader(_mit_anfang(anfang, datei), dialect=dialekt)
+    for zeilennummer, zeile in enumerate(leser, start=2):
+        yield zeilennummer, {(k or '').strip().lower(): v for k, v in zeile.items()}
+
+
+def _mit_anfang(anfang, datei):
+    yield anfang
+    yield from datei
+
+
+def _jsonl_zeilen(datei):
+    for zeilennummer, text in enumerate(datei, start=1):
+        if text.strip():
+            try:
+                yield zeilennummer, json.loads(text)
+            except json.JSONDecodeError as e:
+                yield zeilennummer, e
+
+
+# Datensätze einer Datei nacheinander als (Zeilennummer, dict) liefern
+def zeilen_lesen(datei, format='csv'):
+    if format == 'csv':
+        return _csv_zeilen(datei)
+    if format == 'jsonl':
+        return _jsonl_zeilen(datei)
+    raise ImportFehler(f"Unbekanntes Format: {format}")
+
+
+def _ablehnen(ergebnis, abgelehnt_callback, zeilennummer, zeile, grund):
+    ergebnis.abgelehnt += 1
+    if abgelehnt_callback:
+        abgelehnt_callback(zeilennummer, zeile, grund)
+
+
+# Geprüfte Zeilen als (Zeilennummer, Rohdaten, geprüfte Werte) liefern; ungültige
+# Zeilen werden an abgelehnt_callback gemeldet
+def _gepruefte_zeilen(zeilen, pruefen, ergebnis, abgelehnt_callback):
+    for zeilennummer, zeile in zeilen:
+        try:
+            if isinstance(zeile, Exception):
+                raise ValueError(f"Ungültiges JSON: {zeile}")
+            yield zeilennummer, zeile, pruefen(zeile)
+        except (KeyError, TypeError, ValueError) as e:
+            grund = f"Spalte fehlt: {e}" if isinstance(e, KeyError) else str(e)
+            _ablehnen(ergebnis, abgelehnt_callback, zeilennummer, zeile, grund)
+
+
+# Block schreiben; lehnt die Datenbank ihn ab (z. B. archivierter Zeitraum oder
+# verletzte Bedingung), wird er halbiert und erneut geschrieben, bis die
+# fehlerhaften Zeilen einzeln feststehen. Diese werden abgelehnt, der Rest importiert.
+def _block_schreiben(einfuegen, block, zaehler_id, ergebnis, abgelehnt_callback):
+    try:
+        einfuegen([werte for _, _, werte in block], zaehler_id=zaehler_id)
+    except (sqlite3.IntegrityError, OverflowError) as e:
+        if len(block) == 1:
+            zeilennummer, zeile, _ = block[0]
+            _ablehnen(ergebnis, abgelehnt_callback, zeilennummer, zeile, f"Von der Datenbank abgelehnt: {e}")
+            return
+        mitte = len(block) // 2
+        _block_schreiben(einfuegen, block[:mitte], zaehler_id, ergebnis, abgelehnt_callback)
+        _block_schreiben(einfuegen, block[mitte:], zaehler_id, ergebnis, abgelehnt_callback)
+        return
+    ergebnis.importiert += len(block)
+
+
+# Einen Datenstrom in Blöcken zu je block_groesse Zeilen für einen Zähler in die Tabelle schreiben
+@strom_messung.gemessen('import.importieren_aus')
+def importieren_aus(repo, tabelle, zeilen, block_groesse=BLOCK_GROESSE,
+                    fortschritt=None, abgelehnt_callback=None,
+                    zaehler_id=strom_repository.STANDARD_ZAEHLER) -> ImportErgebnis:
+    if tabelle not in TABELLEN:
+        raise ImportFehler(f"Unbekannte Tabelle: {tabelle}")
+    pruefen, methode = TABELLEN[tabelle]
+    einfuegen = getattr(repo, methode)
+
+    ergebnis = ImportErgebnis()
+    gepruefte = _gepruefte_zeilen(zeilen, pruefen, ergebnis, abgelehnt_callback)
+    while True:
+        block = list(islice(gepruefte, block_groesse))
+        if not block:
+            break
+        _block_schreiben(einfuegen, block, zaehler_id, ergebnis, abgelehnt_callback)
+        if fortschritt:
+            fortschritt(ergebnis)
+    return ergebnis
+
+
+# Datei importieren; das Format wird, wenn nicht angegeben, an der Endung erkannt
+def importieren(repo, tabelle, pfad, format=None, block_groesse=BLOCK_GROESSE,
+                fortschritt=None, abgelehnt_callback=None,
+                zaehler_id=strom_repository.STANDARD_ZAEHLER) -> ImportErgebnis:
+    format = format or _format_erkennen(pfad)
+    with _oeffnen(pfad) as datei:
+        return importieren_aus(repo, tabelle, zeilen_lesen(datei, format), block_groesse,
+                               fortschritt, abgelehnt_callback, zaehler_id)
+
+
+# Aufruf: python3 strom_import.py zaehlerstand ablesungen.csv.gz [--zaehler 2] [--abgelehnt fehler.csv]
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Massenimport in meine_datenbank.db")
+    parser.add_argument('tabelle', choices=sorted(TABELLEN))
+    parser.add_argument('datei', help="CSV- oder JSON-Lines-Datei, optional gzip-komprimiert ('-' für stdin)")
+    parser.add_argument('--format', choices=('csv', 'jsonl'))
+    parser.add_argument('--zaehler', type=int, default=strom_repository.STANDARD_ZAEHLER,
+                        help="Zähler, dem die Zeilen zugeordnet werden")
+    parser.add_argument('--db', default=strom_repository.DB_PATH)
+    parser.add_argument('--block', type=int, default=BLOCK_GROESSE, help="Zeilen pro Transaktion")
+    parser.add_argument('--abgelehnt', help="Datei für abgelehnte Zeilen (CSV)")
+    args = parser.parse_args(argv)
+
+    try:
+        repo = strom_repository.get_repository(args.db)
+    except strom_repository.DatenbankFehler as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    abgelehnt_datei = open(args.abgelehnt, 'w', encoding='utf-8', newline='') if args.abgelehnt else None
+    abgelehnt_schreiber = csv.writer(abgelehnt_datei) if abgelehnt_datei else None
+    if abgelehnt_schreiber:
+        abgelehnt_schreiber.writerow(('zeile', 'grund', 'daten'))
+
+    def abgelehnt_callback(zeilennummer, zeile, grund):
+        if abgelehnt_schreiber:
+            abgelehnt_schreiber.writerow((zeilennummer, grund, json.dumps(zeile, ensure_ascii=False, default=str)))
+        else:
+            print(f"Zeile {zeilennummer} abgelehnt: {grund}", file=sys.stderr)
+
+    def fortschritt(ergebnis):
+        print(f"\r{ergebnis.importiert} Zeilen importiert, {ergebnis.abgelehnt} abgelehnt",
+              end='', file=sys.stderr, flush=True)
+
+    try:
+        ergebnis = importieren(repo, args.tabelle, args.datei, args.format, args.block,
+                               fortschritt, abgelehnt_callback, args.zaehler)
+    except (OSError, ArithmeticError, ImportFehler, strom_repository.DatenbankFehler, sqlite3.Error) as e:
+        print(f"\nImport abgebrochen: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if abgelehnt_datei:
+            abgelehnt_datei.close()
+
+    print(f"\nImport abgeschlossen: {ergebnis.importiert} Zeilen importiert, "
+          f"{ergebnis.abgelehnt} abgelehnt.", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,29 +1,30 @@
 import tkinter as tk
 from tkinter import messagebox
-import subprocess
+import importlib
+import logging
 import os
 
+import strom_log
+
 # Setze das Arbeitsverzeichnis auf den Ordner, in dem sich strom_index.py befindet
 script_dir = os.path.dirname(os.path.abspath(__file__))  # Speichert das Verzeichnis von strom_index.py
+os.chdir(script_dir)
+
+# Eine Logdatei für den Index und alle daraus geöffneten Programme
+strom_log.einrichten()
 
-# Funktion zum Ausführen eines Python-Skripts
-def run_script(script_name):
-    try:
-        # Setze den vollständigen Pfad zum Skript, das ausgeführt werden soll
-        script_path = os.path.join(script_dir, script_name)
-        
-        # subprocess.run wird verwendet, um das Python-Skript auszuführen
-        subprocess.run(["python3", script_path], check=True)
-    except subprocess.CalledProcessError as e:
-        messagebox.showerror("Fehler", f"Das Skript {script_name} konnte nicht ausgeführt werden.")
-    except FileNotFoundError:
-        messagebox.showerror("Fehler", f"Das Skript {script_name} wurde nicht gefunden.")
+# Alle Programme laufen im selben Prozess wie der Index: die Module werden erst
+# beim ersten Klick importiert und öffnen ihre Fenster als Toplevel. Dadurch
+# teilen sich alle Fenster den Verbindungspool aus strom_repository.get_repository().
 
 # Tkinter GUI-Klasse
 class IndexApp(tk.Tk):
     def __init__(self):
         super().__init__()
 
+        # Geöffnete Fenster je (Modul, Klasse), damit ein zweiter Klick das Fenster nur nach vorne holt
+        self.fenster = {}
+
         # Fenster konfigurieren
         self.title("Index für Python-Programme")
         self.geometry("400x400")
@@ -37,7 +38,7 @@ class IndexApp(tk.Tk):
         self.title_label.pack(pady=10)
 
         # Button für Programm 2 (Beispiel)
-        self.button2 = tk.Button(self.layout, text="Berechnungsdaten",command=lambda: run_script("strom_berech_data.py"), bg="lightblue", font=("Arial", 12))
+        self.button2 = tk.Button(self.layout, text="Berechnungsdaten", command=lambda: self.oeffnen("strom_berech_data", "BerechGrundlApp"), bg="lightblue", font=("Arial", 12))
 
 
         self.button2.pack(pady=10, fill=tk.X)
@@ -45,26 +46,47 @@ class IndexApp(tk.Tk):
 
 
         # Button für Programm 1 (Beispiel)
-        self.button1 = tk.Button(self.layout, text="Einzahlungen", command=lambda: run_script("strom_einzahlungen.py"), bg="lightblue", font=("Arial", 12))
+        self.button1 = tk.Button(self.layout, text="Einzahlungen", command=lambda: self.oeffnen("strom_einzahlungen", "EinzahlungenApp"), bg="lightblue", font=("Arial", 12))
         self.button1.pack(pady=10, fill=tk.X)
 
 
 
         # Button für Programm 3 (Beispiel)
-        self.button3 = tk.Button(self.layout, text="Zählerstände", command=lambda: run_script("strom_zaehlerstand.py"), bg="lightblue", font=("Arial", 12))
+        self.button3 = tk.Button(self.layout, text="Zählerstände", command=lambda: self.oeffnen("strom_zaehlerstand", "ZaehlerstandApp"), bg="lightblue", font=("Arial", 12))
         self.button3.pack(pady=10, fill=tk.X)
 
         # Button für Programm 4 (Beispiel)
-        self.button4 = tk.Button(self.layout, text="Berechnung", command=lambda: run_script("strom_berechnung.py"), bg="lightblue", font=("Arial", 12))
+        self.button4 = tk.Button(self.layout, text="Berechnung", command=lambda: self.oeffnen("strom_berechnung", "StromabrechnungApp"), bg="lightblue", font=("Arial", 12))
         self.button4.pack(pady=10, fill=tk.X)
 
 
         # Button für Programm 6 (Beispiel)
-        self.button6 = tk.Button(self.layout, text="Datenbank", command=lambda: run_script("strom_db.py"), bg="lightblue", font=("Arial", 12))
+        self.button6 = tk.Button(self.layout, text="Datenbank", command=lambda: self.oeffnen("strom_db", "StromabrechnungApp"), bg="lightblue", font=("Arial", 12))
         self.button6.pack(pady=10, fill=tk.X)
 
-if __name__ == "__main__":
+    # Funktion zum Öffnen eines Programms als Fenster im laufenden Prozess
+    def oeffnen(self, modul_name, klassen_name):
+        fenster = self.fenster.get((modul_name, klassen_name))
+        if fenster is not None and fenster.winfo_exists():
+            fenster.deiconify()
+            fenster.lift()
+            fenster.focus_set()
+            return
+
+        try:
+            # Das Modul wird nur beim ersten Öffnen importiert und danach aus sys.modules genommen
+            modul = importlib.import_module(modul_name)
+            fenster = getattr(modul, klassen_name)(self)
+        except Exception as e:
+            logging.error(f"Das Programm {modul_name} konnte nicht geöffnet werden: {e}")
+            messagebox.showerror("Fehler", f"Das Programm {modul_name} konnte nicht geöffnet werden.")
+            return
+        self.fenster[(modul_name, klassen_name)] = fenster
+
+# Main-Funktion zum Starten des Index
+def main():
     app = IndexApp()
     app.mainloop()
 
-
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import calendar
+from array import array
+from datetime import date, timedelta
+
+# Kalendermonate für die anteilige Berechnung von Monatspreisen (Grundpreis).
+# Ein Tag zählt als 1/Monatslänge seines Monats; damit ergibt z. B. der Februar
+# genau einen Monat, egal ob er 28 oder 29 Tage hat, und ein ganzes Jahr genau
+# zwölf Monate. Anteile werden als ganze Zahlen in 1/MONATSTEILER Monaten
+# geführt: MONATSTEILER ist das kgV aller Monatslängen, jeder Tagesanteil ist
+# also exakt. Die Monatstabellen werden einmal beim Import aufgebaut; die
+# Position eines Datums ist dann ein Tabellenzugriff, der Anteil eines Zeitraums
+# die Differenz zweier Positionen.
+
+ERSTES_JAHR = 1800
+LETZTES_JAHR = 2399
+
+# kgV(28, 29, 30, 31)
+MONATSTEILER = 377_580
+
+# Je Monatsindex (0 = Januar ERSTES_JAHR): Länge in Tagen, Ordinal des Monatsersten
+# und Anteil eines Tages in 1/MONATSTEILER. Der letzte Eintrag ist der Januar nach
+# LETZTES_JAHR, damit auch der Tag nach dem letzten Tag eine Position hat.
+MONATSLAENGE = array('b')
+MONATSANFANG = array('l')
+TAGESANTEIL = array('l')
+for _jahr in range(ERSTES_JAHR, LETZTES_JAHR + 2):
+    for _monat in range(1, 13):
+        _laenge = calendar.monthrange(_jahr, _monat)[1]
+        MONATSLAENGE.append(_laenge)
+        MONATSANFANG.append(date(_jahr, _monat, 1).toordinal())
+        TAGESANTEIL.append(MONATSTEILER // _laenge)
+        if _jahr > LETZTES_JAHR:
+            break
+del _jahr, _monat, _laenge
+
+
+def monatsindex(datum) -> int:
+    index = (datum.year - ERSTES_JAHR) * 12 + datum.month - 1
+    if not 0 <= index < len(MONATSANFANG):
+        raise ValueError(f"Datum {datum} liegt außerhalb von {ERSTES_JAHR} bis {LETZTES_JAHR}.")
+    return index
+
+
+# Position des Tagesbeginns in 1/MONATSTEILER Monaten seit Januar ERSTES_JAHR
+def position(datum) -> int:
+    index = monatsindex(datum)
+    return index * MONATSTEILER + (datum.day - 1) * TAGESANTEIL[index]
+
+
+# Anteil der Tage von bis bis (beide inklusive) in 1/MONATSTEILER Monaten
+def monatsanteil(von, bis) -> int:
+    return position(bis + timedelta(days=1)) - position(von)
+
+
+# Zeitraum (beide Daten inklusive) in Kalendermonate teilen:
+# [(anfang, ende, tage, monatslaenge), ...]; der erste und letzte Teil sind ggf. angebrochen
+def monate_teilen(von, bis):
+    teile = []
+    index = monatsindex(von)
+    anfang = von
+    while anfang <= bis:
+        naechster_monat = date.fromordinal(MONATSANFANG[index + 1])
+        ende = min(bis, naechster_monat - timedelta(days=1))
+        teile.append((anfang, ende, (ende - anfang).days + 1, MONATSLAENGE[index]))
+        anfang = naechster_monat
+        index += 1
+    return teile
+
+
+# Vektorisierte Variante von monatsanteil für viele Zeiträume auf einmal (z. B.
+# alle Abrechnungsperioden über Jahrzehnte). von und bis sind Arrays mit
+# datetime64[D]-Werten (bis inklusive); NumPy wird nur hier benötigt.
+def monatsanteile(von, bis):
+    import numpy as np
+
+    anfang = np.array(MONATSANFANG, dtype=np.int64)
+    tagesanteil = np.array(TAGESANTEIL, dtype=np.int64)
+    # Ordinal = Tage seit 1970-01-01 + Ordinal des 1970-01-01
+    epoche = date(1970, 1, 1).toordinal()
+
+    def positionen(tage):
+        ordinal = np.asarray(tage, dtype='datetime64[D]').astype(np.int64) + epoche
+        index = np.searchsorted(anfang, ordinal, side='right') - 1
+        if (index < 0).any() or (ordinal >= anfang[-1] + MONATSLAENGE[-1]).any():
+            raise ValueError(f"Datum außerhalb von {ERSTES_JAHR} bis {LETZTES_JAHR}.")
+        return index * MONATSTEILER + (ordinal - anfang[index]) * tagesanteil[index]
+
+    return positionen(np.asarray(bis, dtype='datetime64[D]') + np.timedelta64(1, 'D')) - positionen(von)
@@ -0,0 +1,325 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import strom_benchmark
+import strom_repository
+import strom_server
+
+# Lasttest für strom_server: mehrere Clients schicken über je eine offene
+# keep-alive-Verbindung Stapel von Zählerständen per POST, jeder Client an
+# seinen eigenen Zähler mit fortlaufenden Tagen. Gemessen werden eingefügte
+# Zeilen je Sekunde und die Antwortzeiten der Anfragen. Mit --selbst startet
+# der Test den Server im selben Prozess auf einer temporären Datenbank.
+#
+# Der Stresstest (--stress) lässt zusätzlich, solange geschrieben wird, viele
+# Leser Abrechnungen und Seiten abfragen und startet weitere Prozesse, die wie
+# die GUI-Programme mit eigenem Repository einzeln Zählerstände schreiben und
+# lesen. Gezählt werden alle Fehler, insbesondere "database is locked".
+
+VERBINDUNGEN = 8
+STAPEL = 500
+ANZAHL = 100_000
+
+# Voreinstellungen für --stress
+STRESS_VERBINDUNGEN = 32
+STRESS_STAPEL = 20
+STRESS_LESER = 32
+STRESS_PROZESSE = 4
+
+
+class LasttestFehler(Exception):
+    pass
+
+
+# Minimaler HTTP/1.1-Client auf einer keep-alive-Verbindung
+class Verbindung:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def oeffnen(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    # Anfrage senden und (status, JSON) der Antwort liefern
+    async def anfrage(self, methode, pfad, daten=None):
+        koerper = json.dumps(daten).encode('utf-8') if daten is not None else b''
+        self.writer.write((f"{methode} {pfad} HTTP/1.1\r\nHost: {self.host}\r\n"
+                           f"Content-Type: application/json\r\nContent-Length: {len(koerper)}\r\n\r\n")
+                          .encode('latin-1') + koerper)
+        await self.writer.drain()
+
+        status_zeile = await self.reader.readline()
+        if not status_zeile:
+            raise LasttestFehler("Der Server hat die Verbindung geschlossen.")
+        status = int(status_zeile.split()[1])
+        laenge = 0
+        while True:
+            zeile = await self.reader.readline()
+            if zeile in (b'\r\n', b''):
+                break
+            name, _, wert = zeile.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                laenge = int(wert)
+        antwort = await self.reader.readexactly(laenge)
+        return status, json.loads(antwort) if antwort else None
+
+    async def schliessen(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+
+# Ein Client: legt seinen Zähler an und sendet anzahl Zählerstände in Stapeln
+async def _client(host, port, kunde_id, nummer, anzahl, stapel, latenzen, zufall, zaehler_ids):
+    verbindung = Verbindung(host, port)
+    await verbindung.oeffnen()
+    try:
+        status, antwort = await verbindung.anfrage('POST', '/zaehler',
+                                                   {'kunde': kunde_id, 'bezeichnung': f"Lasttest {nummer}"})
+        if status != 201:
+            raise LasttestFehler(f"Zähler anlegen: {status} {antwort}")
+        pfad = f"/zaehler/{antwort['id']}/zaehlerstaende"
+        # Tarif über den ganzen Zeitraum, damit die Leser echte Abrechnungen bekommen
+        status, tarif = await verbindung.anfrage('POST', f"/zaehler/{antwort['id']}/berechgrundl", {
+            'datum_von': '2000-01-01', 'datum_bis': '2199-12-31', 'grundpreis': '12.00', 'kwh_preis': '32.5'})
+        if status != 201:
+            raise LasttestFehler(f"Tarif anlegen: {status} {tarif}")
+        zaehler_ids.append(antwort['id'])
+
+        tag = date(2000, 1, 1)
+        stand = zufall.uniform(0, 10000)
+        gesendet = 0
+        while gesendet < anzahl:
+            zeilen = []
+            for _ in range(min(stapel, anzahl - gesendet)):
+                stand += zufall.uniform(2, 15)
+                zeilen.append({'datum': tag.isoformat(), 'zaehlerstand': round(stand, 1)})
+                tag += timedelta(days=1)
+            start = time.perf_counter()
+            status, antwort = await verbindung.anfrage('POST', pfad, zeilen)
+            latenzen.append(time.perf_counter() - start)
+            if status != 201:
+                raise LasttestFehler(f"Zählerstände senden: {status} {antwort}")
+            gesendet += antwort['eingefuegt']
+        return gesendet
+    finally:
+        await verbindung.schliessen()
+
+
+# Ein Leser: fragt, bis fertig gesetzt ist, abwechselnd die Abrechnung und eine
+# Seite Zählerstände eines zufälligen Zählers ab. Fehler des Servers (und 422
+# bei noch fehlenden Daten) werden in fehler gezählt.
+async def _leser(host, port, zaehler_ids, fertig, latenzen, fehler, zufall):
+    verbindung = Verbindung(host, port)
+    await verbindung.oeffnen()
+    try:
+        while not fertig.is_set():
+            if not zaehler_ids:
+                await asyncio.sleep(0.01)
+                continue
+            zaehler_id = zufall.choice(zaehler_ids)
+            if zufall.random() < 0.5:
+                pfad = f"/zaehler/{zaehler_id}/abrechnung?start=2000-01-01&ende=2000-12-31"
+            else:
+                pfad = f"/zaehler/{zaehler_id}/zaehlerstaende?anzahl=100"
+            start = time.perf_counter()
+            status, antwort = await verbindung.anfrage('GET', pfad)
+            latenzen.append(time.perf_counter() - start)
+            if status != 200:
+                fehler[f"HTTP {status}: {antwort.get('fehler') if antwort else ''}"] += 1
+    finally:
+        await verbindung.schliessen()
+
+
+# Ein fremder Prozess mit eigenem Repository wie ein GUI-Programm: je Runde ein
+# einzelner Zählerstand (eigene Transaktion) und zwei Abfragen. Läuft im
+# Arbeitsprozess; liefert (Schreibvorgänge, Lesevorgänge, {Fehlertext: Anzahl}).
+def fremder_prozess(db_path, runden, seed):
+    zufall = random.Random(seed)
+    fehler = Counter()
+    schreibvorgaenge = lesevorgaenge = 0
+    repo = strom_repository.StromRepository(db_path, pool_groesse=2)
+    try:
+        zaehler_id = repo.insert_zaehler(strom_repository.STANDARD_ZAEHLER, f"Fremder Prozess {seed}")
+        tag = date(2000, 1, 1)
+        stand = 0.0
+        for _ in range(runden):
+            stand += zufall.uniform(2, 15)
+            try:
+                repo.insert_zaehlerstand(tag, round(stand, 1), zaehler_id=zaehler_id)
+                schreibvorgaenge += 1
+                repo.zaehlerstaende_seite(date(2000, 1, 1), tag, anzahl=50, rueckwaerts=True,
+                                          zaehler_id=zaehler_id)
+                repo.verbrauch_zwischen(date(2000, 1, 1), tag, zaehler_id=zaehler_id)
+                lesevorgaenge += 2
+            except (sqlite3.Error, strom_repository.DatenbankFehler) as e:
+                fehler[f"{type(e).__name__}: {e}"] += 1
+            tag += timedelta(days=1)
+    finally:
+        repo.schliessen()
+    return schreibvorgaenge, lesevorgaenge, dict(fehler)
+
+
+# Lasttest gegen einen laufenden Server; mit leser > 0 fragen parallel so viele
+# Leser ab, mit prozesse > 0 schreiben so viele fremde Prozesse direkt in db_path
+# (je prozess_runden Zählerstände). Liefert ein Dict mit den Messwerten.
+async def lasttest(host, port, verbindungen=VERBINDUNGEN, anzahl=ANZAHL, stapel=STAPEL, seed=1,
+                   leser=0, prozesse=0, db_path=None, prozess_runden=200):
+    steuerung = Verbindung(host, port)
+    await steuerung.oeffnen()
+    try:
+        status, antwort = await steuerung.anfrage('POST', '/kunden', {'name': "Lasttest"})
+        if status != 201:
+            raise LasttestFehler(f"Kunde anlegen: {status} {antwort}")
+    finally:
+        await steuerung.schliessen()
+
+    zufall = random.Random(seed)
+    latenzen = []
+    lese_latenzen = []
+    fehler = Counter()
+    zaehler_ids = []
+    fertig = asyncio.Event()
+    je_client = [anzahl // verbindungen + (i < anzahl % verbindungen) for i in range(verbindungen)]
+
+    loop = asyncio.get_running_loop()
+    # spawn statt fork: der Server läuft ggf. mit Threads im selben Prozess
+    prozess_pool = ProcessPoolExecutor(prozesse, mp_context=multiprocessing.get_context('spawn')) \
+        if prozesse else None
+    try:
+        start = time.perf_counter()
+        fremde = [loop.run_in_executor(prozess_pool, fremder_prozess, db_path, prozess_runden, seed * 1000 + i)
+                  for i in range(prozesse)]
+        lesende = [asyncio.create_task(_leser(host, port, zaehler_ids, fertig, lese_latenzen, fehler,
+                                              random.Random(zufall.random())))
+                   for _ in range(leser)]
+        try:
+            eingefuegt = await asyncio.gather(*(
+                _client(host, port, antwort['id'], i + 1, je_client[i], stapel, latenzen,
+                        random.Random(zufall.random()), zaehler_ids)
+                for i in range(verbindungen)))
+        finally:
+            fertig.set()
+            await asyncio.gather(*lesende, return_exceptions=True)
+        sekunden = time.perf_counter() - start
+        fremd_geschrieben = fremd_gelesen = 0
+        for geschrieben, gelesen, prozess_fehler in await asyncio.gather(*fremde):
+            fremd_geschrieben += geschrieben
+            fremd_gelesen += gelesen
+            fehler.update(prozess_fehler)
+    finally:
+        if prozess_pool is not None:
+            prozess_pool.shutdown()
+    for aufgabe in lesende:
+        if not aufgabe.cancelled() and aufgabe.exception() is not None:
+            fehler[f"Leser: {aufgabe.exception()!r}"] += 1
+
+    latenzen.sort()
+    lese_latenzen.sort()
+    return {
+        'zeilen': sum(eingefuegt),
+        'anfragen': len(latenzen),
+        'sekunden': sekunden,
+        'zeilen_je_sekunde': sum(eingefuegt) / sekunden,
+        'anfragen_je_sekunde': len(latenzen) / sekunden,
+        'p50_ms': strom_benchmark.perzentil(latenzen, 0.50) * 1000,
+        'p95_ms': strom_benchmark.perzentil(latenzen, 0.95) * 1000,
+        'p99_ms': strom_benchmark.perzentil(latenzen, 0.99) * 1000,
+        'leseanfragen': len(lese_latenzen),
+        'lesen_p50_ms': strom_benchmark.perzentil(lese_latenzen, 0.50) * 1000,
+        'lesen_p99_ms': strom_benchmark.perzentil(lese_latenzen, 0.99) * 1000,
+        'fremd_geschrieben': fremd_geschrieben,
+        'fremd_gelesen': fremd_gelesen,
+        'fehler': dict(fehler),
+    }
+
+
+# Server im selben Prozess auf einem freien Port starten, Lasttest ausführen, beenden
+async def _mit_eigenem_server(db_path, threads, **optionen):
+    repo = strom_repository.StromRepository(db_path, pool_groesse=threads)
+    server = strom_server.StromServer(repo, threads)
+    try:
+        await server.starten(strom_server.HOST, 0)
+        port = server.server.sockets[0].getsockname()[1]
+        return await lasttest(strom_server.HOST, port, db_path=db_path, **optionen)
+    finally:
+        await server.beenden()
+        repo.schliessen()
+
+
+# Aufruf: python3 strom_lasttest.py --selbst [--anzahl 100000] [--verbindungen 8] [--stapel 500]
+#         python3 strom_lasttest.py --port 8080   (gegen einen laufenden strom_server)
+#         python3 strom_lasttest.py --selbst --stress [--leser 32] [--prozesse 4]
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lasttest für strom_server mit gestapelten Zählerständen")
+    parser.add_argument('--host', default=strom_server.HOST)
+    parser.add_argument('--port', type=int, default=strom_server.PORT)
+    parser.add_argument('--selbst', action='store_true',
+                        help="Server im selben Prozess auf einer temporären Datenbank starten")
+    parser.add_argument('--threads', type=int, default=strom_repository.POOL_GROESSE,
+                        help="Threads des eigenen Servers (nur mit --selbst)")
+    parser.add_argument('--verbindungen', type=int, help=f"Schreibende Clients (Standard {VERBINDUNGEN})")
+    parser.add_argument('--anzahl', type=int, default=ANZAHL, help="Zählerstände insgesamt")
+    parser.add_argument('--stapel', type=int, help=f"Zählerstände je POST (Standard {STAPEL})")
+    parser.add_argument('--stress', action='store_true',
+                        help=f"Stresstest: {STRESS_VERBINDUNGEN} Schreiber mit Stapeln zu {STRESS_STAPEL}, "
+                             f"{STRESS_LESER} Leser, {STRESS_PROZESSE} fremde Prozesse")
+    parser.add_argument('--leser', type=int, help="Parallel lesende Clients")
+    parser.add_argument('--prozesse', type=int, help="Fremde Prozesse, die direkt in die Datenbank schreiben")
+    parser.add_argument('--db', help="Datenbank des laufenden Servers (für --prozesse ohne --selbst)")
+    args = parser.parse_args(argv)
+
+    stress = args.stress
+    optionen = dict(
+        verbindungen=args.verbindungen or (STRESS_VERBINDUNGEN if stress else VERBINDUNGEN),
+        stapel=args.stapel or (STRESS_STAPEL if stress else STAPEL),
+        leser=args.leser if args.leser is not None else (STRESS_LESER if stress else 0),
+        prozesse=args.prozesse if args.prozesse is not None else (STRESS_PROZESSE if stress else 0),
+        anzahl=args.anzahl,
+    )
+    if optionen['verbindungen'] < 1 or optionen['stapel'] < 1 or args.anzahl < 1:
+        parser.error("--verbindungen, --stapel und --anzahl müssen positiv sein")
+    if optionen['prozesse'] and not args.selbst and not args.db:
+        parser.error("--prozesse braucht --selbst oder --db")
+    try:
+        if args.selbst:
+            with tempfile.TemporaryDirectory() as verzeichnis:
+                db_path = os.path.join(verzeichnis, 'lasttest.db')
+                sqlite3.connect(db_path).close()
+                ergebnis = asyncio.run(_mit_eigenem_server(db_path, args.threads, **optionen))
+        else:
+            ergebnis = asyncio.run(lasttest(args.host, args.port, db_path=args.db, **optionen))
+    except (OSError, LasttestFehler, strom_repository.DatenbankFehler) as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    print(f"{ergebnis['zeilen']} Zählerstände in {ergebnis['anfragen']} Anfragen, {ergebnis['sekunden']:.2f} s")
+    print(f"{ergebnis['zeilen_je_sekunde']:.0f} Zeilen/s, {ergebnis['anfragen_je_sekunde']:.1f} Anfragen/s")
+    print(f"Antwortzeit p50 {ergebnis['p50_ms']:.1f} ms, p95 {ergebnis['p95_ms']:.1f} ms, "
+          f"p99 {ergebnis['p99_ms']:.1f} ms")
+    if ergebnis['leseanfragen']:
+        print(f"{ergebnis['leseanfragen']} Leseanfragen, p50 {ergebnis['lesen_p50_ms']:.1f} ms, "
+              f"p99 {ergebnis['lesen_p99_ms']:.1f} ms")
+    if optionen['prozesse']:
+        print(f"Fremde Prozesse: {ergebnis['fremd_geschrieben']} Zählerstände geschrieben, "
+              f"{ergebnis['fremd_gelesen']} Abfragen")
+    for text, anzahl in sorted(ergebnis['fehler'].items(), key=lambda f: -f[1]):
+        print(f"Fehler ({anzahl}x): {text}", file=sys.stderr)
+    return 1 if ergebnis['fehler'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,44 @@
+import logging
+import os
+import sys
+import threading
+from logging.handlers import RotatingFileHandler
+
+# Gemeinsames Logging aller Strom-Programme: eine Logdatei neben den Skripten
+# statt getrennter Dateien in /tmp und im jeweiligen Arbeitsverzeichnis. Jede
+# Zeile trägt Zeitstempel, Stufe, Thread und Modul, damit sich Meldungen aus
+# mehreren Fenstern und Hintergrundaufgaben desselben Prozesses zuordnen lassen.
+# Datei und Stufe lassen sich über STROM_LOG bzw. STROM_LOG_STUFE ändern.
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+LOG_DATEI = os.environ.get('STROM_LOG') or os.path.join(script_dir, 'strom.log')
+LOG_STUFE = os.environ.get('STROM_LOG_STUFE', 'INFO').upper()
+FORMAT = '%(asctime)s %(levelname)s [%(threadName)s] %(module)s: %(message)s'
+
+# Rotation: höchstens MAX_BYTES je Datei, BACKUPS ältere Dateien
+MAX_BYTES = 5 * 1024 * 1024
+BACKUPS = 3
+
+_eingerichtet = False
+_konsole = None
+_lock = threading.Lock()
+
+
+# Logging des Prozesses einrichten; mehrfache Aufrufe (jedes Programm beim
+# Import) sind unschädlich. Mit konsole werden Meldungen zusätzlich auf stderr ausgegeben.
+def einrichten(konsole=False) -> None:
+    global _eingerichtet, _konsole
+    with _lock:
+        wurzel = logging.getLogger()
+        if not _eingerichtet:
+            datei = RotatingFileHandler(LOG_DATEI, maxBytes=MAX_BYTES, backupCount=BACKUPS, encoding='utf-8',
+                                        delay=True)
+            datei.setFormatter(logging.Formatter(FORMAT))
+            wurzel.addHandler(datei)
+            wurzel.setLevel(getattr(logging, LOG_STUFE, logging.INFO))
+            _eingerichtet = True
+        if konsole and _konsole is None:
+            _konsole = logging.StreamHandler(sys.stderr)
+            _konsole.setFormatter(logging.Formatter(FORMAT))
+            wurzel.addHandler(_konsole)
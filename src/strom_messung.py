@@ -0,0 +1,339 @@
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+
+# Laufzeitmessung für SQL und Rechenkern. Jede SQL-Anweisung (über
+# strom_repository.verbinden geöffnete Verbindungen) und jeder mit @gemessen
+# markierte Aufruf landet in einem Histogramm im Prozess: Anzahl, Summe,
+# Maximum, Zeilen und Verteilung auf feste Zeitgrenzen. Bei SQL zählt die Zeit
+# von execute bis zur letzten abgeholten Zeile, weil SQLite die Ergebnisse erst
+# beim Abholen berechnet. Anweisungen über der Schwelle kommen mit ihrem
+# EXPLAIN QUERY PLAN ins Log (Slow-Query-Log). Abrufbar als JSON oder im
+# Textformat von Prometheus, z. B. über GET /metriken des HTTP-Dienstes.
+#
+# Standardmäßig aus, damit die normale Nutzung nichts kostet. Einschalten mit
+# STROM_MESSUNG=1 (Schwelle STROM_MESSUNG_SCHWELLE_MS, Ausgabe beim Beenden nach
+# STROM_MESSUNG_DATEI) oder mit aktivieren() vor dem Öffnen des Repositorys –
+# nur danach geöffnete Verbindungen werden gemessen.
+
+SCHWELLE_MS = float(os.environ.get('STROM_MESSUNG_SCHWELLE_MS', 100))
+
+# Obere Grenzen der Histogrammklassen in Sekunden (wie "le" bei Prometheus)
+GRENZEN = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# So viele langsame Anweisungen bleiben für die Ausgabe im Speicher
+MAX_LANGSAME = 100
+
+# Nur für diese Anweisungen lässt sich ein Abfrageplan ermitteln
+PLAN_ANWEISUNGEN = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+_aktiv = os.environ.get('STROM_MESSUNG', '') not in ('', '0')
+_schwelle = SCHWELLE_MS / 1000
+_histogramme = {}
+_langsame = deque(maxlen=MAX_LANGSAME)
+_plaene = {}
+_lock = threading.Lock()
+
+
+class Histogramm:
+    def __init__(self):
+        self.klassen = [0] * (len(GRENZEN) + 1)
+        self.anzahl = 0
+        self.summe = 0.0
+        self.maximum = 0.0
+        self.zeilen = 0
+
+    def erfassen(self, sekunden, zeilen=0):
+        self.klassen[bisect_left(GRENZEN, sekunden)] += 1
+        self.anzahl += 1
+        self.summe += sekunden
+        self.zeilen += zeilen
+        if sekunden > self.maximum:
+            self.maximum = sekunden
+
+    # Kumulierte Anzahlen je Grenze, die letzte ist "+Inf"
+    def kumuliert(self):
+        summe = 0
+        ergebnis = []
+        for anzahl in self.klassen:
+            summe += anzahl
+            ergebnis.append(summe)
+        return ergebnis
+
+
+def aktivieren(schwelle_ms=None):
+    global _aktiv, _schwelle
+    if schwelle_ms is not None:
+        _schwelle = schwelle_ms / 1000
+    _aktiv = True
+
+
+def deaktivieren():
+    global _aktiv
+    _aktiv = False
+
+
+def aktiv() -> bool:
+    return _aktiv
+
+
+def zuruecksetzen():
+    with _lock:
+        _histogramme.clear()
+        _langsame.clear()
+        _plaene.clear()
+
+
+# Messwert unter (art, name) eintragen, z. B. ('sql', 'SELECT ...') oder ('aufruf', 'abrechnung.berechnen')
+def erfassen(art, name, sekunden, zeilen=0):
+    with _lock:
+        histogramm = _histogramme.get((art, name))
+        if histogramm is None:
+            histogramm = _histogramme[(art, name)] = Histogramm()
+        histogramm.erfassen(sekunden, zeilen)
+
+
+# Dekorator für Aufrufe des Rechenkerns und andere heiße Pfade
+def gemessen(name, art='aufruf'):
+    def dekorator(funktion):
+        @wraps(funktion)
+        def messen(*args, **kwargs):
+            if not _aktiv:
+                return funktion(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return funktion(*args, **kwargs)
+            finally:
+                erfassen(art, name, time.perf_counter() - start)
+        return messen
+    return dekorator
+
+
+# Dasselbe als with-Block für Abschnitte innerhalb einer Funktion
+@contextmanager
+def messen(art, name):
+    if not _aktiv:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        erfassen(art, name, time.perf_counter() - start)
+
+
+# SQL mit zusammengefassten Leerzeichen als Name der Anweisung
+@lru_cache(maxsize=1024)
+def _sql_name(sql):
+    return ' '.join(sql.split())
+
+
+# Abfrageplan einer langsamen Anweisung; je Anweisung nur einmal ermittelt.
+# Läuft über einen gewöhnlichen Cursor, damit EXPLAIN nicht selbst gemessen wird.
+def _plan(conn, sql, parameter):
+    name = _sql_name(sql)
+    with _lock:
+        plan = _plaene.get(name)
+    if plan is not None:
+        return plan
+    if not name.upper().startswith(PLAN_ANWEISUNGEN) or parameter is None:
+        return []
+    try:
+        zeilen = sqlite3.Cursor(conn).execute('EXPLAIN QUERY PLAN ' + sql, parameter).fetchall()
+    except sqlite3.Error as e:
+        logging.debug(f"Kein Abfrageplan für {name}: {e}")
+        return []
+    plan = [zeile[-1] for zeile in zeilen]
+    with _lock:
+        _plaene[name] = plan
+    return plan
+
+
+def _langsam(conn, sql, parameter, sekunden, zeilen):
+    plan = _plan(conn, sql, parameter)
+    name = _sql_name(sql)
+    with _lock:
+        _langsame.append({'sql': name, 'ms': round(sekunden * 1000, 3), 'zeilen': zeilen, 'plan': plan,
+                          'zeit': time.strftime('%Y-%m-%dT%H:%M:%S')})
+    logging.warning(f"Langsame Anweisung ({sekunden * 1000:.1f} ms, {zeilen} Zeilen): {name}"
+                    + ''.join(f"\n    {schritt}" for schritt in plan))
+
+
+# Cursor, der die Zeit von execute bis zum Ende des Ergebnisses und die Zeilen
+# zählt. Erfasst wird, sobald das Ergebnis erschöpft, der Cursor erneut
+# ausgeführt, geschlossen oder freigegeben wird.
+class MessCursor(sqlite3.Cursor):
+    _offen = False
+
+    def _beginnen(self, sql, parameter):
+        self._abschliessen()
+        self._sql = sql
+        self._parameter = parameter
+        self._dauer = 0.0
+        self._zeilen = 0
+        self._offen = True
+
+    def _abschliessen(self):
+        if not self._offen:
+            return
+        self._offen = False
+        erfassen('sql', _sql_name(self._sql), self._dauer, self._zeilen)
+        if self._dauer >= _schwelle:
+            try:
+                _langsam(self.connection, self._sql, self._parameter, self._dauer, self._zeilen)
+            except Exception as e:
+                logging.debug(f"Langsame Anweisung nicht protokolliert: {e}")
+
+    # Ohne Ergebnismenge (INSERT, UPDATE, DDL) ist die Anweisung mit execute fertig
+    def _ausgefuehrt(self, start):
+        self._dauer += time.perf_counter() - start
+        if self.description is None:
+            self._zeilen = max(self.rowcount, 0)
+            self._abschliessen()
+        return self
+
+    def execute(self, sql, parameter=()):
+        self._beginnen(sql, parameter)
+        start = time.perf_counter()
+        try:
+            super().execute(sql, parameter)
+        except BaseException:
+            self._offen = False
+            raise
+        return self._ausgefuehrt(start)
+
+    def executemany(self, sql, parameter_folge):
+        self._beginnen(sql, None)
+        start = time.perf_counter()
+        try:
+            super().executemany(sql, parameter_folge)
+        except BaseException:
+            self._offen = False
+            raise
+        return self._ausgefuehrt(start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        zeile = super().fetchone()
+        self._dauer += time.perf_counter() - start
+        if zeile is None:
+            self._abschliessen()
+        else:
+            self._zeilen += 1
+        return zeile
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        zeilen = super().fetchmany(self.arraysize if size is None else size)
+        self._dauer += time.perf_counter() - start
+        self._zeilen += len(zeilen)
+        if not zeilen:
+            self._abschliessen()
+        return zeilen
+
+    def fetchall(self):
+        start = time.perf_counter()
+        zeilen = super().fetchall()
+        self._dauer += time.perf_counter() - start
+        self._zeilen += len(zeilen)
+        self._abschliessen()
+        return zeilen
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            zeile = super().__next__()
+        except StopIteration:
+            self._dauer += time.perf_counter() - start
+            self._abschliessen()
+            raise
+        self._dauer += time.perf_counter() - start
+        self._zeilen += 1
+        return zeile
+
+    def close(self):
+        self._abschliessen()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._abschliessen()
+        except Exception:
+            pass
+
+
+# Verbindung, deren execute/executemany über MessCursor laufen (factory für sqlite3.connect)
+class MessVerbindung(sqlite3.Connection):
+    def execute(self, sql, parameter=()):
+        return MessCursor(self).execute(sql, parameter)
+
+    def executemany(self, sql, parameter_folge):
+        return MessCursor(self).executemany(sql, parameter_folge)
+
+
+def als_json() -> dict:
+    with _lock:
+        histogramme = [{
+            'art': art,
+            'name': name,
+            'anzahl': h.anzahl,
+            'summe_s': h.summe,
+            'max_s': h.maximum,
+            'zeilen': h.zeilen,
+            'klassen': dict(zip([str(g) for g in GRENZEN] + ['+Inf'], h.kumuliert())),
+        } for (art, name), h in sorted(_histogramme.items())]
+        return {'schwelle_ms': _schwelle * 1000, 'histogramme': histogramme, 'langsam': list(_langsame)}
+
+
+def _label(wert):
+    return wert.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Textformat von Prometheus: je Art ein Histogramm strom_<art>_sekunden mit
+# dem Namen als Label, dazu die Zeilenzahl als Zähler strom_<art>_zeilen_total
+def als_prometheus() -> str:
+    with _lock:
+        nach_art = {}
+        for (art, name), h in sorted(_histogramme.items()):
+            nach_art.setdefault(art, []).append((name, h, h.kumuliert()))
+    zeilen = []
+    for art, eintraege in nach_art.items():
+        metrik = f"strom_{art}_sekunden"
+        zeilen.append(f"# HELP {metrik} Laufzeit ({art}) in Sekunden")
+        zeilen.append(f"# TYPE {metrik} histogram")
+        for name, h, kumuliert in eintraege:
+            label = _label(name)
+            for grenze, anzahl in zip([str(g) for g in GRENZEN] + ['+Inf'], kumuliert):
+                zeilen.append(f'{metrik}_bucket{{name="{label}",le="{grenze}"}} {anzahl}')
+            zeilen.append(f'{metrik}_sum{{name="{label}"}} {h.summe!r}')
+            zeilen.append(f'{metrik}_count{{name="{label}"}} {h.anzahl}')
+        zeilen.append(f"# HELP strom_{art}_zeilen_total Verarbeitete Zeilen ({art})")
+        zeilen.append(f"# TYPE strom_{art}_zeilen_total counter")
+        for name, h, _ in eintraege:
+            zeilen.append(f'strom_{art}_zeilen_total{{name="{_label(name)}"}} {h.zeilen}')
+    return '\n'.join(zeilen) + '\n'
+
+
+def speichern(pfad):
+    with open(pfad, 'w', encoding='utf-8') as datei:
+        json.dump(als_json(), datei, ensure_ascii=False, indent=2)
+
+
+def _beim_beenden(pfad):
+    try:
+        speichern(pfad)
+    except OSError as e:
+        logging.error(f"Messwerte konnten nicht nach '{pfad}' geschrieben werden: {e}")
+
+
+if _aktiv and os.environ.get('STROM_MESSUNG_DATEI'):
+    atexit.register(_beim_beenden, os.environ['STROM_MESSUNG_DATEI'])
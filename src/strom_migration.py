@@ -0,0 +1,521 @@
+import logging
+import os
+import sqlite3
+import sys
+from datetime import date, datetime
+
+import strom_archiv
+import strom_betrag
+import strom_rollup
+import strom_verbrauch
+
+# Versionierte Schema-Migrationen für meine_datenbank.db.
+# Der erreichte Stand wird in PRAGMA user_version gespeichert; jede Migration
+# läuft in einer eigenen Transaktion und aktualisiert die Datenbank an Ort und Stelle.
+# Alte Zeilen, die eine neue Bedingung verletzen, bringen eine Migration nicht
+# zum Scheitern: was sich eindeutig richtigstellen lässt (vertauschte
+# Tarifgrenzen), wird korrigiert, alles andere aus der Tabelle genommen. Beides
+# steht mit den ursprünglichen Werten in tbl_bereinigung und im Log.
+
+
+class MigrationsFehler(Exception):
+    pass
+
+
+# Datumswerte für die Übernahme alter Daten auf YYYY-MM-DD bringen (None, wenn ungültig)
+def _datum_iso(wert):
+    if wert is None:
+        return None
+    text = str(wert).strip()[:10]
+    try:
+        return date.fromisoformat(text).isoformat()
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        return None
+
+
+def _bereinigung_anlegen(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tbl_bereinigung (
+            id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL,
+            tabelle TEXT NOT NULL,
+            zeile_id INTEGER NOT NULL,
+            aktion TEXT NOT NULL CHECK (aktion IN ('korrigiert', 'entfernt')),
+            grund TEXT NOT NULL,
+            daten TEXT NOT NULL
+        )
+    ''')
+
+
+# Zeilen von tabelle, die die Bedingung erfüllen, mit ihren bisherigen Werten
+# (spalten als JSON) in tbl_bereinigung festhalten; liefert die Anzahl
+def _protokollieren(conn, version, tabelle, schluessel, spalten, bedingung, aktion, grund):
+    daten = ', '.join(f"'{spalte}', {spalte}" for spalte in spalten)
+    anzahl = conn.execute(f'''
+        INSERT INTO tbl_bereinigung (version, tabelle, zeile_id, aktion, grund, daten)
+        SELECT ?, ?, {schluessel}, ?, ?, json_object({daten}) FROM {tabelle} WHERE {bedingung}
+    ''', (version, tabelle, aktion, grund)).rowcount
+    if anzahl:
+        logging.warning(f"Migration auf Version {version}: {anzahl} Zeile(n) in {tabelle} {aktion} ({grund}), "
+                        f"siehe tbl_bereinigung.")
+    return anzahl
+
+
+# tabelle nach tabelle_neu umkopieren (einfuegen ist ein INSERT OR IGNORE);
+# Zeilen, die dort an einer Bedingung scheitern, werden protokolliert statt übernommen
+def _umkopieren(conn, version, tabelle, schluessel, spalten, einfuegen, grund):
+    conn.execute(einfuegen)
+    _protokollieren(conn, version, tabelle, schluessel, spalten,
+                    f"{schluessel} NOT IN (SELECT id FROM {tabelle}_neu)", 'entfernt', grund)
+
+
+# Umrechnung für die Migration: ungültige Werte werden NULL und scheitern
+# dann an NOT NULL, statt die ganze Migration abzubrechen
+def _oder_null(umrechnen):
+    def funktion(wert):
+        try:
+            return umrechnen(wert)
+        except (TypeError, ValueError):
+            return None
+    return funktion
+
+
+# Version 1: ursprüngliche Tabellen ohne Schlüssel und Indizes
+def _v1_grundtabellen(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tbl_zaehlerstand (
+            datum DATE,
+            zaehlerstand REAL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tbl_einzahlungen (
+            datum DATE,
+            einzahlungen INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tbl_berechgrundl (
+            datum_von DATE,
+            datum_bis DATE,
+            grundpreis REAL,
+            kwh_preis REAL
+        )
+    ''')
+
+
+# Version 2: Primärschlüssel, einheitliche Typen, CHECK-Constraints und Datumsindizes.
+# Die Tabellen werden neu aufgebaut; die bisherigen rowids bleiben als id erhalten.
+def _v2_schluessel_und_indizes(conn):
+    conn.create_function('datum_iso', 1, _datum_iso, deterministic=True)
+    _bereinigung_anlegen(conn)
+
+    conn.execute('''
+        CREATE TABLE tbl_zaehlerstand_neu (
+            id INTEGER PRIMARY KEY,
+            datum DATE NOT NULL CHECK (datum = date(datum)),
+            zaehlerstand REAL NOT NULL CHECK (zaehlerstand >= 0)
+        )
+    ''')
+    _umkopieren(conn, 2, 'tbl_zaehlerstand', 'rowid', ('datum', 'zaehlerstand'), '''
+        INSERT OR IGNORE INTO tbl_zaehlerstand_neu (id, datum, zaehlerstand)
+        SELECT rowid, datum_iso(datum), zaehlerstand FROM tbl_zaehlerstand
+    ''', "ungültiges Datum oder fehlender bzw. negativer Zählerstand")
+
+    conn.execute('''
+        CREATE TABLE tbl_einzahlungen_neu (
+            id INTEGER PRIMARY KEY,
+            datum DATE NOT NULL CHECK (datum = date(datum)),
+            einzahlungen REAL NOT NULL CHECK (einzahlungen > 0)
+        )
+    ''')
+    _umkopieren(conn, 2, 'tbl_einzahlungen', 'rowid', ('datum', 'einzahlungen'), '''
+        INSERT OR IGNORE INTO tbl_einzahlungen_neu (id, datum, einzahlungen)
+        SELECT rowid, datum_iso(datum), einzahlungen FROM tbl_einzahlungen
+    ''', "ungültiges Datum oder fehlender, nicht positiver Betrag")
+
+    conn.execute('''
+        CREATE TABLE tbl_berechgrundl_neu (
+            id INTEGER PRIMARY KEY,
+            datum_von DATE NOT NULL CHECK (datum_von = date(datum_von)),
+            datum_bis DATE NOT NULL CHECK (datum_bis = date(datum_bis)),
+            grundpreis REAL NOT NULL CHECK (grundpreis >= 0),
+            kwh_preis REAL NOT NULL CHECK (kwh_preis >= 0),
+            CHECK (datum_von <= datum_bis)
+        )
+    ''')
+    # Vertauschte Grenzen sind eindeutig gemeint und werden getauscht
+    spalten = ('datum_von', 'datum_bis', 'grundpreis', 'kwh_preis')
+    vertauscht = 'datum_iso(datum_von) > datum_iso(datum_bis)'
+    if _protokollieren(conn, 2, 'tbl_berechgrundl', 'rowid', spalten, vertauscht, 'korrigiert',
+                       "datum_von nach datum_bis, Grenzen getauscht"):
+        conn.execute(f'UPDATE tbl_berechgrundl SET datum_von = datum_bis, datum_bis = datum_von WHERE {vertauscht}')
+    _umkopieren(conn, 2, 'tbl_berechgrundl', 'rowid', spalten, '''
+        INSERT OR IGNORE INTO tbl_berechgrundl_neu (id, datum_von, datum_bis, grundpreis, kwh_preis)
+        SELECT rowid, datum_iso(datum_von), datum_iso(datum_bis), grundpreis, kwh_preis
+        FROM tbl_berechgrundl
+    ''', "ungültiges Datum oder fehlender bzw. negativer Preis")
+
+    for tabelle in ('tbl_zaehlerstand', 'tbl_einzahlungen', 'tbl_berechgrundl'):
+        conn.execute(f'DROP TABLE {tabelle}')
+        conn.execute(f'ALTER TABLE {tabelle}_neu RENAME TO {tabelle}')
+
+    # Die Indizes enthalten die abgefragten Spalten, damit Bereichsabfragen
+    # direkt aus dem Index beantwortet werden können
+    conn.execute('CREATE INDEX idx_zaehlerstand_datum ON tbl_zaehlerstand (datum, zaehlerstand)')
+    conn.execute('CREATE INDEX idx_einzahlungen_datum ON tbl_einzahlungen (datum, einzahlungen)')
+    conn.execute('''
+        CREATE INDEX idx_berechgrundl_zeitraum
+        ON tbl_berechgrundl (datum_von, datum_bis, grundpreis, kwh_preis)
+    ''')
+
+
+# Version 3: materialisierter Tagesverbrauch. Die Tabelle wird mit Version 4
+# je Zähler neu angelegt und erst dort aus den Ablesungen aufgebaut.
+def _v3_verbrauch_tag(conn):
+    conn.execute('''
+        CREATE TABLE tbl_verbrauch_tag (
+            datum DATE PRIMARY KEY CHECK (datum = date(datum)),
+            verbrauch REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+# Version 4: Kunden und Zähler. Ablesungen, Einzahlungen und Tarife gehören zu
+# einem Zähler; vorhandene Daten werden dem Zähler 1 des Kunden 1 zugeordnet.
+# Alle Bereichsabfragen laufen über Indizes mit (zaehler_id, datum) vorn.
+def _v4_zaehler_und_kunden(conn):
+    conn.execute('''
+        CREATE TABLE tbl_kunde (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE tbl_zaehler (
+            id INTEGER PRIMARY KEY,
+            kunde_id INTEGER NOT NULL REFERENCES tbl_kunde (id),
+            bezeichnung TEXT NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX idx_zaehler_kunde ON tbl_zaehler (kunde_id)')
+    conn.execute("INSERT INTO tbl_kunde (id, name) VALUES (1, 'Standardkunde')")
+    conn.execute("INSERT INTO tbl_zaehler (id, kunde_id, bezeichnung) VALUES (1, 1, 'Hauptzähler')")
+
+    conn.execute('''
+        CREATE TABLE tbl_zaehlerstand_neu (
+            id INTEGER PRIMARY KEY,
+            zaehler_id INTEGER NOT NULL REFERENCES tbl_zaehler (id),
+            datum DATE NOT NULL CHECK (datum = date(datum)),
+            zaehlerstand REAL NOT NULL CHECK (zaehlerstand >= 0)
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO tbl_zaehlerstand_neu (id, zaehler_id, datum, zaehlerstand)
+        SELECT id, 1, datum, zaehlerstand FROM tbl_zaehlerstand
+    ''')
+
+    conn.execute('''
+        CREATE TABLE tbl_einzahlungen_neu (
+            id INTEGER PRIMARY KEY,
+            zaehler_id INTEGER NOT NULL REFERENCES tbl_zaehler (id),
+            datum DATE NOT NULL CHECK (datum = date(datum)),
+            einzahlungen REAL NOT NULL CHECK (einzahlungen > 0)
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO tbl_einzahlungen_neu (id, zaehler_id, datum, einzahlungen)
+        SELECT id, 1, datum, einzahlungen FROM tbl_einzahlungen
+    ''')
+
+    conn.execute('''
+        CREATE TABLE tbl_berechgrundl_neu (
+            id INTEGER PRIMARY KEY,
+            zaehler_id INTEGER NOT NULL REFERENCES tbl_zaehler (id),
+            datum_von DATE NOT NULL CHECK (datum_von = date(datum_von)),
+            datum_bis DATE NOT NULL CHECK (datum_bis = date(datum_bis)),
+            grundpreis REAL NOT NULL CHECK (grundpreis >= 0),
+            kwh_preis REAL NOT NULL CHECK (kwh_preis >= 0),
+            CHECK (datum_von <= datum_bis)
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO tbl_berechgrundl_neu (id, zaehler_id, datum_von, datum_bis, grundpreis, kwh_preis)
+        SELECT id, 1, datum_von, datum_bis, grundpreis, kwh_preis FROM tbl_berechgrundl
+    ''')
+
+    for tabelle in ('tbl_zaehlerstand', 'tbl_einzahlungen', 'tbl_berechgrundl'):
+        conn.execute(f'DROP TABLE {tabelle}')
+        conn.execute(f'ALTER TABLE {tabelle}_neu RENAME TO {tabelle}')
+
+    conn.execute('CREATE INDEX idx_zaehlerstand_zaehler_datum ON tbl_zaehlerstand (zaehler_id, datum, zaehlerstand)')
+    conn.execute('CREATE INDEX idx_einzahlungen_zaehler_datum ON tbl_einzahlungen (zaehler_id, datum, einzahlungen)')
+    conn.execute('''
+        CREATE INDEX idx_berechgrundl_zaehler_zeitraum
+        ON tbl_berechgrundl (zaehler_id, datum_von, datum_bis, grundpreis, kwh_preis)
+    ''')
+
+    conn.execute('DROP TABLE tbl_verbrauch_tag')
+    conn.execute('''
+        CREATE TABLE tbl_verbrauch_tag (
+            zaehler_id INTEGER NOT NULL REFERENCES tbl_zaehler (id),
+            datum DATE NOT NULL CHECK (datum = date(datum)),
+            verbrauch REAL NOT NULL,
+            PRIMARY KEY (zaehler_id, datum)
+        ) WITHOUT ROWID
+    ''')
+    strom_verbrauch.neu_aufbauen(conn)
+
+
+# Version 5: Beträge als ganze Zahlen (siehe strom_betrag). Einzahlungen und
+# Grundpreise werden von Euro in Cent umgerechnet, Arbeitspreise von ct/kWh in
+# PREIS_SKALA-tel Cent. Die Umrechnung läuft in Python über Decimal mit der
+# kaufmännischen Rundung, nicht über ROUND() auf dem float-Wert.
+def _v5_festkomma_betraege(conn):
+    conn.create_function('cent', 1, _oder_null(strom_betrag.cent), deterministic=True)
+    conn.create_function('preis', 1, _oder_null(strom_betrag.preis), deterministic=True)
+    _bereinigung_anlegen(conn)
+
+    conn.execute('''
+        CREATE TABLE tbl_einzahlungen_neu (
+            id INTEGER PRIMARY KEY,
+            zaehler_id INTEGER NOT NULL REFERENCES tbl_zaehler (id),
+            datum DATE NOT NULL CHECK (datum = date(datum)),
+            einzahlungen INTEGER NOT NULL CHECK (typeof(einzahlungen) = 'integer' AND einzahlungen > 0)
+        )
+    ''')
+    _umkopieren(conn, 5, 'tbl_einzahlungen', 'id', ('zaehler_id', 'datum', 'einzahlungen'), '''
+        INSERT OR IGNORE INTO tbl_einzahlungen_neu (id, zaehler_id, datum, einzahlungen)
+        SELECT id, zaehler_id, datum, cent(einzahlungen) FROM tbl_einzahlungen
+    ''', "Betrag ergibt gerundet keinen positiven Centbetrag")
+
+    conn.execute('''
+        CREATE TABLE tbl_berechgrundl_neu (
+            id INTEGER PRIMARY KEY,
+            zaehler_id INTEGER NOT NULL REFERENCES tbl_zaehler (id),
+            datum_von DATE NOT NULL CHECK (datum_von = date(datum_von)),
+            datum_bis DATE NOT NULL CHECK (datum_bis = date(datum_bis)),
+            grundpreis INTEGER NOT NULL CHECK (typeof(grundpreis) = 'integer' AND grundpreis >= 0),
+            kwh_preis INTEGER NOT NULL CHECK (typeof(kwh_preis) = 'integer' AND kwh_preis >= 0),
+            CHECK (datum_von <= datum_bis)
+        )
+    ''')
+    spalten = ('zaehler_id', 'datum_von', 'datum_bis', 'grundpreis', 'kwh_preis')
+    _umkopieren(conn, 5, 'tbl_berechgrundl', 'id', spalten, '''
+        INSERT OR IGNORE INTO tbl_berechgrundl_neu (id, zaehler_id, datum_von, datum_bis, grundpreis, kwh_preis)
+        SELECT id, zaehler_id, datum_von, datum_bis, cent(grundpreis), preis(kwh_preis) FROM tbl_berechgrundl
+    ''', "Preis lässt sich nicht in Cent umrechnen")
+
+    for tabelle in ('tbl_einzahlungen', 'tbl_berechgrundl'):
+        conn.execute(f'DROP TABLE {tabelle}')
+        conn.execute(f'ALTER TABLE {tabelle}_neu RENAME TO {tabelle}')
+
+    conn.execute('CREATE INDEX idx_einzahlungen_zaehler_datum ON tbl_einzahlungen (zaehler_id, datum, einzahlungen)')
+    conn.execute('''
+        CREATE INDEX idx_berechgrundl_zaehler_zeitraum
+        ON tbl_berechgrundl (zaehler_id, datum_von, datum_bis, grundpreis, kwh_preis)
+    ''')
+
+
+# Tabellen, deren Änderungen in tbl_datenversion gezählt werden
+VERSIONIERTE_TABELLEN = ('tbl_zaehlerstand', 'tbl_einzahlungen', 'tbl_berechgrundl')
+
+
+# Version 6: Änderungszähler je (Zähler, Tabelle) für das Zwischenspeichern von
+# Abrechnungen. Trigger erhöhen den Zähler bei jedem INSERT, UPDATE und DELETE,
+# auch wenn ein anderes Programm direkt in die Datenbank schreibt.
+def _v6_datenversion(conn):
+    conn.execute('''
+        CREATE TABLE tbl_datenversion (
+            zaehler_id INTEGER NOT NULL,
+            tabelle TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            PRIMARY KEY (zaehler_id, tabelle)
+        ) WITHOUT ROWID
+    ''')
+    for tabelle in VERSIONIERTE_TABELLEN:
+        name = tabelle.removeprefix('tbl_')
+        for ereignis, zeilen in (('INSERT', ('NEW',)), ('UPDATE', ('OLD', 'NEW')), ('DELETE', ('OLD',))):
+            erhoehen = ''.join(f'''
+                INSERT INTO tbl_datenversion (zaehler_id, tabelle, version) VALUES ({zeile}.zaehler_id, '{tabelle}', 1)
+                ON CONFLICT (zaehler_id, tabelle) DO UPDATE SET version = version + 1;''' for zeile in zeilen)
+            conn.execute(f'''
+                CREATE TRIGGER trg_{name}_{ereignis.lower()}_version AFTER {ereignis} ON {tabelle}
+                BEGIN{erhoehen}
+                END
+            ''')
+
+
+# Version 7: Monats- und Jahressummen je Zähler (siehe strom_rollup). Kosten
+# sind NULL, solange ein Monat nicht vollständig durch Tarife abgedeckt ist.
+# Aus den vorhandenen Daten gefüllt werden die Tabellen erst in Version 9, die
+# strom_rollup in seinem heutigen Stand erwartet.
+def _v7_monats_und_jahressummen(conn):
+    conn.execute('''
+        CREATE TABLE tbl_monat (
+            zaehler_id INTEGER NOT NULL REFERENCES tbl_zaehler (id),
+            monat TEXT NOT NULL CHECK (monat IS strftime('%Y-%m', monat || '-01')),
+            verbrauch_wh INTEGER NOT NULL,
+            einzahlungen INTEGER NOT NULL,
+            verbrauchskosten INTEGER,
+            grundpreis INTEGER,
+            PRIMARY KEY (zaehler_id, monat)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE tbl_jahr (
+            zaehler_id INTEGER NOT NULL REFERENCES tbl_zaehler (id),
+            jahr INTEGER NOT NULL,
+            monate INTEGER NOT NULL,
+            monate_mit_kosten INTEGER NOT NULL,
+            verbrauch_wh INTEGER NOT NULL,
+            einzahlungen INTEGER NOT NULL,
+            verbrauchskosten INTEGER NOT NULL,
+            grundpreis INTEGER NOT NULL,
+            PRIMARY KEY (zaehler_id, jahr)
+        ) WITHOUT ROWID
+    ''')
+
+
+# Version 8: Archivstichtag je Zähler (siehe strom_archiv). Ablesungen und
+# Einzahlungen vor dem Stichtag liegen im Archiv oder dienen als Stützstelle
+# für den Tagesverbrauch; Trigger weisen jede Änderung daran ab.
+def _v8_archiv(conn):
+    conn.execute('''
+        CREATE TABLE tbl_archiv (
+            zaehler_id INTEGER PRIMARY KEY REFERENCES tbl_zaehler (id),
+            stichtag TEXT NOT NULL CHECK (stichtag IS date(stichtag) AND substr(stichtag, 9) = '01')
+        )
+    ''')
+    for tabelle in ('tbl_zaehlerstand', 'tbl_einzahlungen'):
+        name = tabelle.removeprefix('tbl_')
+        for ereignis, zeilen in (('INSERT', ('NEW',)), ('UPDATE', ('OLD', 'NEW')), ('DELETE', ('OLD',))):
+            bedingung = ' OR '.join(
+                f"{zeile}.datum < (SELECT stichtag FROM tbl_archiv WHERE zaehler_id = {zeile}.zaehler_id)"
+                for zeile in zeilen)
+            conn.execute(f'''
+                CREATE TRIGGER trg_{name}_{ereignis.lower()}_archiv BEFORE {ereignis} ON {tabelle}
+                WHEN {bedingung}
+                BEGIN
+                    SELECT RAISE(ABORT, 'Der Zeitraum ist archiviert und kann nicht mehr geändert werden.');
+                END
+            ''')
+
+
+# Version 9: ungerundeter Verbrauch (kWh) in den Monats- und Jahressummen, damit
+# strom_rollup.summe über mehrere Monate je Tarifabschnitt statt je Monat rundet.
+# Die Summen werden neu aufgebaut; archivierte Einzahlungen bleiben erhalten.
+def _v9_ungerundeter_verbrauch(conn):
+    for tabelle in ('tbl_monat', 'tbl_jahr'):
+        conn.execute(f'ALTER TABLE {tabelle} ADD COLUMN verbrauch REAL NOT NULL DEFAULT 0')
+    strom_rollup.neu_aufbauen(conn, strom_archiv.stichtage_lesen(conn))
+
+
+# Alle Migrationen in aufsteigender Reihenfolge: (Version, Beschreibung, Funktion)
+MIGRATIONEN = [
+    (1, "Grundtabellen", _v1_grundtabellen),
+    (2, "Primärschlüssel, Typen, CHECK-Constraints und Datumsindizes", _v2_schluessel_und_indizes),
+    (3, "Tagesverbrauch tbl_verbrauch_tag", _v3_verbrauch_tag),
+    (4, "Kunden und Zähler mit Indizes je (Zähler, Datum)", _v4_zaehler_und_kunden),
+    (5, "Beträge in Cent und skalierte Arbeitspreise", _v5_festkomma_betraege),
+    (6, "Änderungszähler tbl_datenversion mit Triggern", _v6_datenversion),
+    (7, "Monats- und Jahressummen tbl_monat und tbl_jahr", _v7_monats_und_jahressummen),
+    (8, "Archivstichtag tbl_archiv mit Schutz-Triggern", _v8_archiv),
+    (9, "Ungerundeter Verbrauch in tbl_monat und tbl_jahr", _v9_ungerundeter_verbrauch),
+]
+
+AKTUELLE_VERSION = MIGRATIONEN[-1][0]
+
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+# Datenbank auf die aktuelle Version bringen; liefert die Liste der ausgeführten Versionen
+def migrieren(conn, ziel_version=AKTUELLE_VERSION):
+    version = get_version(conn)
+    if version > AKTUELLE_VERSION:
+        raise MigrationsFehler(
+            f"Die Datenbank hat Version {version}, unterstützt wird höchstens Version {AKTUELLE_VERSION}.")
+
+    ausgefuehrt = []
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # Transaktionen selbst steuern, damit DDL mit zurückgerollt wird
+    try:
+        for ziel, beschreibung, migration in MIGRATIONEN:
+            if ziel <= version or ziel > ziel_version:
+                continue
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Erneut prüfen, falls ein anderer Prozess inzwischen migriert hat
+                if get_version(conn) >= ziel:
+                    conn.execute('COMMIT')
+                    continue
+                migration(conn)
+                conn.execute(f'PRAGMA user_version = {ziel:d}')
+                conn.execute('COMMIT')
+            except sqlite3.Error as e:
+                conn.execute('ROLLBACK')
+                raise MigrationsFehler(f"Migration auf Version {ziel} ({beschreibung}) fehlgeschlagen: {e}") from e
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            ausgefuehrt.append(ziel)
+    finally:
+        conn.isolation_level = isolation_level
+    return ausgefuehrt
+
+
+# Korrigierte und entfernte Zeilen der Migrationen versionen, zusammengefasst:
+# [(version, tabelle, aktion, grund, anzahl), ...]
+def bereinigungen(conn, versionen):
+    if not versionen or conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tbl_bereinigung'").fetchone() is None:
+        return []
+    return conn.execute(f'''
+        SELECT version, tabelle, aktion, grund, COUNT(*) FROM tbl_bereinigung
+        WHERE version IN ({', '.join('?' * len(versionen))})
+        GROUP BY version, tabelle, aktion, grund ORDER BY version, tabelle
+    ''', versionen).fetchall()
+
+
+# Aufruf: python3 strom_migration.py [pfad/zur/datenbank.db]
+def main(argv=None):
+    import strom_repository
+
+    argv = sys.argv[1:] if argv is None else argv
+    db_path = argv[0] if argv else strom_repository.DB_PATH
+    if not os.path.exists(db_path):
+        print(f"Die Datenbank '{db_path}' wurde nicht gefunden.", file=sys.stderr)
+        return 1
+
+    try:
+        conn = strom_repository.verbinden(db_path)
+    except strom_repository.DatenbankFehler as e:
+        print(e, file=sys.stderr)
+        return 1
+    try:
+        vorher = get_version(conn)
+        ausgefuehrt = migrieren(conn)
+        bereinigt = bereinigungen(conn, ausgefuehrt)
+    except MigrationsFehler as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+
+    if ausgefuehrt:
+        print(f"Datenbank '{db_path}' von Version {vorher} auf Version {ausgefuehrt[-1]} migriert.")
+        for version, tabelle, aktion, grund, anzahl in bereinigt:
+            print(f"  Version {version}: {anzahl} Zeile(n) in {tabelle} {aktion} ({grund})")
+    else:
+        print(f"Datenbank '{db_path}' ist aktuell (Version {vorher}).")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,724 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import date, datetime
+from urllib.request import pathname2url
+
+import strom_archiv
+import strom_messung
+import strom_migration
+import strom_rollup
+import strom_verbrauch
+
+# Gemeinsame Datenzugriffsschicht für alle Strom-Programme (GUI und headless).
+# Die Verbindungen zu meine_datenbank.db werden in einem kleinen Pool gehalten
+# und wiederverwendet, statt für jeden Aufruf neu geöffnet zu werden.
+# Beträge werden als ganze Zahlen übergeben und geliefert (siehe strom_betrag):
+# Einzahlungen und Grundpreise in Cent, Arbeitspreise skaliert.
+# Die Datenbank läuft im WAL-Modus: Leser arbeiten parallel über den Pool und
+# blockieren den Schreiber nicht. Alle Änderungen eines Prozesses gehen über
+# einen einzigen Schreib-Thread (Schreiber), der gleichzeitig eintreffende
+# Änderungen in einer Transaktion bündelt.
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Datenbankname und Pfad als Konstanten
+DB_NAME = 'meine_datenbank.db'
+DB_PATH = os.path.join(script_dir, DB_NAME)
+
+# Standardgröße des Verbindungspools
+POOL_GROESSE = 4
+
+# Zähler, dem Daten ohne Angabe eines Zählers zugeordnet werden (aus Migration 4)
+STANDARD_ZAEHLER = 1
+
+# Größte mögliche id (INTEGER PRIMARY KEY) als Schlüssel hinter der letzten Zeile
+MAX_ID = 2 ** 63 - 1
+
+# Millisekunden, die eine Verbindung auf die Sperre eines anderen Prozesses
+# wartet, bevor "database is locked" gemeldet wird
+BUSY_TIMEOUT = 10_000
+
+# Für jede Verbindung. synchronous=NORMAL ist im WAL-Modus sicher gegen
+# Programmabstürze; bei Stromausfall gehen höchstens die letzten Commits
+# verloren, die Datenbank bleibt aber konsistent. cache_size negativ = KiB.
+PRAGMAS = (
+    'PRAGMA foreign_keys = ON',
+    f'PRAGMA busy_timeout = {BUSY_TIMEOUT:d}',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -32000',
+    'PRAGMA mmap_size = 268435456',
+)
+
+# Höchstens so viele Schreibaufträge in einem Gruppen-Commit
+MAX_GRUPPE = 256
+
+
+class DatenbankFehler(Exception):
+    pass
+
+
+class DatenbankNichtGefunden(DatenbankFehler):
+    pass
+
+
+class SchemaFehler(DatenbankFehler):
+    pass
+
+
+# SQL-Anweisungen als Konstanten, damit sqlite3 sie pro Verbindung nur einmal
+# vorbereitet und danach aus dem Statement-Cache wiederverwendet. Alle Abfragen
+# auf Ablesungen, Einzahlungen und Tarife beziehen sich auf einen Zähler und
+# nutzen die Indizes mit (zaehler_id, datum) vorn.
+SQL_ZAEHLERSTAENDE_ZWISCHEN = '''
+    SELECT id, datum, zaehlerstand FROM tbl_zaehlerstand
+    WHERE zaehler_id = ? AND datum BETWEEN ? AND ? ORDER BY datum
+'''
+# Zählerstände mit dem Datum als Tage seit 1970-01-01 für den Massenabruf in NumPy
+SQL_ZAEHLERSTAENDE_TAGE = '''
+    SELECT CAST(julianday(datum) - 2440587.5 AS INTEGER), zaehlerstand FROM tbl_zaehlerstand
+    WHERE zaehler_id = ? AND datum BETWEEN ? AND ? ORDER BY datum
+'''
+# Blätternde Abfragen: höchstens LIMIT Zeilen nach bzw. vor dem Schlüssel (datum, id).
+# Das Datum des Schlüssels ist zugleich die untere bzw. obere Grenze der Indexsuche.
+SQL_ZAEHLERSTAENDE_SEITE = '''
+    SELECT id, datum, zaehlerstand FROM tbl_zaehlerstand
+    WHERE zaehler_id = ? AND datum >= ? AND datum <= ? AND (datum > ? OR id > ?)
+    ORDER BY datum, id LIMIT ?
+'''
+SQL_ZAEHLERSTAENDE_SEITE_ZURUECK = '''
+    SELECT id, datum, zaehlerstand FROM tbl_zaehlerstand
+    WHERE zaehler_id = ? AND datum >= ? AND datum <= ? AND (datum < ? OR id < ?)
+    ORDER BY datum DESC, id DESC LIMIT ?
+'''
+SQL_ZAEHLERSTAND_EINFUEGEN = 'INSERT INTO tbl_zaehlerstand (zaehler_id, datum, zaehlerstand) VALUES (?, ?, ?)'
+SQL_ZAEHLERSTAND_LOESCHEN = 'DELETE FROM tbl_zaehlerstand WHERE id = ?'
+SQL_ZAEHLERSTAND_DATUM = 'SELECT zaehler_id, datum FROM tbl_zaehlerstand WHERE id = ?'
+
+# Verbrauch aus tbl_verbrauch_tag für die Tage von (inklusive) bis (exklusive)
+SQL_VERBRAUCH_SUMME = '''
+    SELECT SUM(verbrauch) FROM tbl_verbrauch_tag
+    WHERE zaehler_id = ? AND datum >= ? AND datum < ?
+'''
+SQL_VERBRAUCH_TAGE = '''
+    SELECT datum, verbrauch FROM tbl_verbrauch_tag
+    WHERE zaehler_id = ? AND datum >= ? AND datum < ? ORDER BY datum
+'''
+SQL_VERBRAUCH_TAGE_NUMPY = '''
+    SELECT CAST(julianday(datum) - 2440587.5 AS INTEGER), verbrauch FROM tbl_verbrauch_tag
+    WHERE zaehler_id = ? AND datum >= ? AND datum < ? ORDER BY datum
+'''
+# Verbrauch vieler Abschnitte [[zaehler_id, von, bis_exklusive], ...] (als JSON)
+# in einer Abfrage; jede Summe ist eine Bereichssuche im Primärschlüssel
+SQL_VERBRAUCH_ABSCHNITTE = '''
+    SELECT (SELECT SUM(v.verbrauch) FROM tbl_verbrauch_tag v
+            WHERE v.zaehler_id = json_extract(a.value, '$[0]')
+              AND v.datum >= json_extract(a.value, '$[1]')
+              AND v.datum < json_extract(a.value, '$[2]'))
+    FROM json_each(?) a ORDER BY a.key
+'''
+
+SQL_EINZAHLUNGEN_ZWISCHEN = '''
+    SELECT id, datum, einzahlungen FROM tbl_einzahlungen
+    WHERE zaehler_id = ? AND datum BETWEEN ? AND ? ORDER BY datum
+'''
+# Einzahlungen mit dem Datum als Tage seit 1970-01-01 (wie SQL_ZAEHLERSTAENDE_TAGE)
+SQL_EINZAHLUNGEN_TAGE = '''
+    SELECT CAST(julianday(datum) - 2440587.5 AS INTEGER), einzahlungen FROM tbl_einzahlungen
+    WHERE zaehler_id = ? AND datum BETWEEN ? AND ? ORDER BY datum
+'''
+SQL_EINZAHLUNGEN_SEITE = '''
+    SELECT id, datum, einzahlungen FROM tbl_einzahlungen
+    WHERE zaehler_id = ? AND datum >= ? AND datum <= ? AND (datum > ? OR id > ?)
+    ORDER BY datum, id LIMIT ?
+'''
+SQL_EINZAHLUNGEN_SEITE_ZURUECK = '''
+    SELECT id, datum, einzahlungen FROM tbl_einzahlungen
+    WHERE zaehler_id = ? AND datum >= ? AND datum <= ? AND (datum < ? OR id < ?)
+    ORDER BY datum DESC, id DESC LIMIT ?
+'''
+SQL_EINZAHLUNGEN_SUMME = '''
+    SELECT SUM(einzahlungen) FROM tbl_einzahlungen
+    WHERE zaehler_id = ? AND datum BETWEEN ? AND ?
+'''
+SQL_EINZAHLUNGEN_SUMME_JE_ZAEHLER = '''
+    SELECT z.id, (SELECT SUM(e.einzahlungen) FROM tbl_einzahlungen e
+                  WHERE e.zaehler_id = z.id AND e.datum BETWEEN ? AND ?)
+    FROM tbl_zaehler z ORDER BY z.id
+'''
+SQL_EINZAHLUNG_EINFUEGEN = 'INSERT INTO tbl_einzahlungen (zaehler_id, datum, einzahlungen) VALUES (?, ?, ?)'
+SQL_EINZAHLUNG_LOESCHEN = 'DELETE FROM tbl_einzahlungen WHERE id = ?'
+SQL_EINZAHLUNG_DATUM = 'SELECT zaehler_id, datum FROM tbl_einzahlungen WHERE id = ?'
+
+SQL_BERECHGRUNDL_ALLE = '''
+    SELECT datum_von, datum_bis, grundpreis, kwh_preis FROM tbl_berechgrundl
+    WHERE zaehler_id = ? ORDER BY datum_von
+'''
+SQL_BERECHGRUNDL_ALLE_ZAEHLER = '''
+    SELECT zaehler_id, datum_von, datum_bis, grundpreis, kwh_preis FROM tbl_berechgrundl
+    ORDER BY zaehler_id, datum_von
+'''
+SQL_BERECHGRUNDL_AM = '''
+    SELECT kwh_preis, grundpreis FROM tbl_berechgrundl
+    WHERE zaehler_id = ? AND datum_von <= ? AND datum_bis >= ?
+    LIMIT 1
+'''
+SQL_BERECHGRUNDL_EINFUEGEN = '''
+    INSERT INTO tbl_berechgrundl (zaehler_id, datum_von, datum_bis, grundpreis, kwh_preis)
+    VALUES (?, ?, ?, ?, ?)
+'''
+SQL_BERECHGRUNDL_LOESCHEN = '''
+    DELETE FROM tbl_berechgrundl WHERE zaehler_id = ? AND datum_von = ? AND datum_bis = ?
+'''
+
+# Monats- und Jahressummen (siehe strom_rollup)
+SQL_ROLLUP_MONATE = '''
+    SELECT monat, verbrauch_wh, einzahlungen, verbrauchskosten, grundpreis, verbrauch FROM tbl_monat
+    WHERE zaehler_id = ? AND monat BETWEEN ? AND ? ORDER BY monat
+'''
+SQL_ROLLUP_JAHRE = '''
+    SELECT jahr, monate, monate_mit_kosten, verbrauch_wh, einzahlungen, verbrauchskosten, grundpreis, verbrauch
+    FROM tbl_jahr WHERE zaehler_id = ? AND jahr BETWEEN ? AND ? ORDER BY jahr
+'''
+
+# Änderungszähler eines Zählers je Tabelle (von Triggern gepflegt, siehe Migration 6)
+SQL_DATENVERSIONEN = 'SELECT tabelle, version FROM tbl_datenversion WHERE zaehler_id = ? ORDER BY tabelle'
+
+SQL_KUNDE_EINFUEGEN = 'INSERT INTO tbl_kunde (name) VALUES (?)'
+SQL_KUNDEN_ALLE = 'SELECT id, name FROM tbl_kunde ORDER BY id'
+SQL_ZAEHLER_EINFUEGEN = 'INSERT INTO tbl_zaehler (kunde_id, bezeichnung) VALUES (?, ?)'
+SQL_ZAEHLER_ALLE = 'SELECT id, kunde_id, bezeichnung FROM tbl_zaehler ORDER BY id'
+
+
+# Datumswerte einheitlich als ISO-Text (YYYY-MM-DD) an SQLite übergeben;
+# ungültige Daten lösen wie bei der Eingabeprüfung einen ValueError aus
+def datum_text(datum):
+    if isinstance(datum, datetime):
+        return datum.date().isoformat()
+    if isinstance(datum, date):
+        return datum.isoformat()
+    try:
+        return date.fromisoformat(datum).isoformat()
+    except (TypeError, ValueError):
+        return datetime.strptime(str(datum), "%Y-%m-%d").date().isoformat()
+
+
+# Monats- und Jahressummen für den geänderten Zeitraum vormerken; nachgeführt
+# werden sie vom Schreiber einmal je Gruppe vor deren Commit
+def _rollup_vormerken(conn, zaehler_id, von_datum, bis_datum=None):
+    strom_rollup.vormerken(conn, zaehler_id, von_datum, bis_datum)
+
+
+# Verbindung mit den PRAGMAS öffnen; mit nur_lesen per URI mit mode=ro
+def verbinden(db_path=DB_PATH, nur_lesen=False):
+    # Bei eingeschalteter Messung läuft jede Anweisung dieser Verbindung über strom_messung
+    factory = strom_messung.MessVerbindung if strom_messung.aktiv() else sqlite3.Connection
+    try:
+        if nur_lesen:
+            uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=64, factory=factory)
+        else:
+            conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=64, factory=factory)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    except sqlite3.Error as e:
+        raise DatenbankFehler(f"Fehler beim Verbinden mit der Datenbank: {e}") from e
+
+
+# Thread-sicherer Pool wiederverwendbarer SQLite-Verbindungen; mit nur_lesen
+# werden die Verbindungen per URI mit mode=ro geöffnet und jeder Schreibversuch
+# scheitert in SQLite selbst
+class ConnectionPool:
+    def __init__(self, db_path=DB_PATH, groesse=POOL_GROESSE, nur_lesen=False):
+        if not os.path.exists(db_path):
+            raise DatenbankNichtGefunden(f"Die Datenbank '{db_path}' wurde nicht gefunden.")
+        self.db_path = db_path
+        self.groesse = groesse
+        self.nur_lesen = nur_lesen
+        self._frei = queue.LifoQueue()
+        self._alle = []
+        self._lock = threading.Lock()
+        self._geschlossen = False
+
+    def _verbinden(self):
+        return verbinden(self.db_path, self.nur_lesen)
+
+    # Freie Verbindung holen oder, solange der Pool nicht voll ist, eine neue öffnen
+    def holen(self, timeout=None):
+        if self._geschlossen:
+            raise DatenbankFehler("Der Verbindungspool ist geschlossen.")
+        try:
+            return self._frei.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._alle) < self.groesse:
+                conn = self._verbinden()
+                self._alle.append(conn)
+                return conn
+        try:
+            return self._frei.get(timeout=timeout)
+        except queue.Empty:
+            raise DatenbankFehler("Keine freie Datenbankverbindung verfügbar.") from None
+
+    def zurueckgeben(self, conn):
+        # Offene Transaktionen nie an den nächsten Benutzer weiterreichen
+        if conn.in_transaction:
+            conn.rollback()
+        self._frei.put(conn)
+
+    @contextmanager
+    def verbindung(self, timeout=None):
+        conn = self.holen(timeout)
+        try:
+            yield conn
+        finally:
+            self.zurueckgeben(conn)
+
+    def schliessen(self):
+        with self._lock:
+            self._geschlossen = True
+            for conn in self._alle:
+                conn.close()
+            self._alle.clear()
+        while not self._frei.empty():
+            self._frei.get_nowait()
+
+
+# Einziger Schreiber eines Repositorys: Aufträge funktion(conn, *args) laufen
+# über eine Warteschlange in einem eigenen Thread mit eigener Verbindung. Was
+# sich während eines Commits angesammelt hat, wird danach zusammen in einer
+# Transaktion geschrieben (Gruppen-Commit), sodass viele kleine Änderungen aus
+# verschiedenen Threads nicht je einen eigenen Commit kosten. Jeder Auftrag
+# läuft in einem SAVEPOINT: schlägt er fehl, werden nur seine Änderungen
+# zurückgenommen. Die Monats- und Jahressummen (strom_rollup) rechnet der
+# Schreiber erst vor dem Commit und je Zähler nur einmal für die ganze Gruppe.
+# Ergebnis bzw. Ausnahme erhält der Aufrufer erst nach dem Commit.
+class Schreiber:
+    def __init__(self, db_path=DB_PATH, max_gruppe=MAX_GRUPPE):
+        self.max_gruppe = max_gruppe
+        self._conn = verbinden(db_path)
+        self._conn.isolation_level = None  # BEGIN/COMMIT selbst steuern
+        strom_rollup.offen_anlegen(self._conn)
+        self._auftraege = queue.Queue()
+        self._lock = threading.Lock()
+        self._geschlossen = False
+        self._thread = threading.Thread(target=self._laufen, name='strom_schreiber', daemon=True)
+        self._thread.start()
+
+    # Auftrag einreihen und auf sein Ergebnis warten
+    def ausfuehren(self, funktion, *args):
+        future = Future()
+        with self._lock:
+            if self._geschlossen:
+                raise DatenbankFehler("Der Schreiber ist geschlossen.")
+            self._auftraege.put((future, funktion, args))
+        return future.result()
+
+    def _laufen(self):
+        while True:
+            auftrag = self._auftraege.get()
+            if auftrag is None:
+                break
+            gruppe = [auftrag]
+            while len(gruppe) < self.max_gruppe:
+                try:
+                    auftrag = self._auftraege.get_nowait()
+                except queue.Empty:
+                    break
+                if auftrag is None:
+                    break
+                gruppe.append(auftrag)
+            self._gruppe_schreiben(gruppe)
+            if auftrag is None:
+                break
+        self._conn.close()
+
+    def _gruppe_schreiben(self, gruppe):
+        conn = self._conn
+        ergebnisse = []
+        start = time.perf_counter()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for future, funktion, args in gruppe:
+                conn.execute('SAVEPOINT auftrag')
+                try:
+                    ergebnis = funktion(conn, *args)
+                except Exception as e:
+                    conn.execute('ROLLBACK TO auftrag')
+                    conn.execute('RELEASE auftrag')
+                    ergebnisse.append((future, None, e))
+                else:
+                    conn.execute('RELEASE auftrag')
+                    ergebnisse.append((future, ergebnis, None))
+            try:
+                strom_rollup.nachfuehren(conn)
+            except Exception as e:
+                conn.execute('ROLLBACK')
+                if len(gruppe) == 1:
+                    gruppe[0][0].set_exception(e)
+                    return
+                # Welcher Auftrag die Summen scheitern lässt, ist hier nicht zu
+                # erkennen: jeden in einer eigenen Transaktion wiederholen
+                for auftrag in gruppe:
+                    self._gruppe_schreiben([auftrag])
+                return
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            # BEGIN oder COMMIT fehlgeschlagen (z. B. Sperre eines anderen Prozesses):
+            # die ganze Gruppe ist nicht geschrieben
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            for future, _, _ in gruppe:
+                future.set_exception(e)
+            return
+        if strom_messung.aktiv():
+            # Als "Zeilen" zählen hier die Aufträge der Gruppe
+            strom_messung.erfassen('aufruf', 'schreiber.gruppe', time.perf_counter() - start, len(gruppe))
+        for future, ergebnis, fehler in ergebnisse:
+            if fehler is None:
+                future.set_result(ergebnis)
+            else:
+                future.set_exception(fehler)
+
+    # Bereits eingereihte Aufträge noch schreiben, dann den Thread beenden
+    def schliessen(self):
+        with self._lock:
+            if self._geschlossen:
+                return
+            self._geschlossen = True
+            self._auftraege.put(None)
+        self._thread.join()
+
+
+# Zugriff auf tbl_zaehlerstand, tbl_einzahlungen und tbl_berechgrundl. Ein
+# Repository mit nur_lesen migriert nicht, sondern erwartet das aktuelle Schema.
+class StromRepository:
+    def __init__(self, db_path=DB_PATH, pool_groesse=POOL_GROESSE, nur_lesen=False):
+        self.db_path = db_path
+        self.pool = ConnectionPool(db_path, pool_groesse, nur_lesen)
+        self.archiv = strom_archiv.Archiv(strom_archiv.verzeichnis_fuer(db_path))
+        self.schreiber = None
+        if nur_lesen:
+            self.schema_pruefen()
+        else:
+            self.wal_aktivieren()
+            self.tabellen_erstellen()
+            self.schreiber = Schreiber(db_path)
+
+    # Lesende Abfrage mit allen Ergebniszeilen
+    def _abfragen(self, sql, parameter=()) -> list:
+        with self.pool.verbindung() as conn:
+            return conn.execute(sql, parameter).fetchall()
+
+    # Lesende Abfrage mit genau einer Ergebniszeile
+    def _abfragen_eins(self, sql, parameter=()):
+        with self.pool.verbindung() as conn:
+            return conn.execute(sql, parameter).fetchone()
+
+    # Mehrere Abfragen auf demselben Stand der Datenbank, z. B. Stichtag des
+    # Archivs und Zeilen der Tabelle, auch wenn der Schreiber dazwischen committet
+    @contextmanager
+    def lesetransaktion(self):
+        with self.pool.verbindung() as conn:
+            conn.execute('BEGIN')
+            try:
+                yield conn
+            finally:
+                conn.execute('COMMIT')
+
+    # funktion(conn, *args) über den Schreiber in einer Transaktion ausführen;
+    # liefert ihr Ergebnis. funktion darf selbst weder committen noch zurückrollen.
+    def schreiben(self, funktion, *args):
+        if self.schreiber is None:
+            raise DatenbankFehler("Die Datenbank ist nur lesend geöffnet.")
+        return self.schreiber.ausfuehren(funktion, *args)
+
+    # Eine Seite (id, datum, wert) eines Zählers aufsteigend nach (datum, id). Ohne
+    # Schlüssel beginnt die Seite am Anfang bzw. (rückwärts) am Ende des Zeitraums;
+    # mit Schlüssel (datum, id) direkt danach bzw. davor, sodass jede Seite über den
+    # Index gesucht wird statt die vorherigen Zeilen zu überspringen. Archivierte
+    # Zeilen (art wie in strom_archiv) liegen alle vor denen der Tabelle.
+    def _seite(self, sql, sql_zurueck, art, zaehler_id, von_datum, bis_datum, schluessel, anzahl,
+               rueckwaerts) -> list:
+        von_datum, bis_datum = datum_text(von_datum), datum_text(bis_datum)
+        if rueckwaerts:
+            if schluessel is None or schluessel[0] > bis_datum:
+                schluessel = (bis_datum, MAX_ID)
+        elif schluessel is None or schluessel[0] < von_datum:
+            schluessel = (von_datum, 0)
+        datum, rowid = schluessel
+
+        with self.lesetransaktion() as conn:
+            stichtag = strom_archiv.stichtag_lesen(conn, zaehler_id)
+            if rueckwaerts:
+                zeilen = conn.execute(sql_zurueck, (zaehler_id, von_datum, datum, datum, rowid, anzahl)).fetchall()
+                zeilen.reverse()
+                if stichtag is not None and von_datum < stichtag and len(zeilen) < anzahl:
+                    zeilen = self.archiv.seite(art, zaehler_id, stichtag, von_datum, bis_datum, schluessel,
+                                               anzahl - len(zeilen), True) + zeilen
+                return zeilen
+            zeilen = []
+            if stichtag is not None and datum < stichtag:
+                zeilen = self.archiv.seite(art, zaehler_id, stichtag, von_datum, bis_datum, schluessel, anzahl, False)
+            if len(zeilen) < anzahl:
+                zeilen += conn.execute(sql, (zaehler_id, datum, bis_datum, datum, rowid,
+                                             anzahl - len(zeilen))).fetchall()
+            return zeilen
+
+    # Write-Ahead-Logging einschalten (bleibt in der Datenbankdatei gespeichert)
+    def wal_aktivieren(self) -> str:
+        return self._abfragen_eins('PRAGMA journal_mode=WAL')[0]
+
+    # Schema auf die aktuelle Version migrieren
+    def tabellen_erstellen(self) -> None:
+        with self.pool.verbindung() as conn:
+            try:
+                strom_migration.migrieren(conn)
+            except strom_migration.MigrationsFehler as e:
+                raise SchemaFehler(str(e)) from e
+
+    def schema_pruefen(self) -> None:
+        with self.pool.verbindung() as conn:
+            version = strom_migration.get_version(conn)
+        if version != strom_migration.AKTUELLE_VERSION:
+            raise SchemaFehler(f"Die Datenbank hat Version {version}, erwartet wird Version "
+                               f"{strom_migration.AKTUELLE_VERSION}.")
+
+    # --- tbl_kunde, tbl_zaehler ---
+
+    def kunden_daten(self) -> list:
+        return self._abfragen(SQL_KUNDEN_ALLE)
+
+    # Neuen Kunden anlegen; liefert seine id
+    def insert_kunde(self, name: str) -> int:
+        return self.schreiben(lambda conn: conn.execute(SQL_KUNDE_EINFUEGEN, (name,)).lastrowid)
+
+    # (id, kunde_id, bezeichnung) aller Zähler
+    def zaehler_daten(self) -> list:
+        return self._abfragen(SQL_ZAEHLER_ALLE)
+
+    # Neuen Zähler für einen Kunden anlegen; liefert seine id
+    def insert_zaehler(self, kunde_id: int, bezeichnung: str) -> int:
+        return self.schreiben(lambda conn: conn.execute(SQL_ZAEHLER_EINFUEGEN, (kunde_id, bezeichnung)).lastrowid)
+
+    # ((tabelle, version), ...) eines Zählers; ändert sich bei jeder Änderung seiner
+    # Zählerstände, Einzahlungen oder Berechnungsgrundlagen, egal durch wen
+    def datenversionen(self, zaehler_id=STANDARD_ZAEHLER) -> tuple:
+        return tuple(self._abfragen(SQL_DATENVERSIONEN, (zaehler_id,)))
+
+    # --- tbl_zaehlerstand ---
+
+    # Zeilen der Tabelle, davor die archivierten Zeilen des Zeitraums (art wie in strom_archiv)
+    def _zwischen(self, sql, art, von_datum, bis_datum, zaehler_id) -> list:
+        von_datum, bis_datum = datum_text(von_datum), datum_text(bis_datum)
+        with self.lesetransaktion() as conn:
+            stichtag = strom_archiv.stichtag_lesen(conn, zaehler_id)
+            zeilen = conn.execute(sql, (zaehler_id, von_datum, bis_datum)).fetchall()
+        if stichtag is None or von_datum >= stichtag:
+            return zeilen
+        ids, tage, werte = getattr(self.archiv, art)(zaehler_id, stichtag, von_datum, bis_datum)
+        return strom_archiv.zeilen(ids, tage, werte) + zeilen
+
+    def zaehlerstaende_zwischen_daten(self, von_datum, bis_datum, zaehler_id=STANDARD_ZAEHLER) -> list:
+        return self._zwischen(SQL_ZAEHLERSTAENDE_ZWISCHEN, 'zaehlerstaende', von_datum, bis_datum, zaehler_id)
+
+    # Tagesverbrauch [von_datum, bis_datum) aus tbl_verbrauch_tag
+    def verbrauch_zwischen(self, von_datum, bis_datum, zaehler_id=STANDARD_ZAEHLER) -> float:
+        return self._abfragen_eins(SQL_VERBRAUCH_SUMME,
+                                   (zaehler_id, datum_text(von_datum), datum_text(bis_datum)))[0] or 0
+
+    # (datum, verbrauch) je Tag für [von_datum, bis_datum)
+    def verbrauch_tage(self, von_datum, bis_datum, zaehler_id=STANDARD_ZAEHLER) -> list:
+        return self._abfragen(SQL_VERBRAUCH_TAGE, (zaehler_id, datum_text(von_datum), datum_text(bis_datum)))
+
+    # Verbrauch je Abschnitt [(zaehler_id, von, bis_exklusive), ...] über beliebig
+    # viele Zähler in einer Abfrage; Ergebnis in der Reihenfolge der Abschnitte
+    def verbrauch_abschnitte(self, abschnitte) -> list:
+        parameter = json.dumps([(zaehler_id, datum_text(von), datum_text(bis)) for zaehler_id, von, bis in abschnitte])
+        return [summe or 0 for summe, in self._abfragen(SQL_VERBRAUCH_ABSCHNITTE, (parameter,))]
+
+    def zaehlerstaende_seite(self, von_datum, bis_datum, schluessel=None, anzahl=200, rueckwaerts=False,
+                             zaehler_id=STANDARD_ZAEHLER) -> list:
+        return self._seite(SQL_ZAEHLERSTAENDE_SEITE, SQL_ZAEHLERSTAENDE_SEITE_ZURUECK, 'zaehlerstaende',
+                           zaehler_id, von_datum, bis_datum, schluessel, anzahl, rueckwaerts)
+
+    # Ablesungen ändern immer auch den Tagesverbrauch zwischen den Nachbar-Ablesungen
+    def insert_zaehlerstand(self, datum, zaehlerstand: float, zaehler_id=STANDARD_ZAEHLER) -> None:
+        self.insert_zaehlerstaende([(datum_text(datum), zaehlerstand)], zaehler_id)
+
+    # Bereits geprüfte Zeilen (datum, zaehlerstand) eines Zählers in einer Transaktion einfügen
+    def insert_zaehlerstaende(self, zeilen, zaehler_id=STANDARD_ZAEHLER) -> int:
+        zeilen = [(zaehler_id, datum, stand) for datum, stand in zeilen]
+        if not zeilen:
+            return 0
+
+        def einfuegen(conn):
+            anzahl = conn.executemany(SQL_ZAEHLERSTAND_EINFUEGEN, zeilen).rowcount
+            spanne = strom_verbrauch.spanne_aktualisieren(conn, zaehler_id, min(z[1] for z in zeilen),
+                                                          max(z[1] for z in zeilen))
+            _rollup_vormerken(conn, zaehler_id, *spanne)
+            return anzahl
+
+        return self.schreiben(einfuegen)
+
+    def delete_zaehlerstand(self, rowid: int) -> bool:
+        def loeschen(conn):
+            zeile = conn.execute(SQL_ZAEHLERSTAND_DATUM, (rowid,)).fetchone()
+            if zeile is None:
+                return False
+            conn.execute(SQL_ZAEHLERSTAND_LOESCHEN, (rowid,))
+            spanne = strom_verbrauch.spanne_aktualisieren(conn, *zeile)
+            _rollup_vormerken(conn, zeile[0], *spanne)
+            return True
+
+        return self.schreiben(loeschen)
+
+    # --- tbl_einzahlungen ---
+
+    def einzahlungen_zwischen_daten(self, von_datum, bis_datum, zaehler_id=STANDARD_ZAEHLER) -> list:
+        return self._zwischen(SQL_EINZAHLUNGEN_ZWISCHEN, 'einzahlungen', von_datum, bis_datum, zaehler_id)
+
+    def einzahlungen_seite(self, von_datum, bis_datum, schluessel=None, anzahl=200, rueckwaerts=False,
+                           zaehler_id=STANDARD_ZAEHLER) -> list:
+        return self._seite(SQL_EINZAHLUNGEN_SEITE, SQL_EINZAHLUNGEN_SEITE_ZURUECK, 'einzahlungen',
+                           zaehler_id, von_datum, bis_datum, schluessel, anzahl, rueckwaerts)
+
+    def summe_einzahlungen(self, von_datum, bis_datum, zaehler_id=STANDARD_ZAEHLER) -> int:
+        von_datum, bis_datum = datum_text(von_datum), datum_text(bis_datum)
+        with self.lesetransaktion() as conn:
+            stichtag = strom_archiv.stichtag_lesen(conn, zaehler_id)
+            summe = conn.execute(SQL_EINZAHLUNGEN_SUMME, (zaehler_id, von_datum, bis_datum)).fetchone()[0] or 0
+        if stichtag is not None and von_datum < stichtag:
+            summe += self.archiv.summe_einzahlungen(zaehler_id, stichtag, von_datum, bis_datum)
+        return summe
+
+    # {zaehler_id: Summe der Einzahlungen} für alle Zähler in einer Abfrage (plus Archiv)
+    def summe_einzahlungen_je_zaehler(self, von_datum, bis_datum) -> dict:
+        von_datum, bis_datum = datum_text(von_datum), datum_text(bis_datum)
+        with self.lesetransaktion() as conn:
+            stichtage = strom_archiv.stichtage_lesen(conn)
+            zeilen = conn.execute(SQL_EINZAHLUNGEN_SUMME_JE_ZAEHLER, (von_datum, bis_datum)).fetchall()
+        summen = {zaehler_id: summe or 0 for zaehler_id, summe in zeilen}
+        for zaehler_id, stichtag in stichtage.items():
+            if von_datum < stichtag and zaehler_id in summen:
+                summen[zaehler_id] += self.archiv.summe_einzahlungen(zaehler_id, stichtag, von_datum, bis_datum)
+        return summen
+
+    def insert_einzahlung(self, datum, betrag_cent: int, zaehler_id=STANDARD_ZAEHLER) -> None:
+        self.insert_einzahlungen([(datum_text(datum), betrag_cent)], zaehler_id)
+
+    # Bereits geprüfte Zeilen (datum, betrag_cent) eines Zählers in einer Transaktion
+    # einfügen; die Monatssummen der betroffenen Monate werden mit aktualisiert
+    def insert_einzahlungen(self, zeilen, zaehler_id=STANDARD_ZAEHLER) -> int:
+        zeilen = [(zaehler_id, datum, betrag) for datum, betrag in zeilen]
+        if not zeilen:
+            return 0
+
+        def einfuegen(conn):
+            anzahl = conn.executemany(SQL_EINZAHLUNG_EINFUEGEN, zeilen).rowcount
+            _rollup_vormerken(conn, zaehler_id, min(z[1] for z in zeilen), max(z[1] for z in zeilen))
+            return anzahl
+
+        return self.schreiben(einfuegen)
+
+    def delete_einzahlung(self, rowid: int) -> bool:
+        def loeschen(conn):
+            zeile = conn.execute(SQL_EINZAHLUNG_DATUM, (rowid,)).fetchone()
+            if zeile is None:
+                return False
+            conn.execute(SQL_EINZAHLUNG_LOESCHEN, (rowid,))
+            _rollup_vormerken(conn, *zeile)
+            return True
+
+        return self.schreiben(loeschen)
+
+    # --- tbl_berechgrundl ---
+
+    def berechgrundl_daten(self, zaehler_id=STANDARD_ZAEHLER) -> list:
+        return self._abfragen(SQL_BERECHGRUNDL_ALLE, (zaehler_id,))
+
+    # (zaehler_id, datum_von, datum_bis, grundpreis, kwh_preis) aller Zähler, nach Zähler sortiert
+    def berechgrundl_alle_zaehler(self) -> list:
+        return self._abfragen(SQL_BERECHGRUNDL_ALLE_ZAEHLER)
+
+    # Liefert (kwh_preis, grundpreis) für das Datum oder None
+    def berechgrundl_am(self, datum, zaehler_id=STANDARD_ZAEHLER):
+        d = datum_text(datum)
+        return self._abfragen_eins(SQL_BERECHGRUNDL_AM, (zaehler_id, d, d))
+
+    # grundpreis_cent je Monat, kwh_preis in strom_betrag.PREIS_SKALA-tel Cent je kWh
+    def insert_berechgrundl(self, datum_von, datum_bis, grundpreis_cent: int, kwh_preis: int,
+                            zaehler_id=STANDARD_ZAEHLER) -> None:
+        self.insert_berechgrundl_zeilen([(datum_text(datum_von), datum_text(datum_bis), grundpreis_cent, kwh_preis)],
+                                        zaehler_id)
+
+    # Bereits geprüfte Zeilen (datum_von, datum_bis, grundpreis_cent, kwh_preis) eines Zählers
+    # in einer Transaktion einfügen. Ein Tarif ändert die Kosten aller Monate in seinem
+    # Zeitraum; neu berechnet werden davon nur die Monate mit Daten.
+    def insert_berechgrundl_zeilen(self, zeilen, zaehler_id=STANDARD_ZAEHLER) -> int:
+        zeilen = [(zaehler_id,) + tuple(zeile) for zeile in zeilen]
+        if not zeilen:
+            return 0
+
+        def einfuegen(conn):
+            anzahl = conn.executemany(SQL_BERECHGRUNDL_EINFUEGEN, zeilen).rowcount
+            _rollup_vormerken(conn, zaehler_id, min(z[1] for z in zeilen), max(z[2] for z in zeilen))
+            return anzahl
+
+        return self.schreiben(einfuegen)
+
+    def delete_berechgrundl(self, datum_von, datum_bis, zaehler_id=STANDARD_ZAEHLER) -> bool:
+        datum_von, datum_bis = datum_text(datum_von), datum_text(datum_bis)
+
+        def loeschen(conn):
+            if conn.execute(SQL_BERECHGRUNDL_LOESCHEN, (zaehler_id, datum_von, datum_bis)).rowcount == 0:
+                return False
+            _rollup_vormerken(conn, zaehler_id, datum_von, datum_bis)
+            return True
+
+        return self.schreiben(loeschen)
+
+    # --- tbl_monat, tbl_jahr ---
+
+    # (monat, verbrauch_wh, einzahlungen, verbrauchskosten, grundpreis, verbrauch in kWh)
+    # der Monate 'YYYY-MM' von_monat bis bis_monat, die Daten haben
+    def rollup_monate(self, von_monat, bis_monat, zaehler_id=STANDARD_ZAEHLER) -> list:
+        return self._abfragen(SQL_ROLLUP_MONATE, (zaehler_id, von_monat, bis_monat))
+
+    # (jahr, monate, monate_mit_kosten, verbrauch_wh, einzahlungen, verbrauchskosten, grundpreis, verbrauch)
+    def rollup_jahre(self, von_jahr, bis_jahr, zaehler_id=STANDARD_ZAEHLER) -> list:
+        return self._abfragen(SQL_ROLLUP_JAHRE, (zaehler_id, von_jahr, bis_jahr))
+
+    def schliessen(self) -> None:
+        if self.schreiber is not None:
+            self.schreiber.schliessen()
+        self.pool.schliessen()
+
+
+# Ein gemeinsames Repository pro Datenbankdatei für alle Aufrufer im Prozess
+_repositories = {}
+_repositories_lock = threading.Lock()
+
+
+def get_repository(db_path=DB_PATH) -> StromRepository:
+    db_path = os.path.abspath(db_path)
+    with _repositories_lock:
+        repo = _repositories.get(db_path)
+        if repo is None:
+            repo = StromRepository(db_path)
+            _repositories[db_path] = repo
+        return repo
+
+
+# Datenbankdatei anlegen (falls nötig); das Repository migriert das Schema beim Öffnen
+def datenbank_erstellen(db_path=DB_PATH) -> StromRepository:
+    if not os.path.exists(db_path):
+        sqlite3.connect(db_path).close()
+    return get_repository(db_path)
@@ -0,0 +1,458 @@
+import argparse
+import sys
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Optional
+
+import strom_archiv
+import strom_betrag
+import strom_kalender
+import strom_messung
+
+# Monats- und Jahressummen je Zähler (tbl_monat, tbl_jahr) für Übersichten und
+# Berichte, damit nicht jeder Monat über die Rohdaten neu abgerechnet werden muss.
+# Ein Monat hat eine Zeile, sobald er Tagesverbrauch oder Einzahlungen hat.
+# Verbrauch, Einzahlungen und Kosten einer Zeile sind genau die Werte, die
+# strom_abrechnung für diesen Kalendermonat liefert; ist der Monat nicht
+# lückenlos durch Tarife abgedeckt, bleiben die Kosten NULL. Zusätzlich steht
+# der ungerundete Verbrauch in kWh (Summe aus tbl_verbrauch_tag) in der Zeile.
+# Eine Jahreszeile fasst die Monatszeilen ihres Jahres zusammen und zählt, wie
+# viele davon Kosten haben.
+#
+# Gepflegt wird in der Transaktion der Änderung (über den Schreiber des
+# Repositorys): jeder Auftrag merkt seinen geänderten Zeitraum nur vor, und vor
+# dem Commit einer Gruppe rechnet nachfuehren() je Zähler einmal die Monate der
+# zusammengefassten Zeiträume und deren Jahre neu. Summen über ganze Monate rechnet summe() wie die Engine
+# je Tarifabschnitt ab, nur dass der ungerundete Verbrauch eines Abschnitts aus
+# den vollen Jahren und höchstens 22 Randmonaten zusammengesetzt wird. Gerundet
+# wird also je Abschnitt und nicht je Monat; das Ergebnis ist centgenau das von
+# strom_abrechnung.berechnen für denselben Zeitraum.
+
+SQL_VERBRAUCH_JE_MONAT = '''
+    SELECT substr(datum, 1, 7), SUM(verbrauch) FROM tbl_verbrauch_tag
+    WHERE zaehler_id = ? AND datum >= ? AND datum <= ? GROUP BY 1
+'''
+SQL_EINZAHLUNGEN_JE_MONAT = '''
+    SELECT substr(datum, 1, 7), SUM(einzahlungen) FROM tbl_einzahlungen
+    WHERE zaehler_id = ? AND datum >= ? AND datum <= ? GROUP BY 1
+'''
+# Einzahlungen archivierter Monate (vor dem Monat des Stichtags) aus den bisherigen Zeilen
+SQL_EINZAHLUNGEN_ARCHIVIERT = '''
+    SELECT monat, einzahlungen FROM tbl_monat
+    WHERE zaehler_id = ? AND monat BETWEEN ? AND ? AND monat < ? AND einzahlungen != 0
+'''
+SQL_MONATE_LOESCHEN = 'DELETE FROM tbl_monat WHERE zaehler_id = ? AND monat BETWEEN ? AND ?'
+SQL_MONATE_AB_LOESCHEN = 'DELETE FROM tbl_monat WHERE zaehler_id = ? AND monat >= ?'
+SQL_MONATE_ZAEHLER = 'SELECT DISTINCT zaehler_id FROM tbl_monat'
+SQL_MONAT_EINFUEGEN = '''
+    INSERT INTO tbl_monat (zaehler_id, monat, verbrauch_wh, einzahlungen, verbrauchskosten, grundpreis, verbrauch)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+SQL_JAHRE_LOESCHEN = 'DELETE FROM tbl_jahr WHERE zaehler_id = ? AND jahr BETWEEN ? AND ?'
+SQL_JAHRE_EINFUEGEN = '''
+    INSERT INTO tbl_jahr (zaehler_id, jahr, monate, monate_mit_kosten, verbrauch_wh, einzahlungen,
+                          verbrauchskosten, grundpreis, verbrauch)
+    SELECT zaehler_id, CAST(substr(monat, 1, 4) AS INTEGER), COUNT(*), COUNT(verbrauchskosten),
+           SUM(verbrauch_wh), SUM(einzahlungen), COALESCE(SUM(verbrauchskosten), 0),
+           COALESCE(SUM(grundpreis), 0), SUM(verbrauch)
+    FROM tbl_monat WHERE zaehler_id = ? AND monat BETWEEN ? AND ? GROUP BY 2
+'''
+SQL_DATENSPANNEN = '''
+    SELECT zaehler_id, MIN(von), MAX(bis) FROM (
+        SELECT zaehler_id, MIN(datum) AS von, MAX(datum) AS bis FROM tbl_verbrauch_tag GROUP BY zaehler_id
+        UNION ALL
+        SELECT zaehler_id, MIN(datum), MAX(datum) FROM tbl_einzahlungen GROUP BY zaehler_id
+        UNION ALL
+        SELECT zaehler_id, MIN(monat) || '-01', MAX(monat) || '-01' FROM tbl_monat GROUP BY zaehler_id
+    ) GROUP BY zaehler_id
+'''
+
+# Vorgemerkte Zeiträume der laufenden Transaktion; die temporäre Tabelle gibt es
+# nur auf der Verbindung des Schreibers. Sie gehört zur Transaktion, ein
+# zurückgerollter Auftrag nimmt seine Vormerkung also mit.
+SQL_OFFEN_ANLEGEN = '''
+    CREATE TEMP TABLE IF NOT EXISTS tbl_rollup_offen (
+        zaehler_id INTEGER NOT NULL, von TEXT NOT NULL, bis TEXT NOT NULL)
+'''
+SQL_OFFEN_EINFUEGEN = 'INSERT INTO tbl_rollup_offen (zaehler_id, von, bis) VALUES (?, ?, ?)'
+SQL_OFFEN_ALLE = 'SELECT zaehler_id, von, bis FROM tbl_rollup_offen ORDER BY zaehler_id, von'
+SQL_OFFEN_LEEREN = 'DELETE FROM tbl_rollup_offen'
+
+# Dieselben Abfragen wie im Repository, hier auf der Verbindung des Schreibers
+SQL_BERECHGRUNDL = '''
+    SELECT datum_von, datum_bis, grundpreis, kwh_preis FROM tbl_berechgrundl
+    WHERE zaehler_id = ? ORDER BY datum_von
+'''
+SQL_VERBRAUCH_TAGE = '''
+    SELECT datum, verbrauch FROM tbl_verbrauch_tag
+    WHERE zaehler_id = ? AND datum >= ? AND datum < ? ORDER BY datum
+'''
+SQL_EINZAHLUNGEN = '''
+    SELECT id, datum, einzahlungen FROM tbl_einzahlungen
+    WHERE zaehler_id = ? AND datum BETWEEN ? AND ? ORDER BY datum
+'''
+
+
+# Datenquelle für die Abrechnungsengine auf einer offenen Verbindung, damit
+# die Monate in der laufenden Transaktion (mit den eigenen Änderungen) abgerechnet werden
+class _Verbindungsquelle:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def berechgrundl_daten(self, zaehler_id):
+        return self.conn.execute(SQL_BERECHGRUNDL, (zaehler_id,)).fetchall()
+
+    def verbrauch_tage(self, von_datum, bis_datum, zaehler_id):
+        return self.conn.execute(SQL_VERBRAUCH_TAGE,
+                                 (zaehler_id, von_datum.isoformat(), bis_datum.isoformat())).fetchall()
+
+    def einzahlungen_zwischen_daten(self, von_datum, bis_datum, zaehler_id):
+        return self.conn.execute(SQL_EINZAHLUNGEN,
+                                 (zaehler_id, von_datum.isoformat(), bis_datum.isoformat())).fetchall()
+
+
+# Quelle nur mit Tarifen für Monate ohne Verbrauch und Einzahlungen (nur Grundpreis)
+class _Tarifquelle:
+    def __init__(self, tarife):
+        self.tarife = tarife
+
+    def berechgrundl_daten(self, zaehler_id):
+        return self.tarife
+
+    def verbrauch_tage(self, von_datum, bis_datum, zaehler_id):
+        return []
+
+    def einzahlungen_zwischen_daten(self, von_datum, bis_datum, zaehler_id):
+        return []
+
+
+def _datum(wert):
+    if type(wert) is date:
+        return wert
+    return date.fromisoformat(str(wert)[:10])
+
+
+def _monat_text(datum):
+    return f"{datum.year:04d}-{datum.month:02d}"
+
+
+# Erster und letzter Tag des Monats 'YYYY-MM'
+def _monatsgrenzen(monat):
+    jahr, nummer = int(monat[:4]), int(monat[5:7])
+    anfang = date(jahr, nummer, 1)
+    naechster = date(jahr + nummer // 12, nummer % 12 + 1, 1)
+    return anfang, naechster - timedelta(days=1)
+
+
+# Monate, deren Kosten die Engine berechnen kann: lückenlos durch Tarife
+# abgedeckt und innerhalb des Kalenders von strom_kalender
+def _mit_tarif(tarif_index, perioden):
+    return [(von, bis) for von, bis in perioden
+            if strom_kalender.ERSTES_JAHR <= von.year <= strom_kalender.LETZTES_JAHR
+            and all(tarif is not None for _, _, tarif in tarif_index.segmente(von, bis))]
+
+
+# Monats- und Jahreszeilen eines Zählers für alle Monate von von_datum bis
+# bis_datum (inklusive) neu berechnen; muss in der Transaktion der Änderung laufen.
+# Die Einzahlungen der Monate vor archiviert_bis (Archivstichtag, siehe
+# strom_archiv) stehen nicht mehr in tbl_einzahlungen; sie ändern sich nicht
+# mehr und werden aus den bisherigen Monatszeilen übernommen.
+@strom_messung.gemessen('rollup.aktualisieren')
+def aktualisieren(conn, zaehler_id, von_datum, bis_datum=None, archiviert_bis=None):
+    # Erst hier importiert: strom_abrechnung braucht strom_repository, das dieses Modul importiert
+    import strom_abrechnung
+
+    von_datum = _datum(von_datum)
+    bis_datum = _datum(bis_datum or von_datum)
+    erster_monat, letzter_monat = _monat_text(von_datum), _monat_text(bis_datum)
+    # Als Text verglichen liegt "-31" hinter jedem Tag des Monats (auch bei 9999-12)
+    parameter = (zaehler_id, f"{erster_monat}-01", f"{letzter_monat}-31")
+    verbrauch = dict(conn.execute(SQL_VERBRAUCH_JE_MONAT, parameter))
+    einzahlungen = dict(conn.execute(SQL_EINZAHLUNGEN_JE_MONAT, parameter))
+    if archiviert_bis and erster_monat < archiviert_bis[:7]:
+        einzahlungen.update(conn.execute(SQL_EINZAHLUNGEN_ARCHIVIERT,
+                                         (zaehler_id, erster_monat, letzter_monat, archiviert_bis[:7])))
+    monate = sorted(verbrauch.keys() | einzahlungen.keys())
+
+    zeilen = []
+    if monate:
+        engine = strom_abrechnung.Abrechnungsengine(_Verbindungsquelle(conn), zaehler_id)
+        perioden = [_monatsgrenzen(monat) for monat in monate]
+        mit_tarif = _mit_tarif(engine.tarif_index, perioden)
+        abrechnungen = dict(zip(mit_tarif, engine.berechnen_perioden(mit_tarif)))
+        for monat, periode in zip(monate, perioden):
+            a = abrechnungen.get(periode)
+            if a is None:
+                zeilen.append((zaehler_id, monat, strom_betrag.wh(verbrauch.get(monat, 0)),
+                               einzahlungen.get(monat, 0), None, None, verbrauch.get(monat, 0)))
+            else:
+                zeilen.append((zaehler_id, monat, a.verbrauch_wh, einzahlungen.get(monat, 0),
+                               a.verbrauchskosten_cent, a.grundpreis_cent, verbrauch.get(monat, 0)))
+
+    conn.execute(SQL_MONATE_LOESCHEN, (zaehler_id, erster_monat, letzter_monat))
+    conn.executemany(SQL_MONAT_EINFUEGEN, zeilen)
+    conn.execute(SQL_JAHRE_LOESCHEN, (zaehler_id, von_datum.year, bis_datum.year))
+    conn.execute(SQL_JAHRE_EINFUEGEN, (zaehler_id, f"{von_datum.year:04d}-01", f"{bis_datum.year:04d}-12"))
+
+
+# Tabelle für Vormerkungen auf der Verbindung des Schreibers anlegen
+def offen_anlegen(conn):
+    conn.execute(SQL_OFFEN_ANLEGEN)
+
+
+# Geänderten Zeitraum eines Zählers für nachfuehren() vormerken
+def vormerken(conn, zaehler_id, von_datum, bis_datum=None):
+    von_datum = _datum(von_datum)
+    bis_datum = _datum(bis_datum or von_datum)
+    conn.execute(SQL_OFFEN_EINFUEGEN, (zaehler_id, von_datum.isoformat(), bis_datum.isoformat()))
+
+
+# Nach (zaehler_id, von) sortierte Zeiträume zusammenfassen, wenn sie sich
+# überschneiden oder in benachbarten Monaten liegen
+def _zusammenfassen(spannen):
+    zusammen = []
+    for zaehler_id, von, bis in spannen:
+        von, bis = _datum(von), _datum(bis)
+        if zusammen and zusammen[-1][0] == zaehler_id:
+            letzte = zusammen[-1]
+            if von.year * 12 + von.month <= letzte[2].year * 12 + letzte[2].month + 1:
+                letzte[2] = max(letzte[2], bis)
+                continue
+        zusammen.append([zaehler_id, von, bis])
+    return zusammen
+
+
+# Alle vorgemerkten Zeiträume abarbeiten: je Zähler und zusammenhängendem
+# Zeitraum ein aktualisieren(), egal wie viele Aufträge ihn geändert haben
+@strom_messung.gemessen('rollup.nachfuehren')
+def nachfuehren(conn):
+    spannen = conn.execute(SQL_OFFEN_ALLE).fetchall()
+    if not spannen:
+        return
+    conn.execute(SQL_OFFEN_LEEREN)
+    for zaehler_id, von, bis in _zusammenfassen(spannen):
+        aktualisieren(conn, zaehler_id, von, bis, strom_archiv.stichtag_lesen(conn, zaehler_id))
+
+
+# Beide Tabellen für alle Zähler vollständig neu aufbauen. stichtage
+# ({zaehler_id: stichtag}, siehe strom_archiv.stichtage_lesen) nennt die Zähler
+# mit Archiv; deren archivierte Monate werden mit ihren Einzahlungen neu berechnet.
+def neu_aufbauen(conn, stichtage=None):
+    stichtage = stichtage or {}
+    for zaehler_id, in conn.execute(SQL_MONATE_ZAEHLER).fetchall():
+        stichtag = stichtage.get(zaehler_id)
+        conn.execute(SQL_MONATE_AB_LOESCHEN, (zaehler_id, stichtag[:7] if stichtag else ''))
+    conn.execute('DELETE FROM tbl_jahr')
+    for zaehler_id, von, bis in conn.execute(SQL_DATENSPANNEN).fetchall():
+        aktualisieren(conn, zaehler_id, von, bis, stichtage.get(zaehler_id))
+
+
+# Summen über ganze Kalendermonate. Die Kosten (und damit Gesamtbetrag und
+# Saldo) sind None, wenn ein Monat des Zeitraums nicht lückenlos durch Tarife
+# abgedeckt ist; Verbrauch und Einzahlungen gibt es immer.
+@dataclass(frozen=True)
+class Summe:
+    start_datum: date
+    end_datum: date
+    monate: int
+    verbrauch_wh: int
+    einzahlungen_cent: int
+    verbrauchskosten_cent: Optional[int]
+    grundpreis_cent: Optional[int]
+    gesamtbetrag_cent: Optional[int]
+    saldo_cent: Optional[int]
+
+
+# Erster Tag des ersten und letzter Tag des letzten Monats; akzeptiert 'YYYY-MM'
+# oder Daten, die auf Monatsgrenzen liegen
+def monatszeitraum(von, bis):
+    if isinstance(von, str) and len(von) == 7:
+        anfang = _monatsgrenzen(von)[0]
+    else:
+        anfang = _datum(von)
+        if anfang.day != 1:
+            raise ValueError(f"{anfang} ist kein Monatserster.")
+    if isinstance(bis, str) and len(bis) == 7:
+        ende = _monatsgrenzen(bis)[1]
+    else:
+        ende = _datum(bis)
+        if (ende + timedelta(days=1)).day != 1:
+            raise ValueError(f"{ende} ist kein Monatsletzter.")
+    if anfang > ende:
+        raise ValueError("Das Startdatum liegt nach dem Enddatum.")
+    return anfang, ende
+
+
+def _summe(anfang, ende, monate, verbrauch_wh, einzahlungen_cent, kosten):
+    if kosten is None:
+        return Summe(anfang, ende, monate, verbrauch_wh, einzahlungen_cent, None, None, None, None)
+    verbrauchskosten_cent, grundpreis_cent = kosten
+    gesamtbetrag_cent = verbrauchskosten_cent + grundpreis_cent
+    return Summe(anfang, ende, monate, verbrauch_wh, einzahlungen_cent, verbrauchskosten_cent, grundpreis_cent,
+                 gesamtbetrag_cent, einzahlungen_cent - gesamtbetrag_cent)
+
+
+# Grundpreis der Monate ohne Zeile (kein Verbrauch, keine Einzahlungen) je Monat;
+# None für Monate ohne vollständigen Tarif
+def _grundpreise(quelle, zaehler_id, monate):
+    import strom_abrechnung
+
+    if not monate:
+        return {}
+    engine = strom_abrechnung.Abrechnungsengine(_Tarifquelle(quelle.berechgrundl_daten(zaehler_id=zaehler_id)),
+                                                zaehler_id)
+    perioden = [_monatsgrenzen(monat) for monat in monate]
+    mit_tarif = _mit_tarif(engine.tarif_index, perioden)
+    grundpreise = {_monat_text(a.start_datum): a.grundpreis_cent for a in engine.berechnen_perioden(mit_tarif)}
+    return {monat: grundpreise.get(monat) for monat in monate}
+
+
+# Alle Monate 'YYYY-MM' von anfang bis ende
+def _monate_zwischen(anfang, ende):
+    index = anfang.year * 12 + anfang.month - 1
+    letzter = ende.year * 12 + ende.month - 1
+    return [f"{i // 12:04d}-{i % 12 + 1:02d}" for i in range(index, letzter + 1)]
+
+
+# Ungerundeter Verbrauch (kWh) der Tage von bis bis (inklusive): volle Jahre aus
+# jahre, volle Monate aus monate ({jahr bzw. monat: kWh}, fehlt eine Zeile, gab
+# es keinen Verbrauch), angebrochene Monate als Bereichssumme über tbl_verbrauch_tag
+def _rohverbrauch(quelle, zaehler_id, von, bis, jahre, monate):
+    kwh = 0.0
+    tag = von
+    while tag <= bis:
+        naechstes_jahr = date(tag.year + 1, 1, 1)
+        monatsende = _monatsgrenzen(_monat_text(tag))[1]
+        if tag.month == 1 and tag.day == 1 and tag.year in jahre and naechstes_jahr <= bis + timedelta(days=1):
+            kwh += jahre[tag.year]
+            tag = naechstes_jahr
+        elif tag.day == 1 and monatsende <= bis:
+            kwh += monate.get(_monat_text(tag), 0.0)
+            tag = monatsende + timedelta(days=1)
+        else:
+            teil_ende = min(monatsende, bis)
+            kwh += quelle.verbrauch_zwischen(tag, teil_ende + timedelta(days=1), zaehler_id=zaehler_id)
+            tag = teil_ende + timedelta(days=1)
+    return kwh
+
+
+# Summe eines Zählers über die Monate von bis bis (siehe monatszeitraum). Der
+# Zeitraum wird wie in strom_abrechnung an den Tarifgrenzen geteilt; den
+# ungerundeten Verbrauch je Abschnitt liefern die vollen Kalenderjahre aus
+# tbl_jahr und die Randmonate aus tbl_monat. Nur Jahre, in denen ein Abschnitt
+# beginnt, werden monatsweise gelesen.
+@strom_messung.gemessen('rollup.summe')
+def summe(quelle, von, bis, zaehler_id) -> Summe:
+    import strom_abrechnung
+
+    anfang, ende = monatszeitraum(von, bis)
+    abschnitte = strom_abrechnung.TarifIndex.aus_zeilen(
+        quelle.berechgrundl_daten(zaehler_id=zaehler_id)).segmente(anfang, ende)
+    erstes_jahr = anfang.year if anfang.month == 1 else anfang.year + 1
+    letztes_jahr = ende.year if ende.month == 12 else ende.year - 1
+    geteilte_jahre = {von_datum.year for von_datum, _, _ in abschnitte[1:]
+                      if erstes_jahr <= von_datum.year <= letztes_jahr and (von_datum.month, von_datum.day) != (1, 1)}
+
+    jahre = {}
+    monate = {}
+    einzahlungen_cent = 0
+    if erstes_jahr <= letztes_jahr:
+        for jahr, _, _, _, einzahlungen, _, _, verbrauch in quelle.rollup_jahre(erstes_jahr, letztes_jahr,
+                                                                                zaehler_id=zaehler_id):
+            einzahlungen_cent += einzahlungen
+            if jahr not in geteilte_jahre:
+                jahre[jahr] = verbrauch
+        bereiche = [(_monat_text(anfang), f"{erstes_jahr - 1:04d}-12"),
+                    (f"{letztes_jahr + 1:04d}-01", _monat_text(ende))]
+        bereiche += [(f"{jahr:04d}-01", f"{jahr:04d}-12") for jahr in sorted(geteilte_jahre)]
+    else:
+        bereiche = [(_monat_text(anfang), _monat_text(ende))]
+    for nummer, (erster, letzter) in enumerate(bereiche):
+        for monat, _, einzahlungen, _, _, verbrauch in quelle.rollup_monate(erster, letzter, zaehler_id=zaehler_id):
+            monate[monat] = verbrauch
+            # Die Einzahlungen geteilter Jahre stecken schon in deren Jahreszeile
+            if nummer < 2:
+                einzahlungen_cent += einzahlungen
+
+    verbrauch_wh = verbrauchskosten_cent = grundpreis_cent = 0
+    mit_kosten = True
+    for von_datum, bis_datum, tarif in abschnitte:
+        wh = strom_betrag.wh(_rohverbrauch(quelle, zaehler_id, von_datum, bis_datum, jahre, monate))
+        verbrauch_wh += wh
+        if tarif is None or not (strom_kalender.ERSTES_JAHR <= von_datum.year
+                                 and bis_datum.year <= strom_kalender.LETZTES_JAHR):
+            mit_kosten = False
+            continue
+        verbrauchskosten_cent += strom_betrag.arbeitskosten(wh, tarif.kwh_preis)
+        grundpreis_cent += strom_betrag.grundpreis_anteil(tarif.grundpreis_cent,
+                                                          strom_kalender.monatsanteil(von_datum, bis_datum))
+
+    kosten = (verbrauchskosten_cent, grundpreis_cent) if mit_kosten else None
+    return _summe(anfang, ende, len(_monate_zwischen(anfang, ende)), verbrauch_wh, einzahlungen_cent, kosten)
+
+
+# Eine Summe je Kalendermonat von bis bis, auch für Monate ohne Zeile
+@strom_messung.gemessen('rollup.monatswerte')
+def monatswerte(quelle, von, bis, zaehler_id) -> list:
+    anfang, ende = monatszeitraum(von, bis)
+    zeilen = {zeile[0]: zeile for zeile in quelle.rollup_monate(_monat_text(anfang), _monat_text(ende),
+                                                                 zaehler_id=zaehler_id)}
+    alle = _monate_zwischen(anfang, ende)
+    grundpreise = _grundpreise(quelle, zaehler_id, [monat for monat in alle if monat not in zeilen])
+    ergebnis = []
+    for monat in alle:
+        erster, letzter = _monatsgrenzen(monat)
+        zeile = zeilen.get(monat)
+        if zeile is None:
+            grundpreis = grundpreise[monat]
+            kosten = None if grundpreis is None else (0, grundpreis)
+            ergebnis.append(_summe(erster, letzter, 1, 0, 0, kosten))
+        else:
+            _, verbrauch, einzahlungen, verbrauchskosten, grundpreis, _ = zeile
+            kosten = None if verbrauchskosten is None else (verbrauchskosten, grundpreis)
+            ergebnis.append(_summe(erster, letzter, 1, verbrauch, einzahlungen, kosten))
+    return ergebnis
+
+
+def _betrag(cent_wert):
+    return '' if cent_wert is None else strom_betrag.euro_text(cent_wert)
+
+
+# Aufruf: python3 strom_rollup.py 2024-01 2024-12 [--zaehler 2] [--summe] | --neu-aufbauen
+def main(argv=None):
+    import strom_repository
+
+    parser = argparse.ArgumentParser(description="Monats- und Jahressummen aus tbl_monat/tbl_jahr")
+    parser.add_argument('von', nargs='?', help="Erster Monat (YYYY-MM)")
+    parser.add_argument('bis', nargs='?', help="Letzter Monat (YYYY-MM)")
+    parser.add_argument('--zaehler', type=int, default=strom_repository.STANDARD_ZAEHLER)
+    parser.add_argument('--summe', action='store_true', help="Nur die Summe über den Zeitraum ausgeben")
+    parser.add_argument('--neu-aufbauen', action='store_true', help="Summen aller Zähler neu berechnen")
+    parser.add_argument('--db', default=strom_repository.DB_PATH)
+    args = parser.parse_args(argv)
+    if not args.neu_aufbauen and not (args.von and args.bis):
+        parser.error("von und bis oder --neu-aufbauen angeben")
+
+    try:
+        repo = strom_repository.get_repository(args.db)
+        if args.neu_aufbauen:
+            repo.schreiben(lambda conn: neu_aufbauen(conn, strom_archiv.stichtage_lesen(conn)))
+            return 0
+        if args.summe:
+            werte = [summe(repo, args.von, args.bis, args.zaehler)]
+        else:
+            werte = monatswerte(repo, args.von, args.bis, args.zaehler)
+    except (ValueError, strom_repository.DatenbankFehler) as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    print("start;ende;monate;verbrauch_kwh;verbrauchskosten;grundpreis;gesamtbetrag;einzahlungen;saldo")
+    for s in werte:
+        print(";".join((str(s.start_datum), str(s.end_datum), str(s.monate), strom_betrag.kwh_text(s.verbrauch_wh),
+                        _betrag(s.verbrauchskosten_cent), _betrag(s.grundpreis_cent), _betrag(s.gesamtbetrag_cent),
+                        strom_betrag.euro_text(s.einzahlungen_cent), _betrag(s.saldo_cent))))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
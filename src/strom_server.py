@@ -0,0 +1,495 @@
+import argparse
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from urllib.parse import parse_qsl, urlsplit
+
+import strom_abrechnung
+import strom_betrag
+import strom_cache
+import strom_export
+import strom_import
+import strom_log
+import strom_messung
+import strom_repository
+import strom_rollup
+
+# HTTP/JSON-Schnittstelle für Kunden, Zähler, die drei Datentabellen und die
+# Abrechnung, nur mit asyncio aus der Standardbibliothek. Die Ereignisschleife
+# liest und schreibt ausschließlich Sockets; jede Anfrage wird als Ganzes
+# (JSON lesen, prüfen, SQLite, JSON schreiben) in einem ThreadPoolExecutor mit
+# so vielen Threads wie Verbindungen im Pool bearbeitet. Ein Semaphor begrenzt
+# zusätzlich die Zahl wartender Anfragen: ist er erschöpft, liest der Server von
+# den Clients nichts mehr, bis wieder Platz ist, statt Aufträge anzuhäufen.
+# Verbindungen bleiben nach HTTP/1.1 offen (keep-alive), Anfragen auf einer
+# Verbindung werden der Reihe nach beantwortet. POST-Endpunkte der Datentabellen
+# nehmen ein einzelnes Objekt oder eine Liste an; eine Liste wird komplett
+# geprüft und in einer Transaktion geschrieben.
+#
+#   GET  /kunden                             POST /kunden {"name": ...}
+#   GET  /zaehler                            POST /zaehler {"kunde": 1, "bezeichnung": ...}
+#   GET  /zaehler/<id>/zaehlerstaende        POST (Felder wie beim Import)
+#   GET  /zaehler/<id>/einzahlungen          POST
+#   GET  /zaehler/<id>/berechgrundl          POST, DELETE ?datum_von=...&datum_bis=...
+#   DELETE /zaehlerstaende/<id>, DELETE /einzahlungen/<id>
+#   GET  /zaehler/<id>/abrechnung?start=...&ende=...[&frequenz=monatlich]
+#   GET  /zaehler/<id>/monatswerte?von=YYYY-MM&bis=YYYY-MM   Monate und Summe (strom_rollup)
+#   GET  /metriken[?format=json]             Laufzeiten (strom_messung), sonst Prometheus-Text
+#
+# Listen werden seitenweise geliefert (?von=&bis=&anzahl=&nach=); "weiter" im
+# Ergebnis ist der Wert für nach, mit dem die nächste Seite abgerufen wird.
+
+HOST = '127.0.0.1'
+PORT = 8080
+
+# Wartende Anfragen je Thread, bevor der Server keine weiteren mehr annimmt
+WARTENDE_JE_THREAD = 16
+
+# Grenzen einer Anfrage
+MAX_KOPFZEILEN = 100
+MAX_ZEILENLAENGE = 8192
+MAX_KOERPER = 16 * 1024 * 1024
+MAX_STAPEL = 20_000
+MAX_SEITE = 5000
+
+JSON_TYP = 'application/json; charset=utf-8'
+PROMETHEUS_TYP = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Sekunden, die eine ruhende keep-alive-Verbindung offen bleibt
+LEERLAUF_TIMEOUT = 30
+
+STATUS_TEXTE = {
+    200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    408: 'Request Timeout', 409: 'Conflict', 411: 'Length Required', 413: 'Payload Too Large',
+    422: 'Unprocessable Entity', 431: 'Request Header Fields Too Large', 500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+
+class HttpFehler(Exception):
+    def __init__(self, status, meldung):
+        super().__init__(meldung)
+        self.status = status
+
+
+@dataclass
+class Anfrage:
+    methode: str
+    pfad: str
+    parameter: dict
+    koerper: bytes = b''
+    pfad_werte: tuple = field(default_factory=tuple)
+
+    # JSON-Körper; bei fehlendem oder ungültigem Inhalt 400
+    def json(self):
+        try:
+            return json.loads(self.koerper)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise HttpFehler(400, f"Ungültiges JSON: {e}") from None
+
+
+# Anfrageparameter als Datum bzw. ganze Zahl; fehlt er, gilt standard
+def _datum_parameter(anfrage, name, standard=None):
+    wert = anfrage.parameter.get(name, standard)
+    if wert is None:
+        raise HttpFehler(400, f"Parameter '{name}' fehlt.")
+    try:
+        return strom_abrechnung.als_datum(wert)
+    except ValueError:
+        raise HttpFehler(400, f"Ungültiges Datum für '{name}': {wert!r}") from None
+
+
+def _zahl_parameter(anfrage, name, standard, maximum):
+    try:
+        wert = int(anfrage.parameter.get(name, standard))
+    except ValueError:
+        raise HttpFehler(400, f"Parameter '{name}' muss eine ganze Zahl sein.") from None
+    if not 0 < wert <= maximum:
+        raise HttpFehler(400, f"Parameter '{name}' muss zwischen 1 und {maximum} liegen.")
+    return wert
+
+
+# Schlüssel für die nächste Seite: "YYYY-MM-DD,id"
+def _seitenschluessel(anfrage):
+    wert = anfrage.parameter.get('nach')
+    if wert is None:
+        return None
+    try:
+        datum, rowid = wert.split(',')
+        return strom_repository.datum_text(datum), int(rowid)
+    except ValueError:
+        raise HttpFehler(400, f"Ungültiger Seitenschlüssel: {wert!r}") from None
+
+
+# Einzelnes Objekt oder Liste aus dem Körper lesen und mit der Prüffunktion des
+# Imports prüfen; die erste ungültige Zeile lehnt die ganze Anfrage ab
+def _gepruefte_zeilen(anfrage, pruefen):
+    daten = anfrage.json()
+    zeilen = daten if isinstance(daten, list) else [daten]
+    if not zeilen:
+        raise HttpFehler(400, "Keine Daten.")
+    if len(zeilen) > MAX_STAPEL:
+        raise HttpFehler(413, f"Höchstens {MAX_STAPEL} Zeilen je Anfrage.")
+    geprueft = []
+    for nummer, zeile in enumerate(zeilen, start=1):
+        if not isinstance(zeile, dict):
+            raise HttpFehler(400, f"Zeile {nummer}: Objekt erwartet.")
+        try:
+            geprueft.append(pruefen(zeile))
+        except KeyError as e:
+            raise HttpFehler(400, f"Zeile {nummer}: Feld {e} fehlt.") from None
+        except (TypeError, ValueError) as e:
+            raise HttpFehler(400, f"Zeile {nummer}: {e}") from None
+    return geprueft
+
+
+def _summe_daten(s):
+    return {'start': s.start_datum.isoformat(), 'ende': s.end_datum.isoformat(), 'monate': s.monate,
+            'verbrauch_wh': s.verbrauch_wh, 'verbrauchskosten_cent': s.verbrauchskosten_cent,
+            'grundpreis_cent': s.grundpreis_cent, 'gesamtbetrag_cent': s.gesamtbetrag_cent,
+            'einzahlungen_cent': s.einzahlungen_cent, 'saldo_cent': s.saldo_cent}
+
+
+# Antwort, die nicht als JSON, sondern unverändert mit eigenem Content-Type gesendet wird
+@dataclass
+class Text:
+    inhalt: str
+    typ: str
+
+
+class StromServer:
+    def __init__(self, repo, threads=None, wartende=None):
+        self.repo = repo
+        self.cache = strom_cache.get_cache(repo)
+        threads = threads or repo.pool.groesse
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='strom_server')
+        self.plaetze = asyncio.Semaphore(wartende or threads * WARTENDE_JE_THREAD)
+        self.server = None
+        self.verbindungen = set()
+        # (methode, muster, funktion); die Gruppen des Musters sind ganze Zahlen
+        self.routen = [
+            ('GET', r'/kunden', self.kunden),
+            ('POST', r'/kunden', self.kunde_anlegen),
+            ('GET', r'/zaehler', self.zaehler),
+            ('POST', r'/zaehler', self.zaehler_anlegen),
+            ('GET', r'/zaehler/(\d+)/zaehlerstaende', self.zaehlerstaende),
+            ('POST', r'/zaehler/(\d+)/zaehlerstaende', partial(self.einfuegen, 'zaehlerstand')),
+            ('DELETE', r'/zaehlerstaende/(\d+)', self.zaehlerstand_loeschen),
+            ('GET', r'/zaehler/(\d+)/einzahlungen', self.einzahlungen),
+            ('POST', r'/zaehler/(\d+)/einzahlungen', partial(self.einfuegen, 'einzahlungen')),
+            ('DELETE', r'/einzahlungen/(\d+)', self.einzahlung_loeschen),
+            ('GET', r'/zaehler/(\d+)/berechgrundl', self.berechgrundl),
+            ('POST', r'/zaehler/(\d+)/berechgrundl', partial(self.einfuegen, 'berechgrundl')),
+            ('DELETE', r'/zaehler/(\d+)/berechgrundl', self.berechgrundl_loeschen),
+            ('GET', r'/zaehler/(\d+)/abrechnung', self.abrechnung),
+            ('GET', r'/zaehler/(\d+)/monatswerte', self.monatswerte),
+            ('GET', r'/metriken', self.metriken),
+        ]
+        self.routen = [(methode, re.compile(muster + '$'), funktion) for methode, muster, funktion in self.routen]
+
+    # --- Endpunkte (laufen im Thread-Pool; liefern (status, daten)) ---
+
+    def kunden(self, anfrage):
+        return 200, [{'id': kunde_id, 'name': name} for kunde_id, name in self.repo.kunden_daten()]
+
+    def kunde_anlegen(self, anfrage):
+        daten = anfrage.json()
+        name = daten.get('name') if isinstance(daten, dict) else None
+        if not isinstance(name, str) or not name.strip():
+            raise HttpFehler(400, "Feld 'name' fehlt.")
+        return 201, {'id': self.repo.insert_kunde(name.strip())}
+
+    def zaehler(self, anfrage):
+        return 200, [{'id': zaehler_id, 'kunde': kunde_id, 'bezeichnung': bezeichnung}
+                     for zaehler_id, kunde_id, bezeichnung in self.repo.zaehler_daten()]
+
+    def zaehler_anlegen(self, anfrage):
+        daten = anfrage.json()
+        if not isinstance(daten, dict) or not isinstance(daten.get('kunde'), int):
+            raise HttpFehler(400, "Feld 'kunde' (id) fehlt.")
+        bezeichnung = str(daten.get('bezeichnung', '')).strip()
+        return 201, {'id': self.repo.insert_zaehler(daten['kunde'], bezeichnung)}
+
+    # Seite aus zaehlerstaende_seite bzw. einzahlungen_seite mit Schlüssel der nächsten Seite
+    def _seite(self, anfrage, seite, felder):
+        anzahl = _zahl_parameter(anfrage, 'anzahl', 200, MAX_SEITE)
+        zeilen = seite(_datum_parameter(anfrage, 'von', '0001-01-01'),
+                       _datum_parameter(anfrage, 'bis', '9999-12-31'),
+                       _seitenschluessel(anfrage), anzahl, zaehler_id=anfrage.pfad_werte[0])
+        weiter = f"{zeilen[-1][1]},{zeilen[-1][0]}" if len(zeilen) == anzahl else None
+        return 200, {'daten': [dict(zip(felder, zeile)) for zeile in zeilen], 'weiter': weiter}
+
+    def zaehlerstaende(self, anfrage):
+        return self._seite(anfrage, self.repo.zaehlerstaende_seite, ('id', 'datum', 'zaehlerstand'))
+
+    def einzahlungen(self, anfrage):
+        return self._seite(anfrage, self.repo.einzahlungen_seite, ('id', 'datum', 'einzahlungen_cent'))
+
+    def berechgrundl(self, anfrage):
+        return 200, [{'datum_von': von, 'datum_bis': bis, 'grundpreis_cent': grundpreis, 'kwh_preis': kwh_preis,
+                      'preis_skala': strom_betrag.PREIS_SKALA}
+                     for von, bis, grundpreis, kwh_preis in self.repo.berechgrundl_daten(anfrage.pfad_werte[0])]
+
+    # POST einer der drei Datentabellen: Prüfung und Einfügen wie beim Import
+    def einfuegen(self, tabelle, anfrage):
+        pruefen, methode = strom_import.TABELLEN[tabelle]
+        zeilen = _gepruefte_zeilen(anfrage, pruefen)
+        anzahl = getattr(self.repo, methode)(zeilen, zaehler_id=anfrage.pfad_werte[0])
+        return 201, {'eingefuegt': anzahl}
+
+    def zaehlerstand_loeschen(self, anfrage):
+        if not self.repo.delete_zaehlerstand(anfrage.pfad_werte[0]):
+            raise HttpFehler(404, "Zählerstand nicht gefunden.")
+        return 200, {'geloescht': 1}
+
+    def einzahlung_loeschen(self, anfrage):
+        if not self.repo.delete_einzahlung(anfrage.pfad_werte[0]):
+            raise HttpFehler(404, "Einzahlung nicht gefunden.")
+        return 200, {'geloescht': 1}
+
+    def berechgrundl_loeschen(self, anfrage):
+        if not self.repo.delete_berechgrundl(_datum_parameter(anfrage, 'datum_von'),
+                                             _datum_parameter(anfrage, 'datum_bis'),
+                                             zaehler_id=anfrage.pfad_werte[0]):
+            raise HttpFehler(404, "Berechnungsgrundlage nicht gefunden.")
+        return 200, {'geloescht': 1}
+
+    def abrechnung(self, anfrage):
+        zaehler_id = anfrage.pfad_werte[0]
+        start = _datum_parameter(anfrage, 'start')
+        ende = _datum_parameter(anfrage, 'ende')
+        frequenz = anfrage.parameter.get('frequenz')
+        if frequenz is None:
+            return 200, strom_export.abrechnung_daten(zaehler_id, self.cache.berechnen(start, ende, zaehler_id))
+        if frequenz not in strom_abrechnung.FREQUENZEN:
+            raise HttpFehler(400, f"Unbekannte Frequenz: {frequenz!r}")
+        perioden = strom_abrechnung.perioden_nach_frequenz(start, ende, frequenz)
+        return 200, [strom_export.abrechnung_daten(zaehler_id, a)
+                     for a in strom_abrechnung.berechnen_perioden(perioden, self.repo, zaehler_id)]
+
+    # Monatswerte und ihre Summe aus tbl_monat/tbl_jahr; Kosten sind null, wenn Tarife fehlen
+    def monatswerte(self, anfrage):
+        zaehler_id = anfrage.pfad_werte[0]
+        try:
+            von, bis = anfrage.parameter['von'], anfrage.parameter['bis']
+        except KeyError as e:
+            raise HttpFehler(400, f"Parameter {e} fehlt.") from None
+        anfang, ende = strom_rollup.monatszeitraum(von, bis)
+        if (ende.year - anfang.year) * 12 + ende.month - anfang.month >= MAX_SEITE:
+            raise HttpFehler(400, f"Höchstens {MAX_SEITE} Monate je Anfrage.")
+        return 200, {'zaehler': zaehler_id,
+                     'monate': [_summe_daten(s) for s in strom_rollup.monatswerte(self.repo, von, bis, zaehler_id)],
+                     'summe': _summe_daten(strom_rollup.summe(self.repo, von, bis, zaehler_id))}
+
+    def metriken(self, anfrage):
+        if anfrage.parameter.get('format') == 'json':
+            return 200, strom_messung.als_json()
+        return 200, Text(strom_messung.als_prometheus(), PROMETHEUS_TYP)
+
+    # --- Verteilung und Fehlerbehandlung ---
+
+    # Anfrage der passenden Route zuordnen und als (status, Bytes, Content-Type)
+    # beantworten; die Laufzeit wird je Route (Methode und Muster) gemessen
+    def bearbeiten(self, anfrage):
+        if not strom_messung.aktiv():
+            return self._bearbeiten(anfrage)
+        with strom_messung.messen('http', self._routenname(anfrage)):
+            return self._bearbeiten(anfrage)
+
+    def _bearbeiten(self, anfrage):
+        try:
+            status, daten = self._route(anfrage)(anfrage)
+        except HttpFehler as e:
+            status, daten = e.status, {'fehler': str(e)}
+        except strom_abrechnung.BerechnungsFehler as e:
+            status, daten = 422, {'fehler': str(e)}
+        except ValueError as e:
+            status, daten = 400, {'fehler': str(e)}
+        except sqlite3.IntegrityError as e:
+            status, daten = 409, {'fehler': f"Verletzt eine Bedingung der Datenbank: {e}"}
+        except strom_repository.DatenbankFehler as e:
+            logging.error(f"Datenbankfehler bei {anfrage.methode} {anfrage.pfad}: {e}")
+            status, daten = 503, {'fehler': str(e)}
+        except Exception as e:
+            logging.exception(f"Unbekannter Fehler bei {anfrage.methode} {anfrage.pfad}")
+            status, daten = 500, {'fehler': f"Interner Fehler: {e}"}
+        if isinstance(daten, Text):
+            return status, daten.inhalt.encode('utf-8'), daten.typ
+        return status, json.dumps(daten, ensure_ascii=False).encode('utf-8'), JSON_TYP
+
+    # Name der Route für die Messung, z. B. 'GET /zaehler/(\d+)/abrechnung'
+    def _routenname(self, anfrage):
+        for methode, muster, _ in self.routen:
+            if methode == anfrage.methode and muster.match(anfrage.pfad):
+                return f"{methode} {muster.pattern[:-1]}"
+        return f"{anfrage.methode} (unbekannt)"
+
+    def _route(self, anfrage):
+        methoden = []
+        for methode, muster, funktion in self.routen:
+            treffer = muster.match(anfrage.pfad)
+            if treffer is None:
+                continue
+            if methode == anfrage.methode:
+                anfrage.pfad_werte = tuple(int(wert) for wert in treffer.groups())
+                return funktion
+            methoden.append(methode)
+        if methoden:
+            raise HttpFehler(405, f"Erlaubt: {', '.join(methoden)}")
+        raise HttpFehler(404, f"Unbekannter Pfad: {anfrage.pfad}")
+
+    # --- HTTP/1.1 über asyncio-Streams ---
+
+    # Eine Zeile lesen; ist sie länger als MAX_ZEILENLAENGE, meldet der
+    # StreamReader einen ValueError, der hier zur Fehlerantwort wird
+    @staticmethod
+    async def _zeile_lesen(reader, status, meldung):
+        try:
+            return await reader.readline()
+        except (ValueError, asyncio.LimitOverrunError):
+            raise HttpFehler(status, meldung) from None
+
+    # Anfragezeile, Kopfzeilen und Körper lesen; None, wenn der Client die
+    # Verbindung zwischen zwei Anfragen schließt
+    async def _anfrage_lesen(self, reader):
+        try:
+            zeile = await asyncio.wait_for(self._zeile_lesen(reader, 400, "Anfragezeile zu lang."), LEERLAUF_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None, False
+        if not zeile:
+            return None, False
+        try:
+            methode, ziel, version = zeile.decode('latin-1').split()
+        except ValueError:
+            raise HttpFehler(400, "Ungültige Anfragezeile.") from None
+
+        kopf = {}
+        while True:
+            zeile = await self._zeile_lesen(reader, 431, "Kopfzeile zu lang.")
+            if zeile in (b'\r\n', b'\n', b''):
+                break
+            if len(kopf) >= MAX_KOPFZEILEN:
+                raise HttpFehler(400, "Zu viele Kopfzeilen.")
+            name, _, wert = zeile.decode('latin-1').partition(':')
+            kopf[name.strip().lower()] = wert.strip()
+
+        verbindung = kopf.get('connection', '').lower()
+        offen_lassen = verbindung != 'close' if version == 'HTTP/1.1' else verbindung == 'keep-alive'
+        if 'chunked' in kopf.get('transfer-encoding', '').lower():
+            raise HttpFehler(411, "Chunked-Übertragung wird nicht unterstützt, bitte Content-Length angeben.")
+        # Nur Ziffern: int() nähme auch Vorzeichen, Leerzeichen und Unterstriche an
+        laenge = kopf.get('content-length', '0')
+        if not (laenge.isascii() and laenge.isdigit()):
+            raise HttpFehler(400, "Ungültige Content-Length.")
+        laenge = int(laenge)
+        if laenge > MAX_KOERPER:
+            raise HttpFehler(413, f"Höchstens {MAX_KOERPER} Bytes je Anfrage.")
+        koerper = await reader.readexactly(laenge) if laenge else b''
+
+        teile = urlsplit(ziel)
+        return Anfrage(methode.upper(), teile.path.rstrip('/') or '/', dict(parse_qsl(teile.query)), koerper), \
+            offen_lassen
+
+    @staticmethod
+    async def _antworten(writer, status, koerper, offen_lassen, typ=JSON_TYP):
+        writer.write((f"HTTP/1.1 {status} {STATUS_TEXTE.get(status, '')}\r\n"
+                      f"Content-Type: {typ}\r\n"
+                      f"Content-Length: {len(koerper)}\r\n"
+                      f"Connection: {'keep-alive' if offen_lassen else 'close'}\r\n\r\n").encode('latin-1')
+                     + koerper)
+        await writer.drain()
+
+    # Eine Client-Verbindung: Anfragen lesen, bis der Client schließt oder
+    # Connection: close sendet
+    async def verbindung(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        aufgabe = asyncio.current_task()
+        self.verbindungen.add(aufgabe)
+        try:
+            while True:
+                try:
+                    anfrage, offen_lassen = await self._anfrage_lesen(reader)
+                except HttpFehler as e:
+                    # Nach einer unlesbaren Anfrage ist der Datenstrom nicht mehr synchron
+                    await self._antworten(writer, e.status, json.dumps({'fehler': str(e)}).encode('utf-8'), False)
+                    break
+                if anfrage is None:
+                    break
+                async with self.plaetze:
+                    status, koerper, typ = await loop.run_in_executor(self.executor, self.bearbeiten, anfrage)
+                await self._antworten(writer, status, koerper, offen_lassen, typ)
+                if not offen_lassen:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # Von beenden() abgebrochen; als Fehler gemeldet würde es nur das Log füllen
+            pass
+        finally:
+            self.verbindungen.discard(aufgabe)
+            writer.close()
+
+    async def starten(self, host=HOST, port=PORT):
+        self.server = await asyncio.start_server(self.verbindung, host, port, limit=MAX_ZEILENLAENGE)
+        return self.server
+
+    # Keine neuen Verbindungen mehr annehmen, offene (auch ruhende keep-alive-)
+    # Verbindungen beenden und laufende Datenbankaufträge abwarten
+    async def beenden(self):
+        if self.server is not None:
+            self.server.close()
+            for aufgabe in list(self.verbindungen):
+                aufgabe.cancel()
+            await asyncio.gather(*self.verbindungen, return_exceptions=True)
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=True)
+
+
+async def _ausfuehren(repo, host, port, threads):
+    server = StromServer(repo, threads)
+    await server.starten(host, port)
+    adressen = ', '.join(f"{s.getsockname()[0]}:{s.getsockname()[1]}" for s in server.server.sockets)
+    print(f"Strom-Server läuft auf {adressen}", file=sys.stderr)
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.beenden()
+
+
+# Aufruf: python3 strom_server.py [--host 127.0.0.1] [--port 8080] [--threads 4] [--db meine_datenbank.db]
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP/JSON-Schnittstelle für die Stromabrechnung")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--threads', type=int, default=strom_repository.POOL_GROESSE,
+                        help="Threads für SQLite (zugleich Größe des Verbindungspools)")
+    parser.add_argument('--db', default=strom_repository.DB_PATH)
+    parser.add_argument('--messung', type=float, nargs='?', const=strom_messung.SCHWELLE_MS, metavar='SCHWELLE_MS',
+                        help="Laufzeiten messen (GET /metriken); langsamere Anweisungen mit Abfrageplan ins Log")
+    args = parser.parse_args(argv)
+
+    strom_log.einrichten(konsole=True)
+    if args.messung is not None:
+        strom_messung.aktivieren(args.messung)
+    try:
+        repo = strom_repository.StromRepository(args.db, pool_groesse=args.threads)
+    except strom_repository.DatenbankFehler as e:
+        print(e, file=sys.stderr)
+        return 1
+    try:
+        asyncio.run(_ausfuehren(repo, args.host, args.port, args.threads))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        repo.schliessen()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
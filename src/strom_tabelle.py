@@ -0,0 +1,163 @@
+import tkinter as tk
+from collections import deque
+from tkinter import ttk
+
+# Tabelle für große Zeiträume: statt alle Zeilen auf einmal einzufügen, hält die
+# Treeview nur ein Fenster von wenigen Seiten. Beim Scrollen an den unteren bzw.
+# oberen Rand wird die nächste bzw. vorherige Seite über den Schlüssel (datum, id)
+# nachgeladen und die Seite am anderen Ende wieder entfernt.
+
+SEITENGROESSE = 200
+MAX_SEITEN = 3
+
+# Anteil der Höhe, ab dem am Rand nachgeladen wird
+RAND = 0.05
+
+
+class BlaetterTabelle(ttk.Treeview):
+    # seite_laden(schluessel, anzahl, rueckwaerts) liefert Zeilen (id, datum, wert, ...)
+    # aufsteigend sortiert; schluessel ist (datum, id) der Randzeile oder None.
+    # Mit aufgaben (strom_aufgaben.Aufgaben) werden die Seiten im Hintergrund
+    # geladen; Ladefehler gehen dann an fehler(exception).
+    def __init__(self, master, seite_laden, seitengroesse=SEITENGROESSE, max_seiten=MAX_SEITEN,
+                 aufgaben=None, fehler=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.seite_laden = seite_laden
+        self.aufgaben = aufgaben
+        self.fehler = fehler
+        self.seitengroesse = seitengroesse
+        self.max_seiten = max(2, max_seiten)
+
+        # Die Scrollbar platziert der Aufrufer neben der Tabelle
+        self.scrollbar = ttk.Scrollbar(master, orient=tk.VERTICAL, command=self.yview)
+        self.configure(yscrollcommand=self._gescrollt)
+
+        self._seiten = deque()
+        self._schluessel = {}
+        self._am_anfang = True
+        self._am_ende = False
+        self._geplant = None
+        self._laedt = False
+        self.neu_laden()
+
+    # Anzeige leeren und die erste Seite des Zeitraums laden; eine noch laufende
+    # Seitenabfrage wird dabei durch die neue ersetzt
+    def neu_laden(self):
+        if self._geplant:
+            self.after_cancel(self._geplant)
+            self._geplant = None
+        super().delete(*self.get_children())
+        self._seiten.clear()
+        self._schluessel.clear()
+        self._am_anfang = True
+        self._am_ende = False
+        self._naechste_seite()
+
+    def _zeilen_einfuegen(self, zeilen, position):
+        seite = []
+        for i, zeile in enumerate(zeilen):
+            iid = self.insert("", position if position == "end" else position + i, values=zeile)
+            self._schluessel[iid] = (zeile[1], zeile[0])
+            seite.append(iid)
+        return seite
+
+    def _seite_entfernen(self, seite):
+        super().delete(*seite)
+        for iid in seite:
+            del self._schluessel[iid]
+
+    # Erste sichtbare Zeile nach dem Einfügen bzw. Entfernen von Zeilen beibehalten
+    def _ansicht_halten(self, erste_zeile, anzahl_vorher, verschiebung):
+        anzahl = len(self._schluessel)
+        if anzahl_vorher and anzahl:
+            self.yview_moveto(max(0.0, erste_zeile * anzahl_vorher + verschiebung) / anzahl)
+
+    # Seite laden: mit Aufgaben im Hintergrund, sonst direkt. Bis die Seite
+    # eingefügt ist, wird keine weitere Seite angefordert.
+    def _laden(self, schluessel, rueckwaerts, einfuegen):
+        self._laedt = True
+
+        def fertig(zeilen):
+            self._laedt = False
+            einfuegen(zeilen)
+
+        if self.aufgaben is None:
+            fertig(self.seite_laden(schluessel, self.seitengroesse, rueckwaerts))
+        else:
+            self.aufgaben.starten(self.seite_laden, schluessel, self.seitengroesse, rueckwaerts,
+                                  fertig=fertig, fehler=self._ladefehler, schluessel=self)
+
+    def _ladefehler(self, fehler):
+        self._laedt = False
+        self._am_anfang = self._am_ende = True
+        if self.fehler:
+            self.fehler(fehler)
+
+    def _naechste_seite(self):
+        schluessel = self._schluessel[self._seiten[-1][-1]] if self._seiten else None
+        self._laden(schluessel, False, self._naechste_seite_einfuegen)
+
+    def _naechste_seite_einfuegen(self, zeilen):
+        if len(zeilen) < self.seitengroesse:
+            self._am_ende = True
+        if not zeilen:
+            return
+
+        erste_zeile, anzahl_vorher = self.yview()[0], len(self._schluessel)
+        self._seiten.append(self._zeilen_einfuegen(zeilen, "end"))
+        entfernt = 0
+        if len(self._seiten) > self.max_seiten:
+            seite = self._seiten.popleft()
+            self._seite_entfernen(seite)
+            entfernt = len(seite)
+            self._am_anfang = False
+        if entfernt:
+            self._ansicht_halten(erste_zeile, anzahl_vorher, -entfernt)
+
+    def _vorherige_seite(self):
+        if self._am_anfang or not self._seiten:
+            return
+        self._laden(self._schluessel[self._seiten[0][0]], True, self._vorherige_seite_einfuegen)
+
+    def _vorherige_seite_einfuegen(self, zeilen):
+        if len(zeilen) < self.seitengroesse:
+            self._am_anfang = True
+        if not zeilen:
+            return
+
+        erste_zeile, anzahl_vorher = self.yview()[0], len(self._schluessel)
+        self._seiten.appendleft(self._zeilen_einfuegen(zeilen, 0))
+        if len(self._seiten) > self.max_seiten:
+            self._seite_entfernen(self._seiten.pop())
+            self._am_ende = False
+        self._ansicht_halten(erste_zeile, anzahl_vorher, len(zeilen))
+
+    # yscrollcommand: Scrollbar nachführen und am Rand die nächste Seite vormerken
+    def _gescrollt(self, erster, letzter):
+        self.scrollbar.set(erster, letzter)
+        if self._geplant or self._laedt:
+            return
+        if float(letzter) >= 1 - RAND and not self._am_ende:
+            self._geplant = self.after_idle(self._nachladen, self._naechste_seite)
+        elif float(erster) <= RAND and not self._am_anfang:
+            self._geplant = self.after_idle(self._nachladen, self._vorherige_seite)
+
+    def _nachladen(self, laden):
+        self._geplant = None
+        laden()
+
+    # Gelöschte Zeilen auch aus der Seitenverwaltung entfernen
+    # (wie bei der Treeview auch als Tupel, z. B. direkt aus selection())
+    def delete(self, *items):
+        weg = {iid for item in items for iid in ((item,) if isinstance(item, str) else item)}
+        for seite in self._seiten:
+            seite[:] = [iid for iid in seite if iid not in weg]
+        while self._seiten and not self._seiten[0]:
+            self._seiten.popleft()
+        while self._seiten and not self._seiten[-1]:
+            self._seiten.pop()
+        for iid in weg:
+            self._schluessel.pop(iid, None)
+        super().delete(*weg)
+        if not self._schluessel:
+            self.neu_laden()
@@ -0,0 +1,163 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import strom_betrag
+import strom_repository
+import strom_rollup
+import strom_verbrauch
+
+# Synthetische Testdatenbanken beliebiger Größe für Benchmarks und Lasttests.
+# Je Zähler entstehen ein Kunde, Ablesungen in festem Takt (z. B. alle 15
+# Minuten; tbl_zaehlerstand speichert nur das Datum, es gibt dann 96 Ablesungen
+# je Tag), monatliche Abschläge mit gelegentlichen Sonderzahlungen und ein
+# Tarifverlauf mit jährlichen und einzelnen unterjährigen Preisänderungen.
+# Alle Werte hängen nur von seed und den Größenangaben ab: dieselben Angaben
+# ergeben dieselbe Datenbank.
+
+ABLESUNGEN_JE_TAG = 96
+JAHRE = 10
+ERSTES_JAHR = 2015
+
+
+@dataclass
+class Testdaten:
+    zaehler: int = 0
+    zaehlerstaende: int = 0
+    einzahlungen: int = 0
+    tarife: int = 0
+
+
+# Zufallsgenerator je Zähler, damit jeder Zähler unabhängig von den anderen reproduzierbar ist
+def _zufall(seed, nummer):
+    return random.Random(f"{seed}-{nummer}")
+
+
+# Ablesungen (datum, zaehlerstand) eines Zählers; der Tagesverbrauch schwankt
+# mit der Jahreszeit (Winter etwa doppelt so hoch wie Sommer)
+def _ablesungen(zufall, anfang, tage, je_tag):
+    stand = round(zufall.uniform(0, 50_000), 3)
+    grundlast = zufall.uniform(4, 12)
+    for tag_nummer in range(tage):
+        tag = anfang + timedelta(days=tag_nummer)
+        datum = tag.isoformat()
+        jahreszeit = 1 + abs(tag.month - 7) / 6
+        je_ablesung = grundlast * jahreszeit / je_tag
+        for _ in range(je_tag):
+            stand = round(stand + je_ablesung * zufall.uniform(0.2, 1.8), 3)
+            yield datum, stand
+
+
+# Monatliche Abschläge (datum, betrag_cent) am Monatsersten, ab und zu eine Sonderzahlung
+def _einzahlungen(zufall, erstes_jahr, jahre):
+    abschlag = strom_betrag.cent(zufall.choice((50, 60, 70, 80, 90, 100)))
+    for jahr in range(erstes_jahr, erstes_jahr + jahre):
+        if jahr > erstes_jahr and zufall.random() < 0.5:
+            abschlag += strom_betrag.cent(zufall.choice((-10, 5, 10, 15)))
+            abschlag = max(abschlag, strom_betrag.cent(20))
+        for monat in range(1, 13):
+            yield date(jahr, monat, 1).isoformat(), abschlag
+            if zufall.random() < 0.05:
+                sonderzahlung = strom_betrag.cent(zufall.randint(20, 300))
+                yield date(jahr, monat, zufall.randint(2, 28)).isoformat(), sonderzahlung
+
+
+# Tarife (datum_von, datum_bis, grundpreis_cent, kwh_preis) lückenlos je Kalenderjahr;
+# in etwa jedem fünften Jahr ändert sich der Preis zu einem Monatsersten
+def _tarife(zufall, erstes_jahr, jahre):
+    grundpreis = strom_betrag.cent(round(zufall.uniform(8, 14), 2))
+    arbeitspreis = round(zufall.uniform(24, 34), 2)
+    for jahr in range(erstes_jahr, erstes_jahr + jahre):
+        grenzen = [date(jahr, 1, 1)]
+        if zufall.random() < 0.2:
+            grenzen.append(date(jahr, zufall.randint(2, 12), 1))
+        grenzen.append(date(jahr + 1, 1, 1))
+        for von, naechster in zip(grenzen, grenzen[1:]):
+            yield (von.isoformat(), (naechster - timedelta(days=1)).isoformat(),
+                   grundpreis, strom_betrag.preis(arbeitspreis))
+            arbeitspreis = round(arbeitspreis * zufall.uniform(0.97, 1.12), 2)
+        grundpreis += strom_betrag.cent(zufall.choice((0, 0, 0.5, 1)))
+
+
+# Testdatenbank in db_path anlegen (die Datei darf noch nicht existieren).
+# fortschritt(nummer, zaehler) wird nach jedem fertigen Zähler aufgerufen.
+def erzeugen(db_path, zaehler=1, jahre=JAHRE, ablesungen_je_tag=ABLESUNGEN_JE_TAG,
+             erstes_jahr=ERSTES_JAHR, seed=1, fortschritt=None) -> Testdaten:
+    if os.path.exists(db_path):
+        raise FileExistsError(f"Die Datei '{db_path}' existiert bereits.")
+    if zaehler < 1 or jahre < 1 or ablesungen_je_tag < 1:
+        raise ValueError("Zähler, Jahre und Ablesungen je Tag müssen positiv sein.")
+    anfang = date(erstes_jahr, 1, 1)
+    tage = (date(erstes_jahr + jahre, 1, 1) - anfang).days
+
+    def zaehler_schreiben(conn, nummer):
+        zufall = _zufall(seed, nummer)
+        kunde_id = conn.execute(strom_repository.SQL_KUNDE_EINFUEGEN, (f"Testkunde {nummer}",)).lastrowid
+        zaehler_id = conn.execute(strom_repository.SQL_ZAEHLER_EINFUEGEN,
+                                  (kunde_id, f"Testzähler {nummer}")).lastrowid
+        ablesungen = _ablesungen(zufall, anfang, tage, ablesungen_je_tag)
+        staende = conn.executemany(strom_repository.SQL_ZAEHLERSTAND_EINFUEGEN,
+                                   ((zaehler_id, datum, stand) for datum, stand in ablesungen)).rowcount
+        strom_verbrauch.spanne_aktualisieren(conn, zaehler_id, anfang.isoformat(),
+                                             (anfang + timedelta(days=tage - 1)).isoformat())
+        einzahlungen = conn.executemany(strom_repository.SQL_EINZAHLUNG_EINFUEGEN,
+                                        ((zaehler_id,) + zeile
+                                         for zeile in _einzahlungen(zufall, erstes_jahr, jahre))).rowcount
+        tarife = conn.executemany(strom_repository.SQL_BERECHGRUNDL_EINFUEGEN,
+                                  ((zaehler_id,) + zeile for zeile in _tarife(zufall, erstes_jahr, jahre))).rowcount
+        strom_rollup.aktualisieren(conn, zaehler_id, anfang, anfang + timedelta(days=tage - 1))
+        return staende, einzahlungen, tarife
+
+    sqlite3.connect(db_path).close()
+    repo = strom_repository.StromRepository(db_path, pool_groesse=1)
+    ergebnis = Testdaten()
+    try:
+        # Der Standardzähler aus Migration 4 bleibt leer; die Testzähler folgen ihm
+        for nummer in range(1, zaehler + 1):
+            staende, einzahlungen, tarife = repo.schreiben(zaehler_schreiben, nummer)
+            ergebnis.zaehler += 1
+            ergebnis.zaehlerstaende += staende
+            ergebnis.einzahlungen += einzahlungen
+            ergebnis.tarife += tarife
+            if fortschritt:
+                fortschritt(nummer, zaehler)
+    finally:
+        repo.schliessen()
+    return ergebnis
+
+
+# Aufruf: python3 strom_testdaten.py test.db [--zaehler 10] [--jahre 10] [--ablesungen-je-tag 96] [--seed 1]
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reproduzierbare synthetische Testdatenbank erzeugen")
+    parser.add_argument('db', help="Neue Datenbankdatei")
+    parser.add_argument('--zaehler', type=int, default=1)
+    parser.add_argument('--jahre', type=int, default=JAHRE)
+    parser.add_argument('--ablesungen-je-tag', type=int, default=ABLESUNGEN_JE_TAG,
+                        help="96 = alle 15 Minuten")
+    parser.add_argument('--erstes-jahr', type=int, default=ERSTES_JAHR)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    def fortschritt(nummer, zaehler):
+        print(f"\rZähler {nummer} von {zaehler}", end='', file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    try:
+        ergebnis = erzeugen(args.db, args.zaehler, args.jahre, args.ablesungen_je_tag,
+                            args.erstes_jahr, args.seed, fortschritt)
+    except (OSError, ValueError, strom_repository.DatenbankFehler) as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(file=sys.stderr)
+    print(f"{ergebnis.zaehler} Zähler, {ergebnis.zaehlerstaende} Zählerstände, {ergebnis.einzahlungen} Einzahlungen, "
+          f"{ergebnis.tarife} Tarife in {time.perf_counter() - start:.1f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
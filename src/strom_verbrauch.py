@@ -0,0 +1,56 @@
+from datetime import date
+from itertools import groupby
+
+import strom_messung
+
+# Pflege von tbl_verbrauch_tag: linear interpolierter Verbrauch je Zähler und
+# Kalendertag. Jeder Tag d zwischen zwei aufeinanderfolgenden Ablesetagen
+# t0 <= d < t1 eines Zählers erhält (stand1 - stand0) / (t1 - t0). Bei mehreren
+# Ablesungen an einem Tag zählt der höchste Stand. Ändert sich eine Ablesung,
+# wird nur die Spanne zwischen den benachbarten Ablesetagen neu berechnet.
+
+SQL_VORHERIGER_TAG = 'SELECT MAX(datum) FROM tbl_zaehlerstand WHERE zaehler_id = ? AND datum < ?'
+SQL_NAECHSTER_TAG = 'SELECT MIN(datum) FROM tbl_zaehlerstand WHERE zaehler_id = ? AND datum > ?'
+SQL_STAENDE_JE_TAG = '''
+    SELECT datum, MAX(zaehlerstand) FROM tbl_zaehlerstand
+    WHERE zaehler_id = ? AND datum BETWEEN ? AND ? GROUP BY datum ORDER BY datum
+'''
+SQL_ALLE_STAENDE_JE_TAG = '''
+    SELECT zaehler_id, datum, MAX(zaehlerstand) FROM tbl_zaehlerstand
+    GROUP BY zaehler_id, datum ORDER BY zaehler_id, datum
+'''
+SQL_TAGE_LOESCHEN = 'DELETE FROM tbl_verbrauch_tag WHERE zaehler_id = ? AND datum >= ? AND datum < ?'
+SQL_TAG_EINFUEGEN = 'INSERT INTO tbl_verbrauch_tag (zaehler_id, datum, verbrauch) VALUES (?, ?, ?)'
+
+
+# (zaehler_id, datum, verbrauch) für jeden Tag zwischen aufeinanderfolgenden Ablesetagen
+def _tageswerte(zaehler_id, staende):
+    for (datum0, stand0), (datum1, stand1) in zip(staende, staende[1:]):
+        tag0 = date.fromisoformat(datum0).toordinal()
+        tag1 = date.fromisoformat(datum1).toordinal()
+        pro_tag = (stand1 - stand0) / (tag1 - tag0)
+        for tag in range(tag0, tag1):
+            yield zaehler_id, date.fromordinal(tag).isoformat(), pro_tag
+
+
+# Tageswerte eines Zählers nach einer Änderung von Ablesungen zwischen von_datum
+# und bis_datum (YYYY-MM-DD) neu berechnen; muss in der Transaktion der Änderung laufen.
+# Liefert die neu berechnete Spanne (anfang, ende) zwischen den Nachbar-Ablesetagen.
+@strom_messung.gemessen('verbrauch.spanne_aktualisieren')
+def spanne_aktualisieren(conn, zaehler_id, von_datum, bis_datum=None):
+    bis_datum = bis_datum or von_datum
+    anfang = conn.execute(SQL_VORHERIGER_TAG, (zaehler_id, von_datum)).fetchone()[0] or von_datum
+    ende = conn.execute(SQL_NAECHSTER_TAG, (zaehler_id, bis_datum)).fetchone()[0] or bis_datum
+    conn.execute(SQL_TAGE_LOESCHEN, (zaehler_id, anfang, ende))
+    staende = conn.execute(SQL_STAENDE_JE_TAG, (zaehler_id, anfang, ende)).fetchall()
+    conn.executemany(SQL_TAG_EINFUEGEN, _tageswerte(zaehler_id, staende))
+    return anfang, ende
+
+
+# Tabelle für alle Zähler vollständig aus tbl_zaehlerstand aufbauen
+def neu_aufbauen(conn):
+    conn.execute('DELETE FROM tbl_verbrauch_tag')
+    zeilen = conn.execute(SQL_ALLE_STAENDE_JE_TAG)
+    for zaehler_id, gruppe in groupby(zeilen, key=lambda z: z[0]):
+        staende = [(datum, stand) for _, datum, stand in gruppe]
+        conn.executemany(SQL_TAG_EINFUEGEN, _tageswerte(zaehler_id, staende))
@@ -0,0 +1,414 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from datetime import date, datetime
+
+import numpy as np
+
+import strom_archiv
+import strom_repository
+
+# Spaltenweiser Speicher für die Historie der Zähler im Arbeitsspeicher. Je
+# Zähler liegen Ablesetage (int32, Tage seit 1970-01-01) und Stände (float64)
+# sowie Zahlungstage und Beträge (int64 Cent) in eigenen NumPy-Arrays: 12 Byte
+# je Zeile statt rund 150 Byte für ein Tupel aus fetchall(). Neue Zeilen
+# werden nur angehängt (in zeitlicher Reihenfolge), Zeiträume per binärer Suche
+# als Sichten ohne Kopie herausgeschnitten. Ein Abbild lässt sich in eine Datei
+# schreiben und per Memory-Mapping wieder öffnen, ohne die Daten einzulesen.
+#
+# Verlaufsspeicher bietet dieselben Methoden wie StromRepository, die der
+# Rechenkern in strom_abrechnung braucht, und kann ihm als Quelle dienen; der
+# Tagesverbrauch wird dabei wie in strom_verbrauch zwischen den Ablesetagen
+# interpoliert. Die Zeitreihen für strom_analyse liefert zaehlerstaende().
+
+# Kennung und Ausrichtung der Spalten in der Abbild-Datei
+KENNUNG = b'STROMVL1'
+AUSRICHTUNG = 64
+
+# Spalten je Zähler mit festem Typ (little endian wie in der Datei)
+SPALTEN = {
+    'ablese_tage': '<i4',
+    'staende': '<f8',
+    'zahlungs_tage': '<i4',
+    'betraege': '<i8',
+}
+
+# Kleinste Kapazität einer wachsenden Spalte
+MIN_KAPAZITAET = 256
+
+ERSTER_TAG = date(1, 1, 1).toordinal() - date(1970, 1, 1).toordinal()
+LETZTER_TAG = date(9999, 12, 31).toordinal() - date(1970, 1, 1).toordinal()
+_EPOCHE = date(1970, 1, 1).toordinal()
+
+
+class VerlaufFehler(Exception):
+    pass
+
+
+# Datum (date, datetime oder ISO-Text) als Tag seit 1970-01-01
+def tag(datum) -> int:
+    if isinstance(datum, datetime):
+        datum = datum.date()
+    if not isinstance(datum, date):
+        datum = date.fromisoformat(strom_repository.datum_text(datum))
+    return datum.toordinal() - _EPOCHE
+
+
+# Tage als int-Array: Zahlen bleiben, datetime64, date und ISO-Text werden umgerechnet
+def _tage(werte):
+    werte = np.atleast_1d(np.asarray(werte))
+    if werte.dtype.kind in 'iu':
+        return werte.astype(np.int64)
+    if werte.dtype.kind != 'M':
+        werte = werte.astype('datetime64[D]')
+    return werte.astype('datetime64[D]').astype(np.int64)
+
+
+def _texte(tage):
+    return np.asarray(tage, dtype=np.int64).astype('datetime64[D]').astype(str).tolist()
+
+
+def _aufrunden(wert):
+    return -(-wert // AUSRICHTUNG) * AUSRICHTUNG
+
+
+# Wachsende Spalte fester Länge je Eintrag. Die Kapazität verdoppelt sich beim
+# Anhängen; bereits ausgegebene Sichten bleiben gültig, weil vorhandene Werte
+# nie überschrieben werden. Eine nur lesbare Spalte (Memory-Mapping) wird beim
+# ersten Anhängen in den Arbeitsspeicher kopiert.
+class Spalte:
+    def __init__(self, dtype, daten=None):
+        self.dtype = np.dtype(dtype)
+        self._daten = np.empty(0, self.dtype) if daten is None else daten
+        self._laenge = len(self._daten)
+
+    def __len__(self):
+        return self._laenge
+
+    # Alle Werte als Sicht ohne Kopie
+    @property
+    def werte(self) -> np.ndarray:
+        return self._daten[:self._laenge]
+
+    @property
+    def nbytes(self) -> int:
+        return self._daten.nbytes
+
+    def anhaengen(self, werte) -> None:
+        werte = np.asarray(werte, dtype=self.dtype)
+        neu = self._laenge + len(werte)
+        if neu > len(self._daten) or not self._daten.flags.writeable:
+            daten = np.empty(max(neu, 2 * len(self._daten), MIN_KAPAZITAET), self.dtype)
+            daten[:self._laenge] = self.werte
+            self._daten = daten
+        self._daten[self._laenge:neu] = werte
+        self._laenge = neu
+
+    # Ungenutzte Kapazität freigeben
+    def kompaktieren(self) -> None:
+        if len(self._daten) > self._laenge and self._daten.flags.writeable:
+            self._daten = self.werte.copy()
+
+
+# Historie eines Zählers: Ablesungen, Einzahlungen und Tarife (als Zeilen wie
+# in tbl_berechgrundl; die sind wenige und bleiben Python-Objekte)
+class Zaehlerverlauf:
+    def __init__(self, tarife=(), spalten=None):
+        spalten = spalten or {}
+        self.spalten = {name: Spalte(dtype, spalten.get(name)) for name, dtype in SPALTEN.items()}
+        self.tarife = [tuple(zeile) for zeile in tarife]
+        self._tagesstaende = None
+        self._zahlungssummen = None
+
+    @property
+    def anzahl_ablesungen(self) -> int:
+        return len(self.spalten['ablese_tage'])
+
+    @property
+    def anzahl_einzahlungen(self) -> int:
+        return len(self.spalten['zahlungs_tage'])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(spalte.nbytes for spalte in self.spalten.values())
+
+    @staticmethod
+    def _anhaengen(tage_spalte, werte_spalte, tage, werte):
+        tage = _tage(tage)
+        werte = np.atleast_1d(np.asarray(werte, dtype=werte_spalte.dtype))
+        if len(tage) != len(werte):
+            raise VerlaufFehler(f"{len(tage)} Tage, aber {len(werte)} Werte.")
+        if not len(tage):
+            return
+        if tage.min() < ERSTER_TAG or tage.max() > LETZTER_TAG:
+            raise VerlaufFehler("Datum außerhalb von 0001-01-01 bis 9999-12-31.")
+        bisher = tage_spalte.werte
+        if np.any(tage[1:] < tage[:-1]) or (len(bisher) and tage[0] < bisher[-1]):
+            raise VerlaufFehler("Zeilen lassen sich nur in zeitlicher Reihenfolge anhängen.")
+        tage_spalte.anhaengen(tage)
+        werte_spalte.anhaengen(werte)
+
+    # Ablesungen anhängen; Tage als Zahlen seit 1970-01-01, datetime64, date oder ISO-Text
+    def zaehlerstaende_anhaengen(self, tage, staende) -> None:
+        self._anhaengen(self.spalten['ablese_tage'], self.spalten['staende'], tage, staende)
+        self._tagesstaende = None
+
+    def einzahlungen_anhaengen(self, tage, betraege_cent) -> None:
+        self._anhaengen(self.spalten['zahlungs_tage'], self.spalten['betraege'], tage, betraege_cent)
+        self._zahlungssummen = None
+
+    def kompaktieren(self) -> None:
+        for spalte in self.spalten.values():
+            spalte.kompaktieren()
+
+    @staticmethod
+    def _bereich(tage, von_tag, bis_tag):
+        return np.searchsorted(tage, von_tag, 'left'), np.searchsorted(tage, bis_tag, 'right')
+
+    # (tage, staende) der Ablesungen von_tag..bis_tag (inklusive) als Sichten ohne Kopie
+    def zaehlerstaende(self, von_tag=ERSTER_TAG, bis_tag=LETZTER_TAG):
+        tage = self.spalten['ablese_tage'].werte
+        anfang, ende = self._bereich(tage, von_tag, bis_tag)
+        return tage[anfang:ende], self.spalten['staende'].werte[anfang:ende]
+
+    def einzahlungen(self, von_tag=ERSTER_TAG, bis_tag=LETZTER_TAG):
+        tage = self.spalten['zahlungs_tage'].werte
+        anfang, ende = self._bereich(tage, von_tag, bis_tag)
+        return tage[anfang:ende], self.spalten['betraege'].werte[anfang:ende]
+
+    # Ablesetage mit dem höchsten Stand je Tag, Grundlage der Interpolation
+    def tagesstaende(self):
+        if self._tagesstaende is None:
+            tage = self.spalten['ablese_tage'].werte
+            staende = self.spalten['staende'].werte
+            if len(tage):
+                anfaenge = np.flatnonzero(np.concatenate(([True], tage[1:] != tage[:-1])))
+                self._tagesstaende = (tage[anfaenge].astype(np.int64), np.maximum.reduceat(staende, anfaenge))
+            else:
+                self._tagesstaende = (np.empty(0, np.int64), np.empty(0, np.float64))
+        return self._tagesstaende
+
+    # Interpolierter Stand zu Beginn der Tage; vor der ersten und nach der
+    # letzten Ablesung bleibt er stehen, dort fällt also kein Verbrauch an
+    def stand_am(self, tage):
+        ablese_tage, staende = self.tagesstaende()
+        if len(ablese_tage) == 0:
+            return np.zeros(np.shape(tage))
+        return np.interp(tage, ablese_tage, staende)
+
+    # Verbrauch der Tage von_tag (inklusive) bis bis_tag (exklusive)
+    def verbrauch_zwischen(self, von_tag, bis_tag) -> float:
+        if bis_tag <= von_tag:
+            return 0.0
+        anfang, ende = self.stand_am([von_tag, bis_tag])
+        return float(ende - anfang)
+
+    # (tage, verbrauch) je Tag mit Verbrauch in [von_tag, bis_tag)
+    def verbrauch_tage(self, von_tag, bis_tag):
+        ablese_tage, _ = self.tagesstaende()
+        if len(ablese_tage) < 2:
+            return np.empty(0, np.int64), np.empty(0, np.float64)
+        anfang = max(von_tag, int(ablese_tage[0]))
+        ende = min(bis_tag, int(ablese_tage[-1]))
+        achse = np.arange(anfang, max(anfang, ende) + 1, dtype=np.int64)
+        return achse[:-1], np.diff(self.stand_am(achse))
+
+    # Summe der Einzahlungen von_tag..bis_tag (inklusive) über Präfixsummen
+    def summe_einzahlungen(self, von_tag, bis_tag) -> int:
+        tage = self.spalten['zahlungs_tage'].werte
+        if self._zahlungssummen is None:
+            self._zahlungssummen = np.concatenate(([0], np.cumsum(self.spalten['betraege'].werte, dtype=np.int64)))
+        anfang, ende = self._bereich(tage, von_tag, bis_tag)
+        return int(self._zahlungssummen[ende] - self._zahlungssummen[anfang]) if ende > anfang else 0
+
+
+# Verläufe mehrerer Zähler; Quelle für strom_abrechnung wie StromRepository
+class Verlaufsspeicher:
+    def __init__(self, zaehler=None):
+        self.zaehler = dict(zaehler or {})
+        self._abbild = None
+
+    def verlauf(self, zaehler_id) -> Zaehlerverlauf:
+        try:
+            return self.zaehler[zaehler_id]
+        except KeyError:
+            raise VerlaufFehler(f"Zähler {zaehler_id} ist nicht im Speicher.") from None
+
+    def anlegen(self, zaehler_id, tarife=()) -> Zaehlerverlauf:
+        verlauf = self.zaehler.get(zaehler_id)
+        if verlauf is None:
+            verlauf = self.zaehler[zaehler_id] = Zaehlerverlauf(tarife)
+        return verlauf
+
+    @property
+    def nbytes(self) -> int:
+        return sum(verlauf.nbytes for verlauf in self.zaehler.values())
+
+    # (tage, staende) eines Zählers als Sichten; passt zu strom_analyse.zeitreihe
+    def zaehlerstaende(self, von_datum=None, bis_datum=None, zaehler_id=strom_repository.STANDARD_ZAEHLER):
+        return self.verlauf(zaehler_id).zaehlerstaende(
+            ERSTER_TAG if von_datum is None else tag(von_datum),
+            LETZTER_TAG if bis_datum is None else tag(bis_datum))
+
+    # --- Schnittstelle des Rechenkerns (siehe StromRepository) ---
+
+    def berechgrundl_daten(self, zaehler_id=strom_repository.STANDARD_ZAEHLER) -> list:
+        return list(self.verlauf(zaehler_id).tarife)
+
+    def berechgrundl_alle_zaehler(self) -> list:
+        return [(zaehler_id,) + zeile for zaehler_id in sorted(self.zaehler)
+                for zeile in self.zaehler[zaehler_id].tarife]
+
+    def verbrauch_zwischen(self, von_datum, bis_datum, zaehler_id=strom_repository.STANDARD_ZAEHLER) -> float:
+        return self.verlauf(zaehler_id).verbrauch_zwischen(tag(von_datum), tag(bis_datum))
+
+    def verbrauch_tage(self, von_datum, bis_datum, zaehler_id=strom_repository.STANDARD_ZAEHLER) -> list:
+        tage, verbrauch = self.verlauf(zaehler_id).verbrauch_tage(tag(von_datum), tag(bis_datum))
+        return list(zip(_texte(tage), verbrauch.tolist()))
+
+    def verbrauch_abschnitte(self, abschnitte) -> list:
+        return [self.verbrauch_zwischen(von, bis, zaehler_id) for zaehler_id, von, bis in abschnitte]
+
+    def summe_einzahlungen(self, von_datum, bis_datum, zaehler_id=strom_repository.STANDARD_ZAEHLER) -> int:
+        return self.verlauf(zaehler_id).summe_einzahlungen(tag(von_datum), tag(bis_datum))
+
+    def summe_einzahlungen_je_zaehler(self, von_datum, bis_datum) -> dict:
+        von_tag, bis_tag = tag(von_datum), tag(bis_datum)
+        return {zaehler_id: verlauf.summe_einzahlungen(von_tag, bis_tag)
+                for zaehler_id, verlauf in self.zaehler.items()}
+
+    # Zeilen wie in der Datenbank; die id wird im Speicher nicht geführt (None)
+    def einzahlungen_zwischen_daten(self, von_datum, bis_datum, zaehler_id=strom_repository.STANDARD_ZAEHLER) -> list:
+        tage, betraege = self.verlauf(zaehler_id).einzahlungen(tag(von_datum), tag(bis_datum))
+        return [(None, datum, betrag) for datum, betrag in zip(_texte(tage), betraege.tolist())]
+
+    # --- Laden und Abbild ---
+
+    # Verläufe der Zähler (alle, wenn zaehler_ids fehlt) aus der Datenbank laden,
+    # archivierte Zeilen (strom_archiv) eingeschlossen. Die Zeilen fließen direkt
+    # vom Cursor in die Arrays, ohne Tupel-Liste.
+    @classmethod
+    def laden(cls, repo, zaehler_ids=None):
+        if zaehler_ids is None:
+            zaehler_ids = [zaehler_id for zaehler_id, _, _ in repo.zaehler_daten()]
+        speicher = cls()
+        with repo.lesetransaktion() as conn:
+            for zaehler_id in zaehler_ids:
+                stichtag = strom_archiv.stichtag_lesen(conn, zaehler_id)
+                parameter = (zaehler_id, '0001-01-01', '9999-12-31')
+                staende = np.fromiter(conn.execute(strom_repository.SQL_ZAEHLERSTAENDE_TAGE, parameter),
+                                      dtype=[('tag', '<i4'), ('wert', '<f8')])
+                zahlungen = np.fromiter(conn.execute(strom_repository.SQL_EINZAHLUNGEN_TAGE, parameter),
+                                        dtype=[('tag', '<i4'), ('wert', '<i8')])
+                tarife = conn.execute(strom_repository.SQL_BERECHGRUNDL_ALLE, (zaehler_id,)).fetchall()
+                verlauf = speicher.zaehler[zaehler_id] = Zaehlerverlauf(tarife)
+                if stichtag is not None:
+                    _, tage, werte = repo.archiv.zaehlerstaende(zaehler_id, stichtag)
+                    verlauf.zaehlerstaende_anhaengen(tage, werte)
+                    _, tage, werte = repo.archiv.einzahlungen(zaehler_id, stichtag)
+                    verlauf.einzahlungen_anhaengen(tage, werte)
+                verlauf.zaehlerstaende_anhaengen(staende['tag'], staende['wert'])
+                verlauf.einzahlungen_anhaengen(zahlungen['tag'], zahlungen['wert'])
+                verlauf.kompaktieren()
+        return speicher
+
+    # Abbild schreiben: Kennung, Länge des JSON-Kopfs (uint64), Kopf, danach die
+    # Spalten aller Zähler, jede auf AUSRICHTUNG Byte ausgerichtet. Die Datei wird
+    # erst fertig geschrieben und dann an ihren Platz verschoben.
+    def speichern(self, pfad) -> None:
+        kopf = {'version': 1, 'zaehler': {}}
+        spalten = []
+        position = 0
+        for zaehler_id in sorted(self.zaehler):
+            verlauf = self.zaehler[zaehler_id]
+            eintrag = {'tarife': [list(zeile) for zeile in verlauf.tarife], 'spalten': {}}
+            for name, spalte in verlauf.spalten.items():
+                position = _aufrunden(position)
+                eintrag['spalten'][name] = [position, len(spalte)]
+                spalten.append((position, spalte.werte))
+                position += spalte.werte.nbytes
+            kopf['zaehler'][str(zaehler_id)] = eintrag
+        kopf_bytes = json.dumps(kopf).encode('utf-8')
+        daten_start = _aufrunden(len(KENNUNG) + 8 + len(kopf_bytes))
+        groesse = daten_start + position
+
+        temp = f"{pfad}.tmp"
+        with open(temp, 'wb') as datei:
+            datei.write(KENNUNG + struct.pack('<Q', len(kopf_bytes)) + kopf_bytes)
+            for position, werte in spalten:
+                datei.seek(daten_start + position)
+                datei.write(np.ascontiguousarray(werte).tobytes())
+            datei.truncate(groesse)
+            datei.flush()
+            os.fsync(datei.fileno())
+        os.replace(temp, pfad)
+
+    # Abbild per Memory-Mapping öffnen: die Spalten sind Sichten auf die Datei und
+    # werden erst beim Zugriff vom Betriebssystem eingelesen. Angehängt werden kann
+    # trotzdem; die betroffene Spalte wird dann in den Arbeitsspeicher kopiert.
+    @classmethod
+    def oeffnen(cls, pfad):
+        with open(pfad, 'rb') as datei:
+            if datei.read(len(KENNUNG)) != KENNUNG:
+                raise VerlaufFehler(f"'{pfad}' ist kein Abbild eines Verlaufsspeichers.")
+            laenge, = struct.unpack('<Q', datei.read(8))
+            try:
+                kopf = json.loads(datei.read(laenge).decode('utf-8'))
+            except ValueError as e:
+                raise VerlaufFehler(f"Kopf von '{pfad}' ist beschädigt: {e}") from None
+        daten_start = _aufrunden(len(KENNUNG) + 8 + laenge)
+        abbild = np.memmap(pfad, dtype=np.uint8, mode='r') if os.path.getsize(pfad) > daten_start else None
+
+        speicher = cls()
+        for zaehler_id, eintrag in kopf['zaehler'].items():
+            spalten = {}
+            for name, (position, anzahl) in eintrag['spalten'].items():
+                dtype = np.dtype(SPALTEN[name])
+                anfang = daten_start + position
+                if anzahl == 0:
+                    spalten[name] = np.empty(0, dtype)
+                    continue
+                if abbild is None or anfang + anzahl * dtype.itemsize > len(abbild):
+                    raise VerlaufFehler(f"'{pfad}' ist unvollständig.")
+                spalten[name] = abbild[anfang:anfang + anzahl * dtype.itemsize].view(dtype)
+            speicher.zaehler[int(zaehler_id)] = Zaehlerverlauf(eintrag['tarife'], spalten)
+        speicher._abbild = abbild
+        return speicher
+
+
+# Aufruf: python3 strom_verlauf.py abbild.strom [--db pfad] [--zaehler 1 2]
+# schreibt ein Abbild der Datenbank und gibt Zeilen und Speicherbedarf aus
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Abbild der Zählerhistorie für die Auswertung im Speicher")
+    parser.add_argument('abbild', help="Zieldatei des Abbilds")
+    parser.add_argument('--db', default=strom_repository.DB_PATH)
+    parser.add_argument('--zaehler', type=int, nargs='*', help="nur diese Zähler (Standard: alle)")
+    args = parser.parse_args(argv)
+
+    try:
+        repo = strom_repository.get_repository(args.db)
+    except strom_repository.DatenbankFehler as e:
+        print(e, file=sys.stderr)
+        return 1
+    try:
+        start = time.perf_counter()
+        speicher = Verlaufsspeicher.laden(repo, args.zaehler)
+        geladen = time.perf_counter() - start
+        speicher.speichern(args.abbild)
+    except (OSError, VerlaufFehler) as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        repo.schliessen()
+
+    zeilen = sum(v.anzahl_ablesungen + v.anzahl_einzahlungen for v in speicher.zaehler.values())
+    print(f"{len(speicher.zaehler)} Zähler, {zeilen} Zeilen in {geladen:.3f} s geladen, "
+          f"{speicher.nbytes / max(zeilen, 1):.1f} Byte je Zeile, Abbild {os.path.getsize(args.abbild)} Byte")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
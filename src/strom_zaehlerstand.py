@@ -1,4 +1,3 @@
-import sqlite3
 import tkinter as tk
 from tkinter import messagebox
 from tkinter import ttk
@@ -6,66 +5,41 @@ from datetime import datetime
 import os
 import logging
 
+import strom_aufgaben
+import strom_log
+import strom_repository
+import strom_tabelle
+
 # Setze das Arbeitsverzeichnis auf das Verzeichnis des Skripts
 script_dir = os.path.dirname(os.path.abspath(__file__))
 os.chdir(script_dir)
 
 # Logging einrichten
-logging.basicConfig(filename='/tmp/zaehlerstand_app.log', level=logging.DEBUG)
+strom_log.einrichten()
 
 
-def get_db_connection():
-    db_path = 'meine_datenbank.db'
-    if not os.path.exists(db_path):
-        logging.error(f"Die Datenbank '{db_path}' existiert nicht.")
-        messagebox.showerror("Datenbankfehler", f"Die Datenbank '{db_path}' wurde nicht gefunden.")
-        return None
+def get_repository():
     try:
-        return sqlite3.connect(db_path)
-    except sqlite3.Error as e:
+        return strom_repository.get_repository()
+    except strom_repository.DatenbankNichtGefunden:
+        logging.error(f"Die Datenbank '{strom_repository.DB_PATH}' existiert nicht.")
+        messagebox.showerror("Datenbankfehler", f"Die Datenbank '{strom_repository.DB_NAME}' wurde nicht gefunden.")
+        return None
+    except strom_repository.DatenbankFehler as e:
         logging.error(f"Fehler beim Verbinden mit der Datenbank: {e}")
         messagebox.showerror("Datenbankfehler", "Fehler beim Verbinden mit der Datenbank.")
         return None
 
 
-def get_zaehlerstaende_zwischen_daten(von_datum, bis_datum):
-    conn = get_db_connection()
-    if conn is None:
-        return []
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT rowid, datum, zaehlerstand FROM tbl_zaehlerstand
-        WHERE datum BETWEEN ? AND ? ORDER BY datum
-    ''', (von_datum, bis_datum))
-    result = cursor.fetchall()
-    conn.close()
-    return result
-
-
-def insert_zaehlerstand(datum, zaehlerstand):
-    conn = get_db_connection()
-    if conn is None:
-        return
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO tbl_zaehlerstand (datum, zaehlerstand) VALUES (?, ?)', (datum, zaehlerstand))
-    conn.commit()
-    conn.close()
-
-
-def delete_zaehlerstand_from_db(rowid):
-    conn = get_db_connection()
-    if conn is None:
-        return False
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM tbl_zaehlerstand WHERE rowid = ?', (rowid,))
-    conn.commit()
-    conn.close()
-    return True
-
-
-class ZaehlerstandApp(tk.Tk):
-    def __init__(self):
-        super().__init__()
+# Fehler einer Datenbankabfrage im Hintergrund melden
+def db_fehler(fehler):
+    logging.error(f"Fehler bei der Datenbankabfrage: {fehler}")
+    messagebox.showerror("Datenbankfehler", "Es gab einen Fehler bei der Datenbankabfrage.")
+
+
+class ZaehlerstandApp(tk.Toplevel):
+    def __init__(self, master=None):
+        super().__init__(master)
         self.title("Zählerstand Eingabe")
         self.geometry("600x400")
 
@@ -102,49 +76,86 @@ class ZaehlerstandApp(tk.Tk):
                                        command=self.open_zaehlerstand_fenster)
         self.update_button.pack(pady=5)
 
+        # Läuft, solange Datenbankzugriffe im Hintergrund laufen
+        self.fortschritt = ttk.Progressbar(self.layout, mode="indeterminate")
+        self.fortschritt.pack(fill=tk.X, pady=5)
+        self.aufgaben = strom_aufgaben.Aufgaben(self, self.fortschritt)
+
     def save_zaehlerstand(self):
         datum = self.datum_input.get()
         zaehlerstand_input = self.zaehlerstand_input.get()
         try:
             datetime.strptime(datum, "%Y-%m-%d")
             zaehlerstand = float(zaehlerstand_input)
-            insert_zaehlerstand(datum, zaehlerstand)
+            if zaehlerstand < 0:
+                raise ValueError("Der Zählerstand darf nicht negativ sein.")
+        except ValueError:
+            messagebox.showerror("Ungültige Eingabe", "Bitte korrektes Datum und eine Zahl eingeben.")
+            return
+        repo = get_repository()
+        if repo is None:
+            return
+
+        def gespeichert(_):
             self.datum_input.delete(0, tk.END)
             self.zaehlerstand_input.delete(0, tk.END)
             self.open_zaehlerstand_fenster()
-        except ValueError:
-            messagebox.showerror("Ungültige Eingabe", "Bitte korrektes Datum und eine Zahl eingeben.")
+
+        self.aufgaben.starten(repo.insert_zaehlerstand, datum, zaehlerstand, fertig=gespeichert, fehler=db_fehler)
 
     def open_zaehlerstand_fenster(self):
+        von_datum = self.von_datum_input.get()
+        bis_datum = self.bis_datum_input.get()
+        try:
+            datetime.strptime(von_datum, "%Y-%m-%d")
+            datetime.strptime(bis_datum, "%Y-%m-%d")
+        except ValueError:
+            messagebox.showerror("Ungültige Eingabe", "Bitte geben Sie gültige Daten im Format (YYYY-MM-DD) ein.")
+            return
+        repo = get_repository()
+        if repo is None:
+            return
+
         zaehlerstand_fenster = tk.Toplevel(self)
         zaehlerstand_fenster.title("Zählerstände im Zeitraum")
         zaehlerstand_fenster.geometry("600x400")
 
-        von_datum = self.von_datum_input.get()
-        bis_datum = self.bis_datum_input.get()
-
         frame = tk.Frame(zaehlerstand_fenster)
         frame.pack(padx=20, pady=20)
 
-        table = ttk.Treeview(frame, columns=("ID", "Datum", "Zählerstand"), show="headings")
+        fortschritt = ttk.Progressbar(frame, mode="indeterminate")
+        fortschritt.pack(fill=tk.X)
+        aufgaben = strom_aufgaben.Aufgaben(zaehlerstand_fenster, fortschritt)
+
+        # Die Zählerstände werden beim Scrollen seitenweise im Hintergrund nachgeladen
+        tabelle_frame = tk.Frame(frame)
+        tabelle_frame.pack(fill=tk.BOTH, expand=True)
+        table = strom_tabelle.BlaetterTabelle(
+            tabelle_frame,
+            lambda schluessel, anzahl, rueckwaerts: repo.zaehlerstaende_seite(
+                von_datum, bis_datum, schluessel, anzahl, rueckwaerts),
+            aufgaben=aufgaben, fehler=db_fehler,
+            columns=("ID", "Datum", "Zählerstand"), show="headings")
         table.heading("ID", text="ID")
         table.heading("Datum", text="Datum")
         table.heading("Zählerstand", text="Zählerstand (kWh)")
-        table.pack(fill=tk.BOTH, expand=True)
-
-        zaehlerstaende = get_zaehlerstaende_zwischen_daten(von_datum, bis_datum)
-        for rowid, datum, zaehlerstand in zaehlerstaende:
-            table.insert("", "end", values=(rowid, datum, zaehlerstand))
+        table.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        table.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
         def delete_zaehlerstand():
             selected_item = table.selection()
             if selected_item:
                 rowid = table.item(selected_item[0])["values"][0]
-                if delete_zaehlerstand_from_db(rowid):
-                    table.delete(selected_item)
-                    messagebox.showinfo("Erfolg", "Zählerstand erfolgreich gelöscht.")
-                else:
-                    messagebox.showerror("Fehler", "Löschen fehlgeschlagen.")
+
+                def geloescht(erfolg):
+                    if erfolg:
+                        if table.exists(selected_item[0]):
+                            table.delete(selected_item)
+                        messagebox.showinfo("Erfolg", "Zählerstand erfolgreich gelöscht.")
+                    else:
+                        messagebox.showerror("Fehler", "Löschen fehlgeschlagen.")
+
+                aufgaben.starten(repo.delete_zaehlerstand, rowid, fertig=geloescht, fehler=db_fehler)
 
         delete_button = tk.Button(frame, text="Löschen", command=delete_zaehlerstand)
         delete_button.pack(pady=5)
@@ -153,19 +164,14 @@ class ZaehlerstandApp(tk.Tk):
 
 
 def main():
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tbl_zaehlerstand (
-                datum DATE,
-                zaehlerstand REAL
-            )
-        ''')
-        conn.commit()
-        conn.close()
-    app = ZaehlerstandApp()
-    app.mainloop()
+    # Beim Öffnen des Repositorys wird das Datenbankschema bei Bedarf migriert
+    get_repository()
+    # Alleinstehend ersetzt das Fenster das (verborgene) Hauptfenster
+    root = tk.Tk()
+    root.withdraw()
+    app = ZaehlerstandApp(root)
+    app.protocol("WM_DELETE_WINDOW", root.destroy)
+    root.mainloop()
 
 
 if __name__ == '__main__':
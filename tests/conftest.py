@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# Die Module liegen flach in src/ und importieren sich gegenseitig über ihren Namen
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+import strom_repository  # noqa: E402
+
+
+# Repositories auf Dateien im temporären Verzeichnis öffnen; nach dem Test werden
+# sie geschlossen und aus dem prozessweiten Register entfernt
+@pytest.fixture
+def repository_oeffnen():
+    geoeffnet = []
+
+    def oeffnen(db_path):
+        repo = strom_repository.datenbank_erstellen(str(db_path))
+        geoeffnet.append(repo)
+        return repo
+
+    yield oeffnen
+    for repo in geoeffnet:
+        repo.schliessen()
+        strom_repository._repositories.pop(os.path.abspath(repo.db_path), None)
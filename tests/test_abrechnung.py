@@ -0,0 +1,200 @@
+import calendar
+import math
+from datetime import date, timedelta
+from fractions import Fraction
+
+import pytest
+
+import strom_abrechnung
+import strom_betrag
+import strom_db
+import strom_repository
+
+# Regressionstests der Abrechnungsengine auf den Beispiel-Daten aus strom_db.
+#
+# ALTE_ERGEBNISSE sind die Ausgaben der ursprünglichen Berechnung in
+# strom_berechnung (Stand vor den Änderungen): Verbrauch = letzte minus erste
+# Ablesung bis zum Enddatum, ein Tarif am Enddatum, Grundpreis / 30 je Tag,
+# Einzahlungen bis zum Enddatum. Die Engine weicht davon absichtlich ab:
+#   - der Grundpreis wird je Kalendermonat anteilig berechnet, nicht mit 30 Tagen;
+#   - Verbrauch und Einzahlungen beziehen sich nur auf den Zeitraum ab dem
+#     Startdatum, der Verbrauch ist zwischen den Ablesungen interpoliert.
+# Beginnt der Zeitraum mit der ersten Ablesung und Einzahlung, stimmen Tage,
+# Verbrauch, Verbrauchskosten und Einzahlungen mit den alten Werten überein.
+#
+# Darüber hinaus wird die Engine mit einer unabhängigen Nachrechnung nach den
+# heutigen Regeln direkt auf den Rohtabellen verglichen, auch über einen
+# zweiten Tarif ab 2025 hinweg.
+
+ZAEHLER = strom_repository.STANDARD_ZAEHLER
+
+# (start, ende) -> Ausgabe der alten Berechnung: Tage, kWh, Verbrauchskosten,
+# Grundpreis, Einzahlungen und Saldo in Euro
+ALTE_ERGEBNISSE = {
+    ('2024-01-01', '2024-02-26'): (57, 300, '30.00', '19.00', '60.00', '11.00'),
+    ('2024-01-01', '2024-03-01'): (61, 300, '30.00', '20.33', '60.00', '9.67'),
+    ('2024-01-01', '2024-06-30'): (182, 300, '30.00', '60.67', '60.00', '-30.67'),
+    ('2024-01-01', '2024-12-31'): (366, 300, '30.00', '122.00', '60.00', '-92.00'),
+    ('2024-02-10', '2024-02-20'): (11, 200, '20.00', '3.67', '60.00', '36.33'),
+}
+
+# Grundpreis nach Kalendermonaten statt alter Wert (10 EUR je Monat)
+GRUNDPREIS_NEU = {
+    ('2024-01-01', '2024-02-26'): 1897,  # Januar + 26/29 Februar
+    ('2024-01-01', '2024-03-01'): 2032,  # Januar, Februar + 1/31 März
+    ('2024-01-01', '2024-06-30'): 6000,
+    ('2024-01-01', '2024-12-31'): 12000,
+}
+
+ZEITRAEUME = [
+    ('2024-01-01', '2024-02-26'),
+    ('2024-01-01', '2024-03-01'),
+    ('2024-01-01', '2024-06-30'),
+    ('2024-01-01', '2024-12-31'),
+    ('2024-02-10', '2024-02-20'),
+    ('2024-01-15', '2024-02-15'),
+    ('2024-12-01', '2025-01-31'),
+    ('2024-02-20', '2025-03-15'),
+    ('2024-01-01', '2025-06-30'),
+]
+
+
+@pytest.fixture
+def beispiel_repo(tmp_path, repository_oeffnen):
+    repo = repository_oeffnen(tmp_path / 'beispiel.db')
+    strom_db.beispieldaten_einfuegen(repo.db_path)
+    return repo
+
+
+@pytest.fixture
+def repo(beispiel_repo):
+    repo = beispiel_repo
+    repo.insert_berechgrundl_zeilen([('2025-01-01', '2025-06-30', strom_betrag.cent('12.50'),
+                                      strom_betrag.preis('12.5'))])
+    repo.insert_zaehlerstaende([('2025-03-01', 1500)])
+    return repo
+
+
+def _runden(wert):
+    return math.floor(wert + Fraction(1, 2))
+
+
+# Interpolierter Zählerstand zu Beginn des Tages; vor der ersten und nach der
+# letzten Ablesung gilt der jeweilige Randstand
+def _stand_am(conn, tag):
+    vorher = conn.execute('''
+        SELECT datum, MAX(zaehlerstand) FROM tbl_zaehlerstand WHERE zaehler_id = ? AND datum = (
+            SELECT MAX(datum) FROM tbl_zaehlerstand WHERE zaehler_id = ? AND datum <= ?)
+    ''', (ZAEHLER, ZAEHLER, tag.isoformat())).fetchone()
+    nachher = conn.execute('''
+        SELECT datum, MAX(zaehlerstand) FROM tbl_zaehlerstand WHERE zaehler_id = ? AND datum = (
+            SELECT MIN(datum) FROM tbl_zaehlerstand WHERE zaehler_id = ? AND datum > ?)
+    ''', (ZAEHLER, ZAEHLER, tag.isoformat())).fetchone()
+    if vorher[0] is None:
+        return nachher[1]
+    if nachher[0] is None:
+        return vorher[1]
+    tag0 = date.fromisoformat(vorher[0])
+    tag1 = date.fromisoformat(nachher[0])
+    return vorher[1] + (nachher[1] - vorher[1]) * (tag - tag0).days / (tag1 - tag0).days
+
+
+# Nachrechnung nach den heutigen Regeln ohne Engine und ohne tbl_verbrauch_tag:
+# Abschnitte gleichen Tarifs Tag für Tag, Verbrauch aus den interpolierten
+# Randständen, Grundpreis mit 1/Monatslänge je Tag, Einzahlungen im Zeitraum
+def referenzberechnung(conn, start, ende):
+    abschnitte = []
+    tag = start
+    while tag <= ende:
+        tarif = conn.execute('''
+            SELECT grundpreis, kwh_preis FROM tbl_berechgrundl
+            WHERE zaehler_id = ? AND datum_von <= ? AND datum_bis >= ? ORDER BY datum_von DESC LIMIT 1
+        ''', (ZAEHLER, tag.isoformat(), tag.isoformat())).fetchone()
+        assert tarif is not None
+        monatsanteil = Fraction(1, calendar.monthrange(tag.year, tag.month)[1])
+        if abschnitte and abschnitte[-1]['tarif'] == tarif:
+            abschnitte[-1]['bis'] = tag
+            abschnitte[-1]['monate'] += monatsanteil
+        else:
+            abschnitte.append({'von': tag, 'bis': tag, 'tarif': tarif, 'monate': monatsanteil})
+        tag += timedelta(days=1)
+
+    verbrauch_wh = verbrauchskosten = grundpreis = 0
+    for abschnitt in abschnitte:
+        kwh = _stand_am(conn, abschnitt['bis'] + timedelta(days=1)) - _stand_am(conn, abschnitt['von'])
+        wh = strom_betrag.wh(kwh)
+        verbrauch_wh += wh
+        verbrauchskosten += _runden(Fraction(wh * abschnitt['tarif'][1], 1000 * strom_betrag.PREIS_SKALA))
+        grundpreis += _runden(abschnitt['tarif'][0] * abschnitt['monate'])
+
+    einzahlungen = conn.execute(
+        'SELECT COALESCE(SUM(einzahlungen), 0) FROM tbl_einzahlungen WHERE zaehler_id = ? AND datum BETWEEN ? AND ?',
+        (ZAEHLER, start.isoformat(), ende.isoformat())).fetchone()[0]
+    return {
+        'tage': (ende - start).days + 1,
+        'verbrauch_wh': verbrauch_wh,
+        'verbrauchskosten_cent': verbrauchskosten,
+        'grundpreis_cent': grundpreis,
+        'einzahlungen_cent': einzahlungen,
+        'saldo_cent': einzahlungen - verbrauchskosten - grundpreis,
+    }
+
+
+def _felder(abrechnung):
+    return {name: getattr(abrechnung, name) for name in
+            ('tage', 'verbrauch_wh', 'verbrauchskosten_cent', 'grundpreis_cent', 'einzahlungen_cent', 'saldo_cent')}
+
+
+def _erwartet(repo, start, ende):
+    with repo.pool.verbindung() as conn:
+        return referenzberechnung(conn, date.fromisoformat(start), date.fromisoformat(ende))
+
+
+def _euro(cent):
+    return strom_betrag.euro_text(cent)
+
+
+@pytest.mark.parametrize('start, ende', sorted(GRUNDPREIS_NEU))
+def test_alte_ergebnisse(beispiel_repo, start, ende):
+    tage, kwh, verbrauchskosten, _, einzahlungen, _ = ALTE_ERGEBNISSE[(start, ende)]
+    a = strom_abrechnung.berechnen(start, ende, beispiel_repo, ZAEHLER)
+    assert (a.tage, a.verbrauch_wh, _euro(a.verbrauchskosten_cent), _euro(a.einzahlungen_cent)) == (
+        tage, kwh * 1000, verbrauchskosten, einzahlungen)
+    # Absichtliche Abweichung: Grundpreis nach Kalendermonaten
+    assert a.grundpreis_cent == GRUNDPREIS_NEU[(start, ende)]
+    assert a.saldo_cent == a.einzahlungen_cent - a.verbrauchskosten_cent - a.grundpreis_cent
+
+
+# Absichtliche Abweichung: das Startdatum zählt. Die alte Berechnung nahm alle
+# Ablesungen und Einzahlungen bis zum Enddatum (200 kWh, 60 EUR)
+def test_startdatum_wird_beachtet(beispiel_repo):
+    a = strom_abrechnung.berechnen('2024-02-10', '2024-02-20', beispiel_repo, ZAEHLER)
+    assert ALTE_ERGEBNISSE[('2024-02-10', '2024-02-20')][1] == 200
+    # 5 Tage zu 100/13 kWh bis zur Ablesung am 15.02., danach 6 Tage zu 100/11 kWh
+    assert a.verbrauch_wh == strom_betrag.wh(5 * 100 / 13 + 6 * 100 / 11)
+    assert a.einzahlungen_cent == 0
+
+
+@pytest.mark.parametrize('start, ende', ZEITRAEUME)
+def test_berechnen_wie_referenz(repo, start, ende):
+    abrechnung = strom_abrechnung.berechnen(start, ende, repo, ZAEHLER)
+    assert _felder(abrechnung) == _erwartet(repo, start, ende)
+
+
+def test_berechnen_perioden_wie_referenz(repo):
+    abrechnungen = strom_abrechnung.berechnen_perioden(ZEITRAEUME, repo, ZAEHLER)
+    assert [_felder(a) for a in abrechnungen] == [_erwartet(repo, start, ende) for start, ende in ZEITRAEUME]
+
+
+def test_preisgrenze_teilt_abrechnung(repo):
+    abrechnung = strom_abrechnung.berechnen('2024-12-01', '2025-01-31', repo, ZAEHLER)
+    assert [(s.start_datum, s.end_datum) for s in abrechnung.segmente] == [
+        (date(2024, 12, 1), date(2024, 12, 31)), (date(2025, 1, 1), date(2025, 1, 31))]
+    # Verbrauch nur zwischen der letzten Ablesung 2024 und der ersten 2025
+    assert abrechnung.verbrauch_wh > 0
+    assert abrechnung.grundpreis_cent == 1000 + 1250
+
+
+def test_fehlender_tarif(repo):
+    with pytest.raises(strom_abrechnung.FehlendeBerechnungsgrundlage):
+        strom_abrechnung.berechnen('2025-06-01', '2025-07-31', repo, ZAEHLER)
@@ -0,0 +1,23 @@
+import pytest
+
+import strom_betrag
+
+
+@pytest.mark.parametrize('wert, erwartet', [('10,00', 1000), ('0.285', 29), (0.285, 29), ('-1.005', -101)])
+def test_cent(wert, erwartet):
+    assert strom_betrag.cent(wert) == erwartet
+
+
+# '1e30' lässt sich nicht mehr auf ganze Zahlen runden (InvalidOperation), '1e20'
+# schon, passt aber nicht in 64 Bit; beides muss wie andere Eingaben ein ValueError sein
+@pytest.mark.parametrize('funktion', [strom_betrag.cent, strom_betrag.preis])
+@pytest.mark.parametrize('wert', ['1e30', '1e20', '-1e20', 10 ** 30, 1e300, 'inf', 'nan', 'abc'])
+def test_ungueltige_betraege(funktion, wert):
+    with pytest.raises(ValueError):
+        funktion(wert)
+
+
+def test_groesster_betrag():
+    assert strom_betrag.skaliert(strom_betrag.MAX_GANZZAHL, 1) == strom_betrag.MAX_GANZZAHL
+    with pytest.raises(ValueError):
+        strom_betrag.skaliert(strom_betrag.MAX_GANZZAHL + 1, 1)
@@ -0,0 +1,42 @@
+import io
+
+import strom_archiv
+import strom_import
+
+# Massenimport: ungültige Zeilen und Zeilen, die die Datenbank abweist, werden
+# abgelehnt und gemeldet; alle übrigen Zeilen werden importiert
+
+
+def _importieren(repo, tabelle, text, block_groesse=strom_import.BLOCK_GROESSE):
+    abgelehnt = []
+    ergebnis = strom_import.importieren_aus(
+        repo, tabelle, strom_import.zeilen_lesen(io.StringIO(text)), block_groesse,
+        abgelehnt_callback=lambda nummer, zeile, grund: abgelehnt.append((nummer, grund)))
+    return ergebnis, abgelehnt
+
+
+def test_nicht_endliche_zahlen_werden_abgelehnt(tmp_path, repository_oeffnen):
+    repo = repository_oeffnen(tmp_path / 'import.db')
+    ergebnis, abgelehnt = _importieren(
+        repo, 'zaehlerstand', "datum,zaehlerstand\n2024-01-01,100\n2024-01-02,inf\n2024-01-03,nan\n2024-01-04,110\n")
+    assert (ergebnis.importiert, ergebnis.abgelehnt) == (2, 2)
+    assert [nummer for nummer, _ in abgelehnt] == [3, 4]
+
+
+def test_von_der_datenbank_abgelehnte_zeilen(tmp_path, repository_oeffnen):
+    repo = repository_oeffnen(tmp_path / 'import.db')
+    repo.insert_zaehlerstaende([('2024-01-01', 100), ('2024-01-15', 150), ('2024-03-01', 300)])
+    strom_archiv.archivieren(repo, '2024-02-01')
+
+    # Zeilen 3 und 6 liegen im archivierten Zeitraum; mit Blöcken zu 4 Zeilen
+    # scheitert der erste Block und wird aufgeteilt, der zweite auch
+    text = "datum,zaehlerstand\n" + "\n".join(
+        ('2024-03-02,301', '2024-01-20,160', '2024-03-03,302', '2024-03-04,303',
+         '2024-01-25,170', '2024-03-05,304', '2024-03-06,305')) + "\n"
+    ergebnis, abgelehnt = _importieren(repo, 'zaehlerstand', text, block_groesse=4)
+
+    assert (ergebnis.importiert, ergebnis.abgelehnt) == (5, 2)
+    assert [nummer for nummer, _ in abgelehnt] == [3, 6]
+    assert all('archiviert' in grund for _, grund in abgelehnt)
+    assert [stand for _, _, stand in repo.zaehlerstaende_zwischen_daten('2024-03-01', '2024-03-31')] == [
+        300, 301, 302, 303, 304, 305]
@@ -0,0 +1,74 @@
+import json
+import sqlite3
+
+import strom_abrechnung
+import strom_migration
+
+# Migration einer Datenbank im Zustand vor den Migrationen (user_version 0,
+# Tabellen wie im ursprünglichen strom_db) mit Zeilen, die die neuen
+# Bedingungen verletzen: sie werden korrigiert oder entfernt, die Migration läuft durch.
+
+
+def _altdatenbank(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE tbl_zaehlerstand (datum DATE, zaehlerstand INTEGER)')
+    conn.execute('CREATE TABLE tbl_einzahlungen (datum DATE, einzahlungen INTEGER)')
+    conn.execute('CREATE TABLE tbl_berechgrundl (datum_von DATE, datum_bis DATE, grundpreis REAL, kwh_preis REAL)')
+    conn.executemany('INSERT INTO tbl_zaehlerstand VALUES (?, ?)', [
+        ('2024-01-01', 100), ('2024-02-01', 200), ('gestern', 150), ('2024-03-01', -5), ('2024-03-02', None)])
+    conn.executemany('INSERT INTO tbl_einzahlungen VALUES (?, ?)', [
+        ('2024-01-01', 30), ('2024-01-02', 0.004), ('2024-01-03', -10), ('2024-01-04', 0.005)])
+    conn.executemany('INSERT INTO tbl_berechgrundl VALUES (?, ?, ?, ?)', [
+        ('2024-12-31', '2024-01-01', 10.0, 30.0), ('2025-01-01', '2025-12-31', -1.0, 30.0)])
+    conn.commit()
+    conn.close()
+
+
+def _bereinigt(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {(version, tabelle, aktion, tuple(json.loads(daten).values())) for version, tabelle, aktion, daten
+                in conn.execute('SELECT version, tabelle, aktion, daten FROM tbl_bereinigung')}
+    finally:
+        conn.close()
+
+
+def test_migration_mit_ungueltigen_altdaten(tmp_path, repository_oeffnen):
+    db_path = tmp_path / 'alt.db'
+    _altdatenbank(db_path)
+    repo = repository_oeffnen(db_path)
+
+    assert [stand for _, _, stand in repo.zaehlerstaende_zwischen_daten('2000-01-01', '2099-12-31')] == [100, 200]
+    assert [betrag for _, _, betrag in repo.einzahlungen_zwischen_daten('2000-01-01', '2099-12-31')] == [3000, 1]
+    assert repo.berechgrundl_daten() == [('2024-01-01', '2024-12-31', 1000, 300000)]
+
+    assert _bereinigt(db_path) == {
+        (2, 'tbl_zaehlerstand', 'entfernt', ('gestern', 150)),
+        (2, 'tbl_zaehlerstand', 'entfernt', ('2024-03-01', -5)),
+        (2, 'tbl_zaehlerstand', 'entfernt', ('2024-03-02', None)),
+        (2, 'tbl_einzahlungen', 'entfernt', ('2024-01-03', -10)),
+        (2, 'tbl_berechgrundl', 'korrigiert', ('2024-12-31', '2024-01-01', 10.0, 30.0)),
+        (2, 'tbl_berechgrundl', 'entfernt', ('2025-01-01', '2025-12-31', -1.0, 30.0)),
+        (5, 'tbl_einzahlungen', 'entfernt', (1, '2024-01-02', 0.004)),
+    }
+
+    # Die migrierte Datenbank lässt sich abrechnen
+    abrechnung = strom_abrechnung.berechnen('2024-01-01', '2024-01-31', repo)
+    assert abrechnung.verbrauch_wh == 100000
+    assert abrechnung.einzahlungen_cent == 3001
+
+
+def test_bereinigungen_zusammengefasst(tmp_path, repository_oeffnen):
+    db_path = tmp_path / 'alt.db'
+    _altdatenbank(db_path)
+    repository_oeffnen(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        versionen = [ziel for ziel, _, _ in strom_migration.MIGRATIONEN]
+        zusammenfassung = strom_migration.bereinigungen(conn, versionen)
+    finally:
+        conn.close()
+    assert [(version, tabelle, aktion, anzahl) for version, tabelle, aktion, _, anzahl in zusammenfassung] == [
+        (2, 'tbl_berechgrundl', 'entfernt', 1), (2, 'tbl_berechgrundl', 'korrigiert', 1),
+        (2, 'tbl_einzahlungen', 'entfernt', 1), (2, 'tbl_zaehlerstand', 'entfernt', 3),
+        (5, 'tbl_einzahlungen', 'entfernt', 1)]
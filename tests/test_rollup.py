@@ -0,0 +1,110 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import strom_abrechnung
+import strom_archiv
+import strom_rollup
+import strom_testdaten
+
+# Summen aus tbl_monat/tbl_jahr müssen centgenau der Abrechnung desselben
+# Zeitraums entsprechen, auch über mehrere Monate und Tarifwechsel hinweg
+
+ERSTES_JAHR = 2019
+JAHRE = 4
+
+
+@pytest.fixture
+def repo(tmp_path, repository_oeffnen):
+    db_path = tmp_path / 'testdaten.db'
+    strom_testdaten.erzeugen(str(db_path), zaehler=2, jahre=JAHRE, ablesungen_je_tag=3, erstes_jahr=ERSTES_JAHR)
+    return repository_oeffnen(db_path)
+
+
+def _werte(a):
+    return (a.verbrauch_wh, a.verbrauchskosten_cent, a.grundpreis_cent, a.einzahlungen_cent, a.saldo_cent)
+
+
+def _monatsbereiche(anzahl, seed=1):
+    zufall = random.Random(seed)
+    letzter = (ERSTES_JAHR + JAHRE) * 12 - 1
+    for _ in range(anzahl):
+        erster = zufall.randint(ERSTES_JAHR * 12, letzter - 1)
+        bis = zufall.randint(erster + 1, letzter)
+        yield f"{erster // 12:04d}-{erster % 12 + 1:02d}", f"{bis // 12:04d}-{bis % 12 + 1:02d}"
+
+
+def _pruefen(repo, von, bis, zaehler_id):
+    summe = strom_rollup.summe(repo, von, bis, zaehler_id)
+    anfang, ende = strom_rollup.monatszeitraum(von, bis)
+    assert _werte(summe) == _werte(strom_abrechnung.berechnen(anfang, ende, repo, zaehler_id)), (von, bis)
+
+
+def test_summe_wie_berechnen(repo):
+    for zaehler_id in (2, 3):
+        _pruefen(repo, f"{ERSTES_JAHR}-01", f"{ERSTES_JAHR + JAHRE - 1}-12", zaehler_id)
+        for von, bis in _monatsbereiche(40, seed=zaehler_id):
+            _pruefen(repo, von, bis, zaehler_id)
+
+
+def test_summe_nach_aenderung(repo):
+    repo.insert_zaehlerstand('2020-06-15', 0.0, zaehler_id=2)
+    repo.insert_einzahlung('2021-02-10', 12345, zaehler_id=2)
+    for von, bis in (('2020-02', '2021-11'), ('2020-06', '2020-06'), ('2019-01', '2022-12')):
+        _pruefen(repo, von, bis, 2)
+
+
+def test_monatswerte_wie_berechnen(repo):
+    for s in strom_rollup.monatswerte(repo, f"{ERSTES_JAHR}-01", f"{ERSTES_JAHR}-12", 2):
+        assert _werte(s) == _werte(strom_abrechnung.berechnen(s.start_datum, s.end_datum, repo, 2))
+
+
+def test_summe_ohne_tarif(repo):
+    summe = strom_rollup.summe(repo, f"{ERSTES_JAHR + JAHRE - 1}-06", f"{ERSTES_JAHR + JAHRE}-03", 2)
+    assert summe.verbrauchskosten_cent is None and summe.saldo_cent is None
+    assert summe.monate == 10
+
+
+def _zeilen(repo, zaehler_id):
+    return (repo.rollup_monate('0001-01', '9999-12', zaehler_id=zaehler_id),
+            repo.rollup_jahre(1, 9999, zaehler_id=zaehler_id))
+
+
+# Aufträge einer Gruppe werden erst vor dem Commit gemeinsam nachgeführt; das
+# Ergebnis muss dem vollständigen Neuaufbau entsprechen, und Einzahlungen, die
+# in derselben Gruppe vor dem Archivieren eingefügt wurden, dürfen nicht fehlen
+def test_gruppe_wie_neu_aufgebaut(repo):
+    auftraege = [
+        lambda: repo.insert_zaehlerstand('2020-06-15', 0.0, zaehler_id=2),
+        lambda: repo.insert_einzahlung('2019-03-10', 4711, zaehler_id=2),
+        lambda: strom_archiv.archivieren(repo, '2019-07-01', [2]),
+        lambda: repo.insert_einzahlungen([('2019-12-31', 100), ('2020-01-01', 200)], zaehler_id=3),
+        lambda: repo.insert_berechgrundl('2024-01-01', '2024-12-31', 1500, 3500, zaehler_id=3),
+        lambda: repo.insert_zaehlerstand('2021-03-01', 1.0, zaehler_id=2),
+    ]
+    frei = threading.Event()
+    schreiber = repo.schreiber
+    with ThreadPoolExecutor(len(auftraege) + 1) as pool:
+        blockiert = pool.submit(repo.schreiben, lambda conn: frei.wait(10))
+        futures = []
+        for nummer, auftrag in enumerate(auftraege, 1):
+            futures.append(pool.submit(auftrag))
+            # Reihenfolge in der Warteschlange festhalten
+            while schreiber._auftraege.qsize() < nummer:
+                time.sleep(0.001)
+        frei.set()
+        blockiert.result()
+        for future in futures:
+            future.result()
+
+    vorher = {zaehler_id: _zeilen(repo, zaehler_id) for zaehler_id in (2, 3)}
+    repo.schreiben(lambda conn: strom_rollup.neu_aufbauen(conn, strom_archiv.stichtage_lesen(conn)))
+    assert {zaehler_id: _zeilen(repo, zaehler_id) for zaehler_id in (2, 3)} == vorher
+    monate, _ = vorher[2]
+    assert sum(zeile[2] for zeile in monate) == repo.summe_einzahlungen('0001-01-01', '9999-12-31', zaehler_id=2)
+    for von, bis in (('2019-01', '2019-12'), ('2020-02', '2021-11')):
+        _pruefen(repo, von, bis, 2)
+        _pruefen(repo, von, bis, 3)